@@ -0,0 +1,115 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import JsonResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .authentication import ClaimsJWTAuthentication, TokenUser
+from .exceptions import CustomValidationError
+from .roles import aget_user_role
+
+
+def _reuses_connections():
+    settings_dict = connections[DEFAULT_DB_ALIAS].settings_dict
+    return settings_dict['CONN_MAX_AGE'] != 0 or bool(settings_dict['OPTIONS'].get('pool'))
+
+
+def _in_own_connection(function):
+    def run(*args):
+        try:
+            return function(*args)
+        finally:
+            # What request_finished does for a request thread: the connections this worker thread
+            # opened stay open for its next read unless they are broken or past CONN_MAX_AGE.
+            for connection in connections.all(initialized_only=True):
+                connection.close_if_unusable_or_obsolete()
+    return run
+
+
+async def gather_reads(*calls):
+    """
+    Run independent synchronous reads, given as ``(function, *args)``, at the
+    same time and return their results in order.
+
+    Django's async ORM still sends every query through one shared thread, so
+    awaiting several of them only interleaves the waiting. With
+    ``ASYNC_CONCURRENT_READS`` each read runs on a worker thread with that
+    thread's own database connection and the queries really overlap. This
+    only pays off when the connections outlive the read (``CONN_MAX_AGE`` or
+    a pool); otherwise every read would connect and disconnect, so the reads
+    run one after another on the shared ORM thread instead.
+    """
+    concurrent = getattr(settings, 'ASYNC_CONCURRENT_READS', False) and _reuses_connections()
+    return await asyncio.gather(*(
+        sync_to_async(_in_own_connection(function), thread_sensitive=False)(*args) if concurrent
+        else sync_to_async(function)(*args)
+        for function, *args in calls
+    ))
+
+
+class AsyncAPIView(View):
+    """
+    Base for ``async def get`` views answering in the ``StandardResponseMixin``
+    envelope, for serving read-heavy endpoints under ASGI without a thread hop
+    per request. Tokens with claims authenticate without touching the
+    database; ``self.request`` is a DRF ``Request`` for ``query_params``.
+    """
+    http_method_names = ['get', 'options']
+    authentication_class = ClaimsJWTAuthentication
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.request = Request(request)
+        try:
+            self.user = await self.authenticate(request)
+            # Replaces the lazy session user too, which would query the database from the event loop.
+            self.request.user = self.user
+            return await super().dispatch(request, *args, **kwargs)
+        except CustomValidationError as e:
+            return self.error_response(errors=e.detail)
+        except (TokenError, InvalidToken):
+            return self.error_response(errors=["توکن نامعتبر است یا مدت زمان آن تمام شده است"],
+                                       status_code=status.HTTP_401_UNAUTHORIZED)
+        except AuthenticationFailed:
+            return self.error_response(errors=["ورود به سیستم لازم است"], status_code=status.HTTP_401_UNAUTHORIZED)
+
+    async def authenticate(self, request):
+        authenticator = self.authentication_class()
+        header = authenticator.get_header(request)
+        raw_token = authenticator.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            return AnonymousUser()
+        token = authenticator.get_validated_token(raw_token)
+        if authenticator.has_claims(token):
+            return TokenUser(token)
+        return await sync_to_async(authenticator.get_user)(token)
+
+    def json_response(self, data, status_code=status.HTTP_200_OK):
+        return JsonResponse(data, status=status_code, safe=False, encoder=JSONEncoder,
+                            json_dumps_params={'ensure_ascii': False})
+
+    async def success_response(self, data=None, user=None, role=None, **extra):
+        return self.json_response({
+            'is_success': True,
+            'data': data,
+            'errors': None,
+            'userPermission': role if role is not None else await aget_user_role(user),
+            **extra,
+        })
+
+    async def paginated_response(self, data=None, next_cursor=None, user=None):
+        return await self.success_response(data=data, user=user, next_cursor=next_cursor)
+
+    def error_response(self, errors=None, status_code=status.HTTP_400_BAD_REQUEST):
+        return self.json_response({
+            'is_success': False,
+            'data': None,
+            'errors': errors,
+        }, status_code=status_code)
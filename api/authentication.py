@@ -0,0 +1,122 @@
+from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .roles import get_user_role
+
+# Claims copied from the user into every token; together with user_id they are all that most
+# views read from request.user.
+USER_CLAIMS = ['username', 'is_staff', 'is_superuser']
+ROLE_CLAIM = 'role'
+
+
+def user_claims(user):
+    claims = {claim: getattr(user, claim) for claim in USER_CLAIMS}
+    claims[ROLE_CLAIM] = get_user_role(user)
+    return claims
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token carrying ``user_claims``; access tokens made from it copy them."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim, value in user_claims(user).items():
+            token[claim] = value
+        return token
+
+
+class TokenUser(SimpleLazyObject):
+    """
+    The user of an access token, answering ``id``, ``username``, ``is_staff``,
+    ``is_superuser`` and ``token_role`` from the claims. Any other attribute
+    loads the row once, so ``filter(user=request.user)`` or role checks cost no
+    query while ``request.user.addresses`` still works.
+
+    It passes ``isinstance`` checks for the user model.
+    """
+
+    def __init__(self, token):
+        user_id = token[api_settings.USER_ID_CLAIM]
+        super().__init__(lambda: TokenUser._load(user_id))
+        self.__dict__['_claims'] = {
+            'id': user_id, **{claim: token[claim] for claim in USER_CLAIMS}, 'token_role': token[ROLE_CLAIM],
+        }
+
+    @staticmethod
+    def _load(user_id):
+        try:
+            return get_user_model().objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except get_user_model().DoesNotExist:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+
+    id = pk = property(lambda self: self._claims['id'])
+    username = property(lambda self: self._claims['username'])
+    is_staff = property(lambda self: self._claims['is_staff'])
+    is_superuser = property(lambda self: self._claims['is_superuser'])
+    token_role = property(lambda self: self._claims['token_role'])
+    _meta = property(lambda self: get_user_model()._meta)
+    is_authenticated = True
+    is_anonymous = False
+
+    @property
+    def __class__(self):
+        return get_user_model()
+
+    def __getattr__(self, name):
+        # Probes such as hasattr(value, 'resolve_expression') in filter() are answered without a
+        # query; only what a loaded user could have is worth loading it for.
+        if self._wrapped is empty and name != '_state' and not hasattr(get_user_model(), name):
+            raise AttributeError(name)
+        return super().__getattr__(name)
+
+    def __bool__(self):
+        return True
+
+    def __eq__(self, other):
+        return isinstance(other, get_user_model()) and other.pk == self.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that builds the user from the token claims instead of
+    loading it. Tokens issued before the claims existed fall back to a query.
+
+    A deleted or deactivated user keeps access until the access token expires;
+    refreshing reloads the row and fails.
+    """
+
+    @staticmethod
+    def has_claims(validated_token):
+        return all(claim in validated_token for claim in [*USER_CLAIMS, ROLE_CLAIM])
+
+    def get_user(self, validated_token):
+        if not self.has_claims(validated_token):
+            return super().get_user(validated_token)
+        return TokenUser(validated_token)
+
+
+class ClaimsTokenRefreshSerializer(serializers.Serializer):
+    """
+    Issue an access token with current claims: the user row is read once per
+    refresh, so renamed, promoted or deactivated users and a first purchase
+    show up in the next access token. The user is left in ``self.user``.
+    """
+    refresh = serializers.CharField()
+    access = serializers.CharField(read_only=True)
+
+    def validate(self, attrs):
+        refresh = ClaimsRefreshToken(attrs['refresh'])
+        self.user = JWTAuthentication().get_user(refresh)
+        access = refresh.access_token
+        for claim, value in user_claims(self.user).items():
+            access[claim] = value
+        return {'access': str(access)}
@@ -0,0 +1,89 @@
+import atexit
+import logging
+import threading
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    Collect items in memory and hand them to ``flush_callback`` in batches, so
+    request threads never wait on the write itself.
+
+    A daemon thread flushes every ``interval`` seconds, or as soon as
+    ``max_size`` items are pending. With ``interval=None`` there is no thread
+    and the buffer flushes on the caller's thread when it is full, or when
+    ``flush()`` is called. Pending items are flushed at interpreter exit.
+    """
+
+    def __init__(self, flush_callback, max_size=100, interval=5.0, name='write-behind-buffer'):
+        self.flush_callback = flush_callback
+        self.max_size = max_size
+        self.interval = interval
+        self.name = name
+        self._items = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def add(self, item):
+        with self._lock:
+            self._append(item)
+            pending = self._pending()
+        if self.interval is None:
+            if pending >= self.max_size:
+                self.flush()
+            return
+        self._ensure_thread()
+        if pending >= self.max_size:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                items = self._drain()
+            if not items:
+                return
+            try:
+                self.flush_callback(items)
+            except Exception:
+                logger.exception('%s: failed to flush %d items', self.name, len(items))
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=self.interval or 5)
+        self.flush()
+
+    def _append(self, item):
+        self._items.append(item)
+
+    def _pending(self):
+        return len(self._items)
+
+    def _drain(self):
+        items, self._items = self._items, []
+        return items
+
+    def _ensure_thread(self):
+        if self._thread is not None or self._closed:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+            # The thread keeps its own database connection; don't let it go stale between flushes.
+            connections.close_all()
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_process_local(alias=DEFAULT_CACHE_ALIAS):
+    """Whether the ``alias`` cache lives inside this process, out of reach of other workers' invalidations."""
+    return isinstance(caches[alias], LocMemCache)
+
+
+def get_process_local_timeout():
+    return getattr(settings, 'PROCESS_LOCAL_CACHE_TIMEOUT', 30)
+
+
+def invalidated_timeout(timeout, alias=DEFAULT_CACHE_ALIAS):
+    """
+    ``timeout`` for an entry that is retired by deleting it or bumping a version
+    key. On a process-local cache those invalidations only reach the worker
+    that made them, so every other worker keeps the entry for at most
+    ``PROCESS_LOCAL_CACHE_TIMEOUT`` seconds instead.
+    """
+    if not is_process_local(alias):
+        return timeout
+    local_timeout = get_process_local_timeout()
+    return local_timeout if timeout is None else min(timeout, local_timeout)
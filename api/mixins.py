@@ -1,22 +1,11 @@
 from rest_framework.response import Response
 from rest_framework import status
-from orders.models import Order
-from users.models import CustomUser as User
+from .roles import get_user_role
 
 
 class StandardResponseMixin:
     def get_user_role(self, user):
-        if not user or not user.is_authenticated:
-            return '5'
-        if user.is_superuser:
-            return '1'
-        elif user.is_staff:
-            return '2'
-        else:
-            had_purchased = Order.objects.filter(user=user).exists()
-            if had_purchased:
-                return '3'
-            return '4'
+        return get_user_role(user)
 
     def success_response(self, data=None, user=None):
         return Response({
@@ -26,6 +15,11 @@ class StandardResponseMixin:
             'userPermission': self.get_user_role(user),
         }, status=status.HTTP_200_OK)
 
+    def paginated_response(self, data=None, next_cursor=None, user=None):
+        response = self.success_response(data=data, user=user)
+        response.data['next_cursor'] = next_cursor
+        return response
+
     def error_response(self, errors=None, status_code=status.HTTP_400_BAD_REQUEST):
         return Response({
             'is_success': False,
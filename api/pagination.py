@@ -0,0 +1,145 @@
+import base64
+import binascii
+import datetime
+import json
+
+import jdatetime
+from django.db.models import Q
+from rest_framework.pagination import BasePagination
+
+from .exceptions import CustomValidationError
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opt-in cursor pagination keyed on the view's ``order_by``/``order_type``
+    params with ``id`` as a tiebreaker. Every page is a single indexed range
+    query, so page N costs the same as page 1.
+
+    Pagination is only applied when the request sends ``page_size`` or
+    ``cursor``; otherwise ``paginate_queryset`` returns ``None`` and the view
+    keeps returning the whole list.
+
+    ``OrderingFilter``'s ``ordering`` param, when sent, takes the place of
+    ``order_by``/``order_type`` (``ordering=-price``); orderings the cursor
+    cannot follow, such as several fields, are rejected.
+    """
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    order_by_query_param = 'order_by'
+    order_type_query_param = 'order_type'
+    ordering_query_param = 'ordering'
+    default_page_size = 20
+    max_page_size = 100
+    default_ordering_fields = ['created_at']
+
+    next_cursor = None
+
+    def get_page_size(self, request):
+        params = request.query_params
+        if self.page_size_query_param not in params and self.cursor_query_param not in params:
+            return None
+        try:
+            page_size = int(params.get(self.page_size_query_param, self.default_page_size))
+        except (TypeError, ValueError):
+            raise CustomValidationError(['تعداد آیتم‌های هر صفحه باید عدد باشد'])
+        if page_size <= 0:
+            raise CustomValidationError(['تعداد آیتم‌های هر صفحه باید بیشتر از صفر باشد'])
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, request, view):
+        ordering_fields = getattr(view, 'keyset_ordering_fields', self.default_ordering_fields)
+        ordering = request.query_params.get(self.ordering_query_param, '').strip()
+        if ordering:
+            field, descending = ordering.removeprefix('-'), ordering.startswith('-')
+        else:
+            field = request.query_params.get(self.order_by_query_param, ordering_fields[0])
+            descending = request.query_params.get(self.order_type_query_param, 'asc') == 'desc'
+        if field not in ordering_fields:
+            raise CustomValidationError(['مرتب‌سازی فقط بر اساس {} امکان‌پذیر است'.format('، '.join(ordering_fields))])
+        return field, descending
+
+    def paginate_queryset(self, queryset, request, view=None):
+        window = self.page_window(queryset, request, view)
+        if window is None:
+            return None
+        return self.trim_page(list(window))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` for async views: the page is fetched with the async ORM."""
+        window = self.page_window(queryset, request, view)
+        if window is None:
+            return None
+        return self.trim_page([item async for item in window])
+
+    def page_window(self, queryset, request, view):
+        """The unevaluated ``page_size + 1`` rows after the cursor, or None when not paginating."""
+        self.next_cursor = None
+        page_size = self.get_page_size(request)
+        if page_size is None:
+            return None
+
+        field, descending = self.get_ordering(request, view)
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            if cursor['field'] != field or cursor['descending'] != descending:
+                raise CustomValidationError(['مکان‌نمای صفحه‌بندی با مرتب‌سازی درخواست همخوانی ندارد'])
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}': cursor['value']}) |
+                Q(**{field: cursor['value'], f'id__{lookup}': cursor['id']})
+            )
+
+        self.window = (page_size, field, descending)
+        prefix = '-' if descending else ''
+        return queryset.order_by(f'{prefix}{field}', f'{prefix}id')[:page_size + 1]
+
+    def trim_page(self, page):
+        page_size, field, descending = self.window
+        if len(page) > page_size:
+            page = page[:page_size]
+            last = page[-1]
+            self.next_cursor = self.encode_cursor(field, descending, getattr(last, field), last.id)
+        return page
+
+    def paginate_list(self, items, request, field):
+        """The same cursor contract over ``items`` already sorted ascending by ``(field, id)``."""
+        self.next_cursor = None
+        page_size = self.get_page_size(request)
+        if page_size is None:
+            return None
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            if cursor['field'] != field or cursor['descending']:
+                raise CustomValidationError(['مکان‌نمای صفحه‌بندی با مرتب‌سازی درخواست همخوانی ندارد'])
+            after = (cursor['value'], cursor['id'])
+            items = [item for item in items if (getattr(item, field), item.id) > after]
+
+        page = items[:page_size]
+        if len(items) > page_size:
+            last = page[-1]
+            self.next_cursor = self.encode_cursor(field, False, getattr(last, field), last.id)
+        return page
+
+    def encode_cursor(self, field, descending, value, pk):
+        if isinstance(value, jdatetime.datetime):
+            value = value.togregorian()
+        if isinstance(value, datetime.datetime):
+            value = {'datetime': value.isoformat()}
+        payload = json.dumps({'f': field, 'd': descending, 'v': value, 'id': pk}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            value = payload['v']
+            if isinstance(value, dict):
+                value = datetime.datetime.fromisoformat(value['datetime'])
+            return {'field': payload['f'], 'descending': bool(payload['d']), 'value': value, 'id': int(payload['id'])}
+        except (binascii.Error, ValueError, KeyError, TypeError):
+            raise CustomValidationError(['مکان‌نمای صفحه‌بندی نامعتبر است'])
@@ -0,0 +1,66 @@
+from django.core.cache import cache
+
+from .caching import invalidated_timeout
+
+HAS_PURCHASED_KEY = 'user-role:{}:has-purchased'
+HAS_PURCHASED_TIMEOUT = 60 * 60 * 24
+
+
+def has_purchased(user_id):
+    key = HAS_PURCHASED_KEY.format(user_id)
+    purchased = cache.get(key)
+    if purchased is None:
+        from orders.models import Order
+        purchased = Order.objects.filter(user_id=user_id).exists()
+        cache.set(key, purchased, invalidated_timeout(HAS_PURCHASED_TIMEOUT))
+    return purchased
+
+
+def invalidate_user_role(user_id):
+    cache.delete(HAS_PURCHASED_KEY.format(user_id))
+
+
+def known_role(user):
+    """The role when it follows from the user alone, None when it depends on the user's orders."""
+    if not user or not user.is_authenticated:
+        return '5'
+    if user.is_superuser:
+        return '1'
+    elif user.is_staff:
+        return '2'
+    elif getattr(user, 'token_role', None) == '3':
+        return '3'
+    return None
+
+
+def get_user_role(user):
+    """
+    '1' superuser, '2' staff, '3' customer with an order, '4' customer without
+    one, '5' anonymous. The order lookup is cached per user and dropped when
+    that user's orders change (see ``orders.signals``); on a process-local
+    cache other workers only see the change once their entry expires
+    (``api.caching.invalidated_timeout``). A token user whose
+    token already says '3' skips it, since a first order is the only change.
+    """
+    role = known_role(user)
+    if role is None:
+        role = '3' if has_purchased(user.id) else '4'
+    return role
+
+
+async def ahas_purchased(user_id):
+    key = HAS_PURCHASED_KEY.format(user_id)
+    purchased = await cache.aget(key)
+    if purchased is None:
+        from orders.models import Order
+        purchased = await Order.objects.filter(user_id=user_id).aexists()
+        await cache.aset(key, purchased, invalidated_timeout(HAS_PURCHASED_TIMEOUT))
+    return purchased
+
+
+async def aget_user_role(user):
+    """``get_user_role`` for async views."""
+    role = known_role(user)
+    if role is None:
+        role = '3' if await ahas_purchased(user.id) else '4'
+    return role
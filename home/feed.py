@@ -0,0 +1,140 @@
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.utils.encoders import JSONEncoder
+
+from api.caching import invalidated_timeout
+from products.category_tree import get_category_tree
+from products.derivatives import sized_url
+from products.detail_cache import absolute_url
+from products.models import Category, Product
+from products.search_rollups import top_terms
+from products.serializers import ProductPreviewSerializer
+
+DEFAULT_FEED_SETTINGS = {
+    'PRODUCTS_PER_CATEGORY': 10,
+    'HOT_SEARCHES': 10,
+    'MAX_AGE': 5 * 60,
+    'FRAGMENT_MAX_AGE': 60 * 60,
+}
+
+
+def get_feed_settings():
+    return {**DEFAULT_FEED_SETTINGS, **getattr(settings, 'HOME_FEED', {})}
+
+
+FEED_REVISION_KEY = 'home:feed-revision'
+
+
+# Keys carry the category tree version, so any category edit retires every fragment at once.
+# Assembled feeds also carry the feed revision, bumped whenever a fragment is dropped, and the
+# origin their image URLs were made absolute against.
+def feed_key(version, revision, origin):
+    return f'home:feed:{version}:{revision}:{origin}'
+
+
+def fragment_key(version, category_id):
+    return f'home:category:{version}:{category_id}'
+
+
+def encode(data):
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def home_categories(tree):
+    return sorted(
+        (node for node in tree.nodes.values() if node['show_in_home'] or node['show_in_home_no_product']),
+        key=lambda node: node['id'],
+    )
+
+
+def build_fragment(tree, node, size):
+    """JSON bytes of one home category: its card and, for ``show_in_home``, best sellers and newest products."""
+    image = node['image']
+    data = {
+        'id': node['id'],
+        'name': node['name'],
+        'slug': node['slug'],
+        'image': sized_url(Category(image=image).image, node['image_derivatives'], 'card') if image else None,
+        'show_in_home': node['show_in_home'],
+        'show_in_home_no_product': node['show_in_home_no_product'],
+        'best_sellers': [],
+        'newest': [],
+    }
+    if node['show_in_home']:
+        products = Product.objects.filter(category_id__in=tree.descendant_ids(node['id'])).prefetch_related('images')
+        data['best_sellers'] = ProductPreviewSerializer(products.order_by('-sold', '-id')[:size], many=True).data
+        data['newest'] = ProductPreviewSerializer(products.order_by('-created_at', '-id')[:size], many=True).data
+    return encode(data)
+
+
+def get_feed_revision():
+    revision = cache.get(FEED_REVISION_KEY)
+    if revision is None:
+        cache.add(FEED_REVISION_KEY, uuid.uuid4().hex, invalidated_timeout(None))
+        revision = cache.get(FEED_REVISION_KEY)
+    return revision
+
+
+def get_fragments(tree, nodes):
+    """The cached JSON bytes of each home category in ``nodes``, building the missing ones."""
+    options = get_feed_settings()
+    keys = [fragment_key(tree.version, node['id']) for node in nodes]
+    fragments = cache.get_many(keys)
+    missing = {
+        key: build_fragment(tree, node, options['PRODUCTS_PER_CATEGORY'])
+        for key, node in zip(keys, nodes) if key not in fragments
+    }
+    if missing:
+        cache.set_many(missing, invalidated_timeout(options['FRAGMENT_MAX_AGE']))
+        fragments.update(missing)
+    return [fragments[key] for key in keys]
+
+
+def absolute_fragment(fragment, request):
+    """``fragment`` with its category and product image URLs made absolute for ``request``."""
+    data = json.loads(fragment)
+    data['image'] = absolute_url(request, data['image'])
+    for product in data['best_sellers'] + data['newest']:
+        product['image'] = absolute_url(request, product['image'])
+    return encode(data)
+
+
+def get_home_feed(request=None):
+    """
+    ``(etag, body)`` of the home page feed as ready-to-send JSON bytes, with
+    image URLs absolute for ``request`` (relative without one).
+
+    The assembled feed is kept per origin for ``MAX_AGE`` seconds, which bounds
+    how stale hot searches get. Category fragments are kept for
+    ``FRAGMENT_MAX_AGE`` or until a product in that subtree changes, so a
+    rebuild only queries the categories that were touched or whose sales
+    ranks are due for a refresh.
+    """
+    options = get_feed_settings()
+    tree = get_category_tree()
+    origin = request.build_absolute_uri('/') if request is not None else ''
+    key = feed_key(tree.version, get_feed_revision(), origin)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    fragments = get_fragments(tree, home_categories(tree))
+    if request is not None:
+        fragments = [absolute_fragment(fragment, request) for fragment in fragments]
+    hot_searches = encode(top_terms('trending', options['HOT_SEARCHES']))
+    body = b'{"categories":[' + b','.join(fragments) + b'],"hot_searches":' + hot_searches + b'}'
+    feed = (hashlib.blake2b(body, digest_size=16).hexdigest(), body)
+    cache.set(key, feed, invalidated_timeout(options['MAX_AGE']))
+    return feed
+
+
+def invalidate_home_feed(category_id=None):
+    """Retire the assembled feeds and drop the fragments of ``category_id`` and its ancestors."""
+    cache.set(FEED_REVISION_KEY, uuid.uuid4().hex, invalidated_timeout(None))
+    if category_id is not None:
+        tree = get_category_tree()
+        cache.delete_many([fragment_key(tree.version, node['id']) for node in tree.ancestors(category_id)])
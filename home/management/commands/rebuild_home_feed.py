@@ -0,0 +1,23 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from api.caching import is_process_local
+from home.feed import fragment_key, get_fragments, home_categories, invalidate_home_feed
+from products.category_tree import get_category_tree
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the home page feed fragments from scratch; run it periodically to keep sales ranks '
+            'fresh. The web workers pick them up through the cache, which therefore has to be shared.')
+
+    def handle(self, *args, **options):
+        if is_process_local():
+            raise CommandError('The default cache is process-local, so the web workers would never see the '
+                               'rebuilt feed. Configure a shared cache (REDIS_URL or the database cache).')
+        tree = get_category_tree()
+        nodes = home_categories(tree)
+        cache.delete_many([fragment_key(tree.version, node['id']) for node in nodes])
+        invalidate_home_feed()
+        fragments = get_fragments(tree, nodes)
+        self.stdout.write(self.style.SUCCESS(
+            f'Home feed rebuilt: {len(fragments)} categories, {sum(map(len, fragments))} bytes.'))
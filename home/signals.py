@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from products.catalog import CatalogImporter, catalog_imported
+from products.models import Product
+from .feed import invalidate_home_feed
+
+
+@receiver(pre_save, sender=Product)
+def product_saving(sender, instance, raw=False, **kwargs):
+    if not raw and instance.pk:
+        instance._home_previous_category_id = Product.objects.filter(pk=instance.pk).values_list(
+            'category_id', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    for category_id in {instance.category_id, getattr(instance, '_home_previous_category_id', None)}:
+        if category_id is not None:
+            invalidate_home_feed(category_id)
+
+
+@receiver(catalog_imported, sender=CatalogImporter)
+def catalog_changed(sender, category_ids, **kwargs):
+    for category_id in category_ids:
+        invalidate_home_feed(category_id)
@@ -1,3 +1,86 @@
-from django.test import TestCase
+import io
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from products.category_tree import get_category_tree
+from products.models import Category, Image, Product
+
+
+class HomeFeedTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.digital = Category.objects.create(name='Digital', slug='digital', show_in_home=True)
+        self.phones = Category.objects.create(name='Phones', slug='phones', parent=self.digital, show_in_home=False)
+        self.books = Category.objects.create(name='Books', slug='books', show_in_home=False,
+                                             show_in_home_no_product=True)
+        Category.objects.create(name='Hidden', slug='hidden', show_in_home=False)
+        self.phone = Product.objects.create(nameFa='phone', slug='phone', price=1, category=self.phones, sold=5)
+        self.laptop = Product.objects.create(nameFa='laptop', slug='laptop', price=1, category=self.digital, sold=1)
+        get_category_tree()
+
+    def get(self, **headers):
+        return self.client.get(reverse('home-feed'), **headers)
+
+    def test_feed_lists_home_categories_with_products(self):
+        response = self.get()
+        data = response.json()['data']
+
+        self.assertEqual([category['slug'] for category in data['categories']], ['digital', 'books'])
+        digital, books = data['categories']
+        self.assertEqual([product['slug'] for product in digital['best_sellers']], ['phone', 'laptop'])
+        self.assertEqual([product['slug'] for product in digital['newest']], ['laptop', 'phone'])
+        self.assertEqual(books['best_sellers'], [])
+        self.assertEqual(response.json()['userPermission'], '5')
+
+    def test_etag_revalidation_and_cached_snapshot(self):
+        etag = self.get()['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual([query for query in queries if 'django_cache' not in query['sql']], [])
+
+    def test_product_changes_rebuild_only_their_category(self):
+        etag = self.get()['ETag']
+        self.phone.nameFa = 'renamed'
+        self.phone.category = self.books
+        self.phone.save()
+
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        digital = response.json()['data']['categories'][0]
+        self.assertEqual([product['slug'] for product in digital['best_sellers']], ['laptop'])
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'shop.example'])
+    def test_image_urls_are_absolute_for_the_requesting_host(self):
+        self.phone.images.add(Image.objects.create(image='product-img/phone.jpg'))
+        self.books.image = 'media/category/books.jpg'
+        self.books.save()
+
+        data = self.get().json()['data']
+        digital, books = data['categories']
+        self.assertEqual(digital['best_sellers'][0]['image'], 'http://testserver/media/product-img/phone.jpg')
+        self.assertEqual(books['image'], 'http://testserver/media/media/category/books.jpg')
+        other = self.client.get(reverse('home-feed'), HTTP_HOST='shop.example').json()['data']
+        self.assertEqual(other['categories'][0]['best_sellers'][0]['image'],
+                         'http://shop.example/media/product-img/phone.jpg')
+
+    def test_rebuild_refreshes_sales_ranks(self):
+        etag = self.get()['ETag']
+        # Sales are counted with update(), which sends no signal.
+        Product.objects.filter(id=self.laptop.id).update(sold=10)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        call_command('rebuild_home_feed', stdout=io.StringIO())
+        digital = self.get().json()['data']['categories'][0]
+        self.assertEqual([product['slug'] for product in digital['best_sellers']], ['laptop', 'phone'])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_rebuild_requires_a_shared_cache(self):
+        with self.assertRaises(CommandError):
+            call_command('rebuild_home_feed', stdout=io.StringIO())
@@ -1,7 +1,6 @@
 from django.urls import path
-# from .views import CategoryListView, CategoryDetailView
+from .views import HomeFeedView
 
 urlpatterns = [
-    # path('categories/', CategoryListView.as_view(), name='category-list'),
-    # path('categories/<int:pk>/', CategoryDetailView.as_view(), name='category-detail'),
+    path('home/feed/', HomeFeedView.as_view(), name='home-feed'),
 ]
@@ -1,16 +1,31 @@
-from django.shortcuts import render
-from rest_framework import generics
-from products.models import Category
-from products.serializers import CategorySerializer
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework.views import APIView
 
+from api.roles import get_user_role
+from .feed import get_home_feed
 
-# class CategoryListView(generics.ListAPIView):
-#     queryset = Category.objects.filter(parent__isnull=True)  # نمایش فقط دسته‌بندی‌های ریشه
-#     serializer_class = CategorySerializer
-#
-#
-# class CategoryDetailView(generics.RetrieveAPIView):
-#     queryset = Category.objects.all()
-#     serializer_class = CategorySerializer
 
+class HomeFeedView(APIView):
+    """
+    The home page feed, sent as pre-serialized bytes in the usual response
+    envelope. The ETag covers the feed and the caller's role, so a client that
+    already has the current feed gets an empty 304.
+    """
 
+    def get(self, request, *args, **kwargs):
+        feed_etag, body = get_home_feed(request)
+        role = get_user_role(request.user)
+        etag = f'"{feed_etag}-{role}"'
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                b'{"is_success":true,"data":' + body + b',"errors":null,"userPermission":"' + role.encode() + b'"}',
+                content_type='application/json',
+            )
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -96,6 +96,31 @@ DATABASES = {
     }
 }
 
+# Cache
+# Category tree versions, cached product pages and the home feed are invalidated across workers
+# through the cache, so it must be shared: Redis when REDIS_URL is set (e.g. redis://127.0.0.1:6379/1),
+# otherwise the django_cache table (create it with manage.py createcachetable). On a process-local
+# cache such as LocMemCache, entries that invalidation should retire expire after
+# PROCESS_LOCAL_CACHE_TIMEOUT seconds instead (api.caching).
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+
+PROCESS_LOCAL_CACHE_TIMEOUT = 30
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -146,8 +171,9 @@ SPECTACULAR_SETTINGS = {
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Builds request.user from the token claims and loads the row only when a view needs it.
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         # 'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -168,7 +194,103 @@ SIMPLE_JWT = {
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# CustomUserBackend extends ModelBackend (permissions, is_active) and also accepts emails and phone
+# numbers; listing ModelBackend as well would look up and hash every failed login twice.
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
     'users.backends.CustomUserBackend',
 ]
+
+# Product search: PRODUCT_SEARCH_BACKEND (dotted path) overrides the default, which is
+# SQLite FTS5 or Postgres tsvector depending on the database, with an icontains fallback.
+# Searches ordered by rank return at most PRODUCT_SEARCH_MAX_RESULTS products; sorted or
+# keyset-paged searches return every match.
+PRODUCT_SEARCH_MAX_RESULTS = 500
+
+# Search history is buffered in memory and written with bulk_create from a background thread
+# when MAX_SIZE terms are pending or every INTERVAL seconds (INTERVAL None: flush inline when full).
+SEARCH_HISTORY_BUFFER = {
+    'MAX_SIZE': 100,
+    'INTERVAL': 5.0,
+}
+SEARCH_TRENDING_HALF_LIFE = timedelta(hours=6)
+
+# Adding to the cart takes the quantity out of Product.NumberOfProduct; cart items not touched
+# for this long are removed and their stock is returned (manage.py release_expired_reservations).
+CART_RESERVATION_TTL = timedelta(minutes=30)
+
+# Codes such as Product.product_code come from a counter row (products.codes). Each worker reserves
+# a block of this many codes per round trip and commits it at once, on a connection of its own when
+# the save runs inside a transaction, so concurrent inserts do not queue on the counter row. Codes
+# left in a block are skipped on restart, as are codes of rolled back inserts. A block size of 1
+# keeps codes gap-free instead: every code is taken inside the saving transaction, which holds the
+# counter row lock until it ends.
+CODE_SEQUENCE_BLOCK_SIZES = {
+    'product_code': 20,
+}
+
+# Product page views are summed in memory and added to Product.view from a background thread
+# when MAX_SIZE products are pending or every INTERVAL seconds. A viewer (user, session or IP)
+# is counted once per product every DEDUPE_WINDOW seconds; 0 counts every hit.
+PRODUCT_VIEW_COUNTER = {
+    'MAX_SIZE': 1000,
+    'INTERVAL': 10.0,
+    'DEDUPE_WINDOW': 30 * 60,
+}
+
+# Product pages are cached without per-user fields in this cache alias and invalidated by signals
+# in products.signals. The alias must be shared between workers; on a process-local cache such as
+# LocMemCache pages are not cached at all.
+PRODUCT_DETAIL_CACHE = 'default'
+PRODUCT_DETAIL_CACHE_TIMEOUT = 60 * 60
+
+# Related products shown on a product page; rebuild the index with manage.py build_related_products.
+# Orders, carts, users' favorites and tags with more than RELATED_PRODUCTS_MAX_GROUP_SIZE products
+# are not counted as shared signals.
+RELATED_PRODUCTS_LIMIT = 10
+RELATED_PRODUCTS_MAX_GROUP_SIZE = 200
+
+# Newest products embedded in each category payload; the rest are paged with page_size/cursor.
+CATEGORY_PRODUCT_PREVIEW_SIZE = 10
+
+# Home page feed (home.feed): products per show_in_home category, hot searches shown, and how many
+# seconds the assembled feed and each category fragment are served before they are rebuilt.
+HOME_FEED = {
+    'PRODUCTS_PER_CATEGORY': 10,
+    'HOT_SEARCHES': 10,
+    'MAX_AGE': 5 * 60,
+    'FRAGMENT_MAX_AGE': 60 * 60,
+}
+
+# Uploaded product and category images are resized to these boxes as JPEG and WebP by
+# products.derivatives, on WORKERS background threads after the upload commits (0 renders inline).
+# Backfill existing images with manage.py generate_image_derivatives.
+IMAGE_DERIVATIVES = {
+    'SIZES': {
+        'thumb': (160, 160),
+        'card': (320, 320),
+        'medium': (800, 800),
+    },
+    'JPEG_QUALITY': 85,
+    'WEBP_QUALITY': 80,
+    'WORKERS': 2,
+}
+
+# Seconds an image file reused by an identical upload is kept after its last Image row is gone,
+# since that upload may not have committed its row yet. Such files are deleted later by
+# manage.py sweep_image_files.
+IMAGE_FILE_GRACE_PERIOD = 60 * 60
+
+# Password checks on login run on a per-process thread pool (users.hashing) so that a login burst
+# keeps at most WORKERS cores busy hashing; beyond MAX_PENDING queued hashes, logins wait TIMEOUT
+# seconds for a slot and then get 503. Compare hashers with manage.py benchmark_password_hashers.
+PASSWORD_HASHING = {
+    'WORKERS': 2,
+    'MAX_PENDING': 32,
+    'TIMEOUT': 5.0,
+}
+
+# Async product views (products.async_views) can run independent reads, such as the cached product
+# page and the favorite check, on separate threads and database connections at once. This needs
+# persistent or pooled connections (CONN_MAX_AGE) and is ignored without them; otherwise the reads
+# run one after another on Django's shared async ORM thread.
+ASYNC_CONCURRENT_READS = False
@@ -0,0 +1,50 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from api.exceptions import CustomValidationError
+from products.models import Product
+from .models import Cart, CartItem, Order, OrderItem
+
+
+def checkout(user, address=None):
+    """
+    Turn the user's cart into an order. Stock was already taken when the
+    items were added (see ``orders.stock.reserve``), so finalizing only
+    records the order lines, bumps ``sold`` for every product with one
+    set-based UPDATE and empties the cart, all in one transaction.
+
+    The cart items are locked too: ``release_expired`` or a removal from the
+    cart running at the same time would otherwise return their stock while
+    they are being sold. Whichever comes second finds the items gone.
+    """
+    with transaction.atomic():
+        cart_ids = list(Cart.objects.select_for_update().filter(user=user).values_list('id', flat=True))
+        items = list(
+            CartItem.objects.select_for_update(of=('self',)).filter(cart_id__in=cart_ids)
+            .select_related('product').only('quantity', 'product__price', 'product__discount')
+        )
+        if not items:
+            raise CustomValidationError(['سبد خرید خالی است'])
+
+        quantities = Counter()
+        prices = {}
+        for item in items:
+            quantities[item.product_id] += item.quantity
+            prices[item.product_id] = item.product.final_price()
+
+        order = Order.objects.create(
+            user=user, total_price=sum(prices[product_id] * quantity for product_id, quantity in quantities.items()))
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_id, quantity=quantity, price=prices[product_id])
+            for product_id, quantity in quantities.items()
+        ])
+        Product.objects.filter(id__in=quantities).update(sold=F('sold') + Case(
+            *[When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+            default=Value(0), output_field=IntegerField(),
+        ))
+        CartItem.objects.filter(id__in=[item.id for item in items]).delete()
+        if address is not None:
+            order.addresses.add(address)
+    return order
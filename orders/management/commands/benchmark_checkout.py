@@ -0,0 +1,82 @@
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from orders.checkout import checkout
+from orders.models import Cart, CartItem, Order
+from products.models import Product
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Check out many carts from concurrent threads against a shared set of products and report '
+            'throughput and whether Product.sold adds up. The benchmark data is deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--products', type=int, default=20)
+        parser.add_argument('--items', type=int, default=5, help='Cart lines per order.')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise CommandError('The benchmark needs a database that several threads can share.')
+        tag = uuid.uuid4().hex[:8]
+        Product.objects.bulk_create([
+            Product(nameFa=f'bench {index}', slug=f'bench-checkout-{tag}-{index}', price=1000, NumberOfProduct=0)
+            for index in range(options['products'])
+        ])
+        product_ids = list(Product.objects.filter(slug__startswith=f'bench-checkout-{tag}-').values_list('id', flat=True))
+        User.objects.bulk_create([User(username=f'bench-{tag}-{index}') for index in range(options['orders'])])
+        users = list(User.objects.filter(username__startswith=f'bench-{tag}-'))
+        Cart.objects.bulk_create([Cart(user=user) for user in users])
+        carts = list(Cart.objects.filter(user__in=users))
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product_id=product_ids[(index + line) % len(product_ids)], quantity=1)
+            for index, cart in enumerate(carts) for line in range(options['items'])
+        ])
+
+        pending = list(users)
+        lock = threading.Lock()
+        failures = []
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        user = pending.pop()
+                    for attempt in range(20):
+                        try:
+                            checkout(user)
+                            break
+                        except OperationalError:  # SQLite "database is locked"
+                            time.sleep(0.01 * (attempt + 1))
+                    else:
+                        failures.append(user.id)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        completed = options['orders'] - len(failures)
+        sold = sum(Product.objects.filter(id__in=product_ids).values_list('sold', flat=True))
+        self.stdout.write(f'{completed} checkouts in {elapsed:.2f}s ({completed / elapsed:,.0f}/s), '
+                          f'{len(failures)} failed')
+        self.stdout.write(f'sold: {sold}, expected {completed * options["items"]}')
+
+        Order.objects.filter(user__in=users).delete()
+        User.objects.filter(id__in=[user.id for user in users]).delete()
+        Product.objects.filter(id__in=product_ids).delete()
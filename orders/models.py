@@ -32,6 +32,16 @@ class Order(models.Model):
         return self.user.username
 
 
+class OrderItem(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items', verbose_name='سفارش')
+    product = models.ForeignKey(Product, null=True, on_delete=models.SET_NULL, verbose_name='محصول')
+    quantity = models.PositiveIntegerField(verbose_name='تعداد')
+    price = models.IntegerField(verbose_name='قیمت واحد')
+
+    def __str__(self):
+        return f'{self.order_id}: {self.product_id} x {self.quantity}'
+
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='carts')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -44,4 +54,5 @@ class Cart(models.Model):
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
-    quantity = models.PositiveIntegerField(default=1)
\ No newline at end of file
+    quantity = models.PositiveIntegerField(default=1)
+    reserved_until = models.DateTimeField(null=True, blank=True, db_index=True)
@@ -0,0 +1,97 @@
+import datetime
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from api.exceptions import CustomValidationError
+from products.models import Product
+from .models import Cart, CartItem
+
+
+def get_reservation_ttl():
+    return getattr(settings, 'CART_RESERVATION_TTL', datetime.timedelta(minutes=30))
+
+
+def reserve(user, product_id, quantity, now=None):
+    """
+    Move ``quantity`` of a product from stock into the user's cart.
+
+    Stock is taken with one conditional ``UPDATE ... WHERE NumberOfProduct >= quantity``,
+    so concurrent requests can never oversell: the database applies them one at a
+    time and the losers match no row. The user's cart row is locked for the whole
+    transaction, which keeps ``MaximumBuy`` honest when the same user adds twice at once.
+    """
+    if quantity <= 0:
+        raise CustomValidationError(['تعداد باید بیشتر از صفر باشد'])
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        cart, _ = Cart.objects.get_or_create(user=user)
+        Cart.objects.select_for_update().filter(pk=cart.pk).first()
+
+        in_cart = CartItem.objects.filter(cart__user=user, product_id=product_id).aggregate(
+            total=Sum('quantity'))['total'] or 0
+
+        taken = Product.objects.filter(
+            Q(MaximumBuy__isnull=True) | Q(MaximumBuy__gte=in_cart + quantity),
+            id=product_id,
+            NumberOfProduct__gte=quantity,
+        ).update(NumberOfProduct=F('NumberOfProduct') - quantity)
+        if not taken:
+            raise CustomValidationError([_rejection_reason(product_id, quantity, in_cart)])
+
+        reserved_until = now + get_reservation_ttl()
+        item, created = CartItem.objects.get_or_create(
+            cart=cart, product_id=product_id,
+            defaults={'quantity': quantity, 'reserved_until': reserved_until},
+        )
+        if not created:
+            CartItem.objects.filter(pk=item.pk).update(
+                quantity=F('quantity') + quantity, reserved_until=reserved_until)
+    return item
+
+
+def _rejection_reason(product_id, quantity, in_cart):
+    product = Product.objects.filter(id=product_id).only('NumberOfProduct', 'MaximumBuy').first()
+    if product is None:
+        return 'محصول مورد نظر وجود ندارد'
+    if product.NumberOfProduct <= 0:
+        return 'محصول دیگر در انبار موجود نیست'
+    if product.MaximumBuy is not None and in_cart + quantity > product.MaximumBuy:
+        return 'تعداد مورد نظر از حداکثر تعداد مجاز بیشتر است'
+    return 'تعداد درخواستی از موجودی بیشتر است'
+
+
+def release(cart_items):
+    """Delete ``cart_items`` and return their quantities to stock. Returns the number of items released."""
+    with transaction.atomic():
+        rows = list(
+            cart_items.select_for_update().values_list('id', 'product_id', 'quantity')
+        )
+        if not rows:
+            return 0
+        CartItem.objects.filter(id__in=[row[0] for row in rows]).delete()
+
+        returned = Counter()
+        for _, product_id, quantity in rows:
+            returned[product_id] += quantity
+        for product_id, quantity in returned.items():
+            Product.objects.filter(id=product_id).update(NumberOfProduct=F('NumberOfProduct') + quantity)
+    return len(rows)
+
+
+def release_expired(now=None, batch_size=500):
+    """Release every reservation that ran out before ``now``, ``batch_size`` items per transaction."""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        ids = list(
+            CartItem.objects.filter(reserved_until__lt=now).order_by('reserved_until')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return released
+        released += release(CartItem.objects.filter(id__in=ids, reserved_until__lt=now))
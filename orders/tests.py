@@ -1,3 +1,154 @@
-from django.test import TestCase
+import datetime
+import threading
+import time
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from api.exceptions import CustomValidationError
+from products.models import Product
+from . import stock
+from .models import CartItem, Order
+
+User = get_user_model()
+
+
+class StockReservationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='Secret@123')
+        self.product = Product.objects.create(nameFa='product', slug='product', price=1, NumberOfProduct=5,
+                                              MaximumBuy=3)
+        self.client.force_authenticate(self.user)
+
+    def add(self, quantity):
+        return self.client.post(reverse('add-to-cart'), {'product': self.product.id, 'quantity': quantity})
+
+    def test_add_to_cart_reserves_stock(self):
+        self.assertTrue(self.add(2).data['is_success'])
+        self.assertTrue(self.add(1).data['is_success'])
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.NumberOfProduct, 2)
+        item = CartItem.objects.get(cart__user=self.user)
+        self.assertEqual(item.quantity, 3)
+        self.assertIsNotNone(item.reserved_until)
+
+    def test_maximum_buy_and_stock_are_enforced(self):
+        self.add(3)
+        response = self.add(1)
+        self.assertFalse(response.data['is_success'])
+        self.assertEqual(response.data['errors'], ['تعداد مورد نظر از حداکثر تعداد مجاز بیشتر است'])
+
+        Product.objects.filter(id=self.product.id).update(MaximumBuy=None)
+        response = self.add(3)
+        self.assertEqual(response.data['errors'], ['تعداد درخواستی از موجودی بیشتر است'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.NumberOfProduct, 2)
+
+    def test_remove_from_cart_returns_stock(self):
+        self.add(2)
+        response = self.client.post(reverse('remove-from-cart'), {'product': self.product.id})
+        self.assertTrue(response.data['is_success'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.NumberOfProduct, 5)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_expired_reservations_are_released(self):
+        past = timezone.now() - datetime.timedelta(days=1)
+        stock.reserve(self.user, self.product.id, 2, now=past)
+        other = User.objects.create_user(username='other', password='Secret@123')
+        stock.reserve(other, self.product.id, 1)
+
+        self.assertEqual(stock.release_expired(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.NumberOfProduct, 4)
+        self.assertEqual(list(CartItem.objects.values_list('cart__user', flat=True)), [other.id])
+
+
+class StockReservationConcurrencyTests(TransactionTestCase):
+    threads = 12
+    initial_stock = 5
+
+    def setUp(self):
+        # SQLite's in-memory test database serializes the threads on its table locks; run this
+        # against PostgreSQL or a file database (DATABASES TEST NAME) to exercise row locking.
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('needs a test database the threads can share')
+
+    def test_concurrent_reservations_never_oversell(self):
+        product = Product.objects.create(nameFa='product', slug='product', price=1, NumberOfProduct=self.initial_stock)
+        users = [User.objects.create_user(username=f'buyer{i}', password='Secret@123') for i in range(self.threads)]
+        start = threading.Barrier(self.threads)
+        results = []
+
+        def buy(user):
+            start.wait()
+            try:
+                for attempt in range(50):
+                    try:
+                        stock.reserve(user, product.id, 1)
+                        results.append(True)
+                        return
+                    except CustomValidationError:
+                        results.append(False)
+                        return
+                    except OperationalError:  # SQLite "database is locked"
+                        time.sleep(0.01 * (attempt + 1))
+                results.append(None)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=buy, args=(user,)) for user in users]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        product.refresh_from_db()
+        sold = results.count(True)
+        self.assertEqual(product.NumberOfProduct, self.initial_stock - sold)
+        self.assertEqual(CartItem.objects.count(), sold)
+        self.assertEqual(sold, self.initial_stock)
+        self.assertEqual(results.count(False), self.threads - self.initial_stock)
+
+
+class CheckoutTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='Secret@123')
+        self.phone = Product.objects.create(nameFa='phone', slug='phone', price=1000, discount=10, NumberOfProduct=5)
+        self.book = Product.objects.create(nameFa='book', slug='book', price=200, NumberOfProduct=5)
+        self.client.force_authenticate(self.user)
+
+    def test_checkout_creates_order_and_updates_sold_in_one_statement(self):
+        stock.reserve(self.user, self.phone.id, 2)
+        stock.reserve(self.user, self.book.id, 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('checkout'))
+
+        self.assertTrue(response.data['is_success'])
+        order = Order.objects.get(id=response.data['data']['order'])
+        self.assertEqual(order.total_price, 2 * 900 + 3 * 200)
+        self.assertEqual(sorted(order.items.values_list('product__slug', 'quantity', 'price')),
+                         [('book', 3, 200), ('phone', 2, 900)])
+        self.assertEqual(dict(Product.objects.values_list('slug', 'sold')), {'phone': 2, 'book': 3})
+        self.assertEqual(dict(Product.objects.values_list('slug', 'NumberOfProduct')), {'phone': 3, 'book': 2})
+        self.assertFalse(CartItem.objects.exists())
+        product_updates = [query for query in queries if query['sql'].startswith('UPDATE "products_product"')]
+        self.assertEqual(len(product_updates), 1)
+
+    def test_empty_cart_cannot_be_checked_out(self):
+        response = self.client.post(reverse('checkout'))
+        self.assertEqual(response.data['errors'], ['سبد خرید خالی است'])
+        self.assertFalse(Order.objects.exists())
+
+    def test_increase_sold_only_touches_sold(self):
+        Product.objects.filter(id=self.phone.id).update(sold=4, nameFa='renamed')
+        self.phone.increase_sold(2)
+        self.assertEqual(self.phone.sold, 6)
+        self.assertEqual(Product.objects.get(id=self.phone.id).nameFa, 'renamed')
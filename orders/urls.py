@@ -1,10 +1,11 @@
 from django.urls import path
-from .views import AddToCartView, RemoveFromCartView, CartDetailView,ApplyCouponView,CouponCreateView
+from .views import AddToCartView, RemoveFromCartView, CartDetailView,ApplyCouponView,CouponCreateView, CheckoutView
 
 urlpatterns = [
     path('cart/add/', AddToCartView.as_view(), name='add-to-cart'),
     path('cart/remove/', RemoveFromCartView.as_view(), name='remove-from-cart'),
     path('cart/', CartDetailView.as_view(), name='cart-detail'),
+    path('cart/checkout/', CheckoutView.as_view(), name='checkout'),
     path('cart/coupons/create/', CouponCreateView.as_view(), name='coupon-create'),
     path('cart/coupons/apply/', ApplyCouponView.as_view(), name='coupon-apply'),
 ]
\ No newline at end of file
@@ -8,46 +8,26 @@ from rest_framework.permissions import IsAuthenticated
 from products.models import Product, Coupon
 from rest_framework.views import APIView
 from django.utils import timezone
+from api.exceptions import CustomValidationError
+from users.models import UserAddress
+from . import stock
+from .checkout import checkout
 
 
 class AddToCartView(StandardResponseMixin, generics.GenericAPIView):
     serializer_class = CartItemSerializer
 
     def post(self, request, *args, **kwargs):
-        user = request.user
         product_id = request.data.get('product')
-        quantity = int(request.data.get('quantity', 1))
-
         try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
-            return self.error_response(errors=['محصول مورد نظر وجود ندارد'])
-
-        if product.NumberOfProduct <= 0:
-            return self.error_response(errors=['محصول دیگر در انبار موجود نیست'])
-
-        user_cart_items = CartItem.objects.filter(cart__user=user, product=product)
-        total_quantity_in_cart = sum(item.quantity for item in user_cart_items)
-
-        if total_quantity_in_cart + quantity > product.MaximumBuy and product.MaximumBuy is not None:
-            return self.error_response(errors=['تعداد مورد نظر از حداکثر تعداد مجاز بیشتر است'])
+            quantity = int(request.data.get('quantity', 1))
+        except (TypeError, ValueError):
+            return self.error_response(errors=['تعداد باید عدد باشد'])
 
-        if quantity > product.NumberOfProduct:
-            return self.error_response(errors=['تعداد درخواستی از موجودی بیشتر است'])
-
-        cart, created = Cart.objects.get_or_create(user=user)
-
-        cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
-        else:
-            cart_item.quantity = quantity
-            cart_item.save()
-
-        product.NumberOfProduct -= quantity
-        product.save()
+        try:
+            stock.reserve(request.user, product_id, quantity)
+        except CustomValidationError as e:
+            return self.error_response(errors=e.detail)
 
         return self.success_response(data=['محصول به سبد خرید اضافه شد'], user=request.user)
 
@@ -59,15 +39,29 @@ class RemoveFromCartView(StandardResponseMixin, generics.GenericAPIView):
         user = request.user
         product_id = request.data.get('product')
 
-        try:
-            cart = Cart.objects.get(user=user)
-            cart_item = CartItem.objects.get(cart=cart, product_id=product_id)
-            cart_item.delete()
-            return self.success_response(data=['"محصول از سبد خرید حذف شد"'])
-        except Cart.DoesNotExist:
+        if not Cart.objects.filter(user=user).exists():
             return self.error_response(errors=['سبد خرید پیدا نشد'])
-        except CartItem.DoesNotExist:
+        if not stock.release(CartItem.objects.filter(cart__user=user, product_id=product_id)):
             return self.error_response(errors=['محصول در سبد خرید پیدا نشد'])
+        return self.success_response(data=['"محصول از سبد خرید حذف شد"'])
+
+
+class CheckoutView(StandardResponseMixin, generics.GenericAPIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        address = None
+        address_id = request.data.get('address')
+        if address_id:
+            address = UserAddress.objects.filter(id=address_id, user=request.user).first()
+            if address is None:
+                return self.error_response(errors=['آدرس مورد نظر وجود ندارد'])
+
+        try:
+            order = checkout(request.user, address)
+        except CustomValidationError as e:
+            return self.error_response(errors=e.detail)
+        return self.success_response(data={'order': order.id, 'total_price': order.total_price}, user=request.user)
 
 
 class CartDetailView(StandardResponseMixin, generics.RetrieveAPIView):
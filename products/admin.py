@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Product, Attribute, ProductAttribute, Category, Tag, Image, Comment, Favorite,SearchHistory
+from .models import Product, Attribute, ProductAttribute, Category, Tag, Image, Comment, Favorite,SearchHistory, \
+    SearchTermStat
 
 admin.site.register(Tag)
 admin.site.register(Image)
@@ -32,4 +33,10 @@ class AttributeAdmin(admin.ModelAdmin):
 
 admin.site.register(Favorite)
 
-admin.site.register(SearchHistory)
\ No newline at end of file
+admin.site.register(SearchHistory)
+
+
+@admin.register(SearchTermStat)
+class SearchTermStatAdmin(admin.ModelAdmin):
+    list_display = ('term', 'total_count', 'last_searched_at')
+    search_fields = ('term',)
@@ -1,6 +1,38 @@
-from django.apps import AppConfig
+from django.apps import AppConfig, apps as global_apps
+from django.db.models.signals import post_migrate
+
+
+def create_search_schema(sender, using, **kwargs):
+    from .search import get_search_backend
+    get_search_backend().ensure_schema()
+
+
+def backfill_comment_vote_counters(sender, using, apps=global_apps, **kwargs):
+    """
+    Fill likes_count and dislikes_count of comments voted on before the columns
+    existed, which start at 0 (migrations are generated per deployment, so this
+    runs after ``migrate`` instead of inside the migration adding them). The
+    vote views keep a comment with votes off 0/0, so once filled nothing is
+    left to update.
+    """
+    from .comment_votes import reconcile_vote_counters
+    try:
+        Comment = apps.get_model('products', 'Comment')
+        CommentLikeDislike = apps.get_model('products', 'CommentLikeDislike')
+    except LookupError:
+        return
+    if 'likes_count' not in {field.name for field in Comment._meta.get_fields()}:
+        return
+    comments = Comment.objects.using(using)
+    stale = comments.filter(likes_count=0, dislikes_count=0, likes_dislikes__isnull=False).values('pk')
+    reconcile_vote_counters(comments.filter(pk__in=stale), CommentLikeDislike.objects.using(using))
 
 
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(create_search_schema, sender=self)
+        post_migrate.connect(backfill_comment_vote_counters, sender=self)
@@ -0,0 +1,94 @@
+from asgiref.sync import sync_to_async
+from rest_framework.filters import OrderingFilter
+from django_filters.rest_framework import DjangoFilterBackend
+
+from api.async_views import AsyncAPIView, gather_reads
+from api.pagination import KeysetPagination
+from api.roles import get_user_role
+from .comment_tree import load_comment_threads
+from .detail_cache import VOLATILE_FIELDS, get_product_detail, is_favorited, render_product_detail
+from .models import Product
+from .search_rollups import top_terms
+from .serializers import CommentSerializer, HotSearchSerializer, ProductSerializer
+from .view_counter import arecord_view
+from .views import HotSearchView, ProductListFilter, ProductSearchFilter
+
+# The async views answer GET with the same payloads as their synchronous counterparts in
+# products.views, which keep handling writes and WSGI deployments.
+
+
+class AsyncProductListView(AsyncAPIView):
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, OrderingFilter]
+    filterset_class = ProductListFilter
+    ordering_fields = ['price', 'created_at', 'sold']
+    keyset_ordering_fields = ['created_at', 'price', 'sold']
+
+    def get_queryset(self):
+        order_by = self.request.query_params.get('order_by', 'created_at')
+        if self.request.query_params.get('order_type', 'asc') == 'desc':
+            order_by = f'-{order_by}'
+        queryset = ProductSerializer.setup_eager_loading(Product.objects.order_by(order_by))
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(self.request, queryset, self)
+        return queryset
+
+    def serialize(self, products):
+        context = {'request': self.request, 'view': self}
+        context.update(ProductSerializer.get_batch_context(products, self.user))
+        return ProductSerializer(products, many=True, context=context).data
+
+    async def get(self, request):
+        paginator = KeysetPagination()
+        # Filters may read the category tree or the search index, which are synchronous.
+        queryset = await sync_to_async(self.get_queryset)()
+        page = await paginator.apaginate_queryset(queryset, self.request, self)
+        products = page if page is not None else [product async for product in queryset]
+        data = await sync_to_async(self.serialize)(products)
+        if page is not None:
+            return await self.paginated_response(data=data, next_cursor=paginator.next_cursor, user=self.user)
+        return await self.success_response(data=data, user=self.user)
+
+
+class AsyncProductDetailView(AsyncAPIView):
+    async def get(self, request, pk):
+        state = await Product.objects.filter(pk=pk).values('id', 'category_id', *VOLATILE_FIELDS).afirst()
+        if state is None:
+            return self.error_response(errors=['محصول وجود ندارد'])
+        await arecord_view(request, state['id'], self.user)
+
+        # The cached page (product, its comment ids and related products), the favorite flag and
+        # the purchase role do not depend on each other.
+        (product, related_products), favorited, role = await gather_reads(
+            (get_product_detail, state['id'], state['category_id']),
+            (is_favorited, self.user, state['id']),
+            (get_user_role, self.user),
+        )
+        if product is None:
+            return self.error_response(errors=['محصول وجود ندارد'])
+
+        return await self.success_response(
+            data=render_product_detail(request, state, product, related_products, favorited), role=role)
+
+
+class AsyncCommentListView(AsyncAPIView):
+    async def get(self, request, product_id):
+        if not await Product.objects.filter(id=product_id).aexists():
+            return self.error_response(errors=['این محصول وجود ندارد'])
+
+        threads = await sync_to_async(load_comment_threads)(product_id)
+        paginator = KeysetPagination()
+        page = paginator.paginate_list(threads, self.request, 'created_at')
+        data = CommentSerializer(page if page is not None else threads, many=True,
+                                 context={'request': self.request}).data
+        if page is not None:
+            return await self.paginated_response(data=data, next_cursor=paginator.next_cursor, user=self.user)
+        return await self.success_response(data=data, user=self.user)
+
+
+class AsyncHotSearchView(AsyncAPIView):
+    async def get(self, request):
+        period = self.request.query_params.get('period', 'all')
+        if period not in HotSearchView.periods:
+            period = 'all'
+        terms = await sync_to_async(top_terms)(period=period, limit=10)
+        return self.json_response(HotSearchSerializer(terms, many=True).data)
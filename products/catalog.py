@@ -0,0 +1,328 @@
+import csv
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Prefetch
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Attribute, Category, Image, Product, ProductAttribute, Tag
+from .detail_cache import invalidate_product_details
+from .signals import reindex_products
+from .storage import content_digest, content_name, file_digest
+
+# Column order of exported files. Imports accept any subset that includes the required columns;
+# a list column (tags, images, attributes) that is present replaces the product's current values.
+COLUMNS = ['slug', 'product_code', 'nameFa', 'nameEn', 'category', 'price', 'discount', 'NumberOfProduct',
+           'MaximumBuy', 'description', 'body', 'tags', 'images', 'attributes']
+REQUIRED_COLUMNS = ['slug', 'nameFa', 'price']
+TEXT_FIELDS = ['nameFa', 'nameEn', 'description', 'body']
+NUMBER_FIELDS = ['price', 'discount', 'NumberOfProduct', 'MaximumBuy']
+LIST_SEPARATOR = '|'
+
+# Sent with ``category_ids`` (the old and new categories of the products) after each imported chunk
+# commits; bulk writes send no post_save for caches keyed by category.
+catalog_imported = Signal()
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, file_format):
+    """Yield ``(line_number, row)`` from a CSV or JSON Lines stream without reading it all."""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                yield line_number, None
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def split_list(value):
+    if value is None or value == '':
+        return []
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value).split(LIST_SEPARATOR) if item.strip()]
+
+
+def parse_attributes(value):
+    if value is None or value == '':
+        return {}
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise RowError('attributes must be a JSON object')
+    if not isinstance(value, dict):
+        raise RowError('attributes must be a JSON object')
+    return {str(name).strip(): str(item) for name, item in value.items() if str(name).strip()}
+
+
+def parse_number(row, field):
+    value = row.get(field)
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{field} must be an integer')
+
+
+def check_value(model, field, value):
+    """Run the validators of ``model.field`` (max_length, value range, slug characters) on ``value``."""
+    model_field = model._meta.get_field(field)
+    try:
+        model_field.run_validators(model_field.to_python(value))
+    except ValidationError as e:
+        raise RowError(f'{field}: {" ".join(e.messages)}')
+
+
+def parse_row(row):
+    if not isinstance(row, dict):
+        raise RowError('not a JSON object')
+    missing = [column for column in REQUIRED_COLUMNS if row.get(column) in (None, '')]
+    if missing:
+        raise RowError(f'missing {", ".join(missing)}')
+
+    values = {field: row[field] for field in TEXT_FIELDS if field in row}
+    for field in NUMBER_FIELDS:
+        if field in row:
+            values[field] = parse_number(row, field)
+    if values['price'] is None:
+        raise RowError('missing price')
+    if values.get('NumberOfProduct') is None:
+        values.pop('NumberOfProduct', None)
+    if values['price'] < 0:
+        raise RowError('price must not be negative')
+    if not 0 <= (values.get('discount') or 0) <= 100:
+        raise RowError('discount must be a percentage between 0 and 100')
+
+    parsed = {'slug': str(row['slug']).strip(), 'values': values}
+    check_value(Product, 'slug', parsed['slug'])
+    for field, value in values.items():
+        check_value(Product, field, value)
+    if 'category' in row:
+        parsed['category'] = str(row['category'] or '').strip() or None
+        check_value(Category, 'slug', parsed['category'])
+    if 'tags' in row:
+        parsed['tags'] = split_list(row['tags'])
+        for title in parsed['tags']:
+            check_value(Tag, 'title', title)
+    if 'images' in row:
+        parsed['images'] = split_list(row['images'])
+    if 'attributes' in row:
+        parsed['attributes'] = parse_attributes(row['attributes'])
+        for name, value in parsed['attributes'].items():
+            check_value(Attribute, 'name', name)
+            check_value(ProductAttribute, 'value', value)
+    return parsed
+
+
+class CatalogImporter:
+    """
+    Upsert products by slug, ``chunk_size`` rows per transaction. Every chunk
+    resolves its categories, tags, attributes and images with one query per
+    model, creates what is missing in bulk and writes products with
+    ``bulk_create``/``bulk_update``, so memory and queries per row stay flat
+    however long the file is.
+
+    Rows that do not parse or fail the model fields' validators are
+    skipped and reported in ``errors``. Unknown category slugs become root
+    categories named after the slug.
+    ``product_code`` is never imported; new products get the next codes.
+    Images are the exception to bulk writes, see ``resolve_images``.
+    """
+
+    def __init__(self, chunk_size=1000):
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+
+    def run(self, rows):
+        for chunk in chunked(rows, self.chunk_size):
+            parsed = {}
+            for line_number, row in chunk:
+                try:
+                    item = parse_row(row)
+                except RowError as e:
+                    self.errors.append((line_number, str(e)))
+                    continue
+                parsed[item['slug']] = item
+            if parsed:
+                self.import_chunk(list(parsed.values()))
+        return self
+
+    @transaction.atomic
+    def import_chunk(self, items):
+        now = timezone.now()
+        categories = self.resolve_categories({item['category'] for item in items if item.get('category')})
+        existing = Product.objects.in_bulk([item['slug'] for item in items], field_name='slug')
+
+        new, changed, fields = [], [], {'updated_at'}
+        category_ids = set()
+        for item in items:
+            values = dict(item['values'])
+            if 'category' in item:
+                values['category_id'] = categories.get(item['category'])
+            product = existing.get(item['slug'])
+            if product is None:
+                product = Product(slug=item['slug'], **values)
+                new.append(product)
+                category_ids.add(product.category_id)
+                continue
+            category_ids.add(product.category_id)
+            for field, value in values.items():
+                setattr(product, field, value)
+            product.updated_at = now
+            fields.update(values)
+            changed.append(product)
+            category_ids.add(product.category_id)
+
+        Product.objects.bulk_create(new)
+        if changed:
+            Product.objects.bulk_update(changed, sorted(fields))
+        self.created += len(new)
+        self.updated += len(changed)
+
+        ids = dict(Product.objects.filter(slug__in=[item['slug'] for item in items]).values_list('slug', 'id'))
+        self.replace_tags(ids, [item for item in items if 'tags' in item])
+        self.replace_images(ids, [item for item in items if 'images' in item])
+        self.replace_attributes(ids, [item for item in items if 'attributes' in item])
+        reindex_products(ids.values())
+        invalidate_product_details(ids.values())
+        category_ids.discard(None)
+        transaction.on_commit(lambda: catalog_imported.send(sender=CatalogImporter, category_ids=category_ids))
+
+    def resolve_categories(self, slugs):
+        categories = {}
+        for category_id, slug in Category.objects.filter(slug__in=slugs).order_by('-id').values_list('id', 'slug'):
+            categories[slug] = category_id
+        for slug in sorted(slugs - categories.keys()):
+            # Category.save maintains the materialized path, so categories are never bulk created.
+            category = Category(name=slug[:50], slug=slug, show_in_home=False)
+            category.save()
+            categories[slug] = category.id
+        return categories
+
+    def resolve_names(self, model, field, names):
+        resolved = {}
+        for pk, name in model.objects.filter(**{f'{field}__in': names}).order_by('-id').values_list('id', field):
+            resolved[name] = pk
+        missing = [name for name in names if name not in resolved]
+        if missing:
+            model.objects.bulk_create([model(**{field: name}) for name in missing])
+            for pk, name in model.objects.filter(**{f'{field}__in': missing}).values_list('id', field):
+                resolved.setdefault(name, pk)
+        return resolved
+
+    def replace_tags(self, ids, items):
+        if not items:
+            return
+        tags = self.resolve_names(Tag, 'title', {title[:50] for item in items for title in item['tags']})
+        through = Product.tag.through
+        through.objects.filter(product_id__in=[ids[item['slug']] for item in items]).delete()
+        through.objects.bulk_create([
+            through(product_id=ids[item['slug']], tag_id=tag_id)
+            for item in items for tag_id in dict.fromkeys(tags[title[:50]] for title in item['tags'])
+        ])
+
+    def resolve_images(self, names):
+        """
+        Image ids for stored file ``names``, creating rows like an upload does.
+        A file already in storage is hashed and copied to its content-addressed
+        name (see ``products.storage``), so it is shared with identical images
+        and served as immutable. Rows are saved one at a time for their
+        signals, which render the derivatives after the chunk commits.
+        """
+        storage = Image._meta.get_field('image').storage
+        resolved = dict(Image.objects.filter(image__in=names).order_by('id').values_list('image', 'id'))
+        for name in sorted(names - resolved.keys()):
+            stored, digest = name, content_digest(name)
+            if digest is None and storage.exists(name):
+                with storage.open(name, 'rb') as source:
+                    digest = file_digest(source)
+                    stored = content_name(digest, name)
+                    storage.save(stored, source)
+            image = Image.objects.filter(image=stored).order_by('id').first()
+            if image is None:
+                image = Image(image=stored, checksum=digest or '')
+                image.save()
+            resolved[name] = image.id
+        return resolved
+
+    def replace_images(self, ids, items):
+        if not items:
+            return
+        images = self.resolve_images({name for item in items for name in item['images']})
+        through = Product.images.through
+        through.objects.filter(product_id__in=[ids[item['slug']] for item in items]).delete()
+        through.objects.bulk_create([
+            through(product_id=ids[item['slug']], image_id=image_id)
+            for item in items for image_id in dict.fromkeys(images[name] for name in item['images'])
+        ])
+
+    def replace_attributes(self, ids, items):
+        if not items:
+            return
+        attributes = self.resolve_names(Attribute, 'name', {name for item in items for name in item['attributes']})
+        ProductAttribute.objects.filter(product_id__in=[ids[item['slug']] for item in items]).delete()
+        ProductAttribute.objects.bulk_create([
+            ProductAttribute(product_id=ids[item['slug']], attribute_id=attributes[name], value=value)
+            for item in items for name, value in item['attributes'].items()
+        ])
+
+
+def export_rows(queryset=None, chunk_size=1000):
+    """Yield one dict per product in ``COLUMNS`` order, fetching ``chunk_size`` products at a time."""
+    queryset = (queryset if queryset is not None else Product.objects.all()).select_related('category').prefetch_related(
+        'tag', 'images', Prefetch('product_attributes', queryset=ProductAttribute.objects.select_related('attribute')),
+    ).order_by('id')
+    for product in queryset.iterator(chunk_size=chunk_size):
+        yield {
+            'slug': product.slug,
+            'product_code': product.product_code,
+            'nameFa': product.nameFa,
+            'nameEn': product.nameEn,
+            'category': product.category.slug if product.category else None,
+            'price': product.price,
+            'discount': product.discount,
+            'NumberOfProduct': product.NumberOfProduct,
+            'MaximumBuy': product.MaximumBuy,
+            'description': product.description,
+            'body': product.body,
+            'tags': [tag.title for tag in product.tag.all()],
+            'images': [image.image.name for image in product.images.all()],
+            'attributes': {item.attribute.name: item.value for item in product.product_attributes.all()},
+        }
+
+
+def write_rows(stream, rows, file_format):
+    if file_format == 'jsonl':
+        for row in rows:
+            stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        return
+    writer = csv.DictWriter(stream, fieldnames=COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({
+            **row,
+            'tags': LIST_SEPARATOR.join(row['tags']),
+            'images': LIST_SEPARATOR.join(row['images']),
+            'attributes': json.dumps(row['attributes'], ensure_ascii=False) if row['attributes'] else '',
+        })
@@ -0,0 +1,83 @@
+import threading
+import uuid
+
+from django.core.cache import cache
+
+from api.caching import invalidated_timeout
+
+CATEGORY_TREE_VERSION_KEY = 'products:category-tree-version'
+
+_tree = None
+_lock = threading.Lock()
+
+
+class CategoryTree:
+    """
+    In-memory snapshot of the whole category table. Breadcrumbs and subtree
+    lookups are answered from dicts, without touching the database.
+    """
+
+    def __init__(self, categories, version):
+        self.version = version
+        self.nodes = {category['id']: category for category in categories}
+        self.children = {}
+        for category in categories:
+            self.children.setdefault(category['parent_id'], []).append(category['id'])
+
+    def get(self, category_id):
+        return self.nodes.get(category_id)
+
+    def roots(self):
+        return [self.nodes[category_id] for category_id in self.children.get(None, [])]
+
+    def children_of(self, category_id):
+        return [self.nodes[child_id] for child_id in self.children.get(category_id, [])]
+
+    def ancestors(self, category_id):
+        ancestors = []
+        category = self.nodes.get(category_id)
+        while category:
+            ancestors.append(category)
+            category = self.nodes.get(category['parent_id'])
+        return list(reversed(ancestors))
+
+    def breadcrumb(self, category_id):
+        return [{'name': category['name'], 'slug': category['slug']} for category in self.ancestors(category_id)]
+
+    def descendant_ids(self, category_id, include_self=True):
+        if category_id not in self.nodes:
+            return []
+        ids = [category_id] if include_self else []
+        stack = list(self.children.get(category_id, []))
+        while stack:
+            child_id = stack.pop()
+            ids.append(child_id)
+            stack.extend(self.children.get(child_id, []))
+        return ids
+
+
+def get_tree_version():
+    version = cache.get(CATEGORY_TREE_VERSION_KEY)
+    if version is None:
+        cache.add(CATEGORY_TREE_VERSION_KEY, uuid.uuid4().hex, invalidated_timeout(None))
+        version = cache.get(CATEGORY_TREE_VERSION_KEY)
+    return version
+
+
+def get_category_tree():
+    global _tree
+    version = get_tree_version()
+    tree = _tree
+    if tree is not None and tree.version == version:
+        return tree
+    with _lock:
+        if _tree is None or _tree.version != version:
+            from .models import Category
+            categories = list(Category.objects.values('id', 'name', 'slug', 'parent_id', 'path', 'image',
+                                                      'image_derivatives', 'show_in_home', 'show_in_home_no_product'))
+            _tree = CategoryTree(categories, version)
+        return _tree
+
+
+def invalidate_category_tree():
+    cache.set(CATEGORY_TREE_VERSION_KEY, uuid.uuid4().hex, invalidated_timeout(None))
@@ -0,0 +1,146 @@
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import BigIntegerField, F, Max
+from django.db.models.functions import Cast
+from django.dispatch import receiver
+
+from .models import CodeSequence, Product
+
+PRODUCT_CODE_SEQUENCE = 'product_code'
+PRODUCT_CODE_FORMAT = '{:04d}'
+# Alias of the extra connection blocks are reserved on while the caller is in a transaction.
+SEQUENCE_CONNECTION = 'products.codes'
+
+DEFAULT_BLOCK_SIZES = {PRODUCT_CODE_SEQUENCE: 20}
+
+_allocators = {}
+_allocators_lock = threading.Lock()
+
+
+def reserve_block(name, count, using=DEFAULT_DB_ALIAS):
+    """
+    Advance sequence ``name`` by ``count`` and return the first and last value
+    of the block. The UPDATE holds the sequence row lock until the surrounding
+    transaction ends, so two workers can never receive overlapping blocks.
+    """
+    sequences = CodeSequence.objects.using(using)
+    with transaction.atomic(using=using):
+        updated = sequences.filter(name=name).update(last_value=F('last_value') + count)
+        if not updated:
+            sequences.get_or_create(name=name, defaults={'last_value': initial_value(name)})
+            sequences.filter(name=name).update(last_value=F('last_value') + count)
+        last = sequences.filter(name=name).values_list('last_value', flat=True).get()
+    return last - count + 1, last
+
+
+def reserves_on_own_connection():
+    """
+    Whether a block can be committed on a second connection while the caller's
+    transaction is open. SQLite has a single writer at a time, so a second
+    connection would wait for the caller's own transaction.
+    """
+    return connection.vendor != 'sqlite'
+
+
+def reserve_committed_block(name, count):
+    """``reserve_block`` on a connection of its own, committed whatever becomes of the caller's transaction."""
+    own = connections.create_connection(DEFAULT_DB_ALIAS)
+    connections[SEQUENCE_CONNECTION] = own
+    try:
+        return reserve_block(name, count, using=SEQUENCE_CONNECTION)
+    finally:
+        del connections[SEQUENCE_CONNECTION]
+        own.close()
+
+
+def initial_value(name):
+    """Seed a sequence that does not exist yet from the codes already in use."""
+    if name != PRODUCT_CODE_SEQUENCE:
+        return 0
+    return Product.objects.filter(product_code__regex=r'^[0-9]+$').aggregate(
+        last=Max(Cast('product_code', BigIntegerField())))['last'] or 0
+
+
+class BlockAllocator:
+    """
+    Hands out values of one sequence, fetching ``block_size`` at a time so a
+    worker touches the sequence row once per block instead of once per value.
+
+    Blocks are committed as soon as they are reserved: in autocommit mode
+    directly, inside a transaction on a connection of their own, so the
+    sequence row is never locked for the length of the caller's transaction.
+    Values of a block are therefore spent even when the insert that took them
+    rolls back, and values left in a block when the process exits are
+    skipped. On SQLite a transaction that runs out of block values takes the
+    missing ones from the sequence inside the transaction instead.
+
+    With ``block_size=1`` every value comes straight from the sequence inside
+    the caller's transaction, so a rolled back insert also returns its value
+    and codes stay gap-free, at the price of two queries per allocation and a
+    sequence row lock held until that transaction ends.
+    """
+
+    def __init__(self, name, block_size=1):
+        self.name = name
+        self.block_size = max(1, block_size)
+        self._next = 1
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def take(self, count):
+        if count <= 0:
+            return []
+        if self.block_size == 1:
+            first, last = reserve_block(self.name, count)
+            return list(range(first, last + 1))
+
+        if connection.in_atomic_block and not reserves_on_own_connection():
+            # The lock is not held while reserving: the transaction may hold the database's write
+            # lock, which a thread refilling the block in autocommit mode would wait for.
+            with self._lock:
+                values = self._spend(count)
+            if len(values) < count:
+                first, last = reserve_block(self.name, count - len(values))
+                values.extend(range(first, last + 1))
+            return values
+
+        with self._lock:
+            values = []
+            while len(values) < count:
+                if self._next > self._last:
+                    reserve = reserve_committed_block if connection.in_atomic_block else reserve_block
+                    self._next, self._last = reserve(self.name, max(self.block_size, count - len(values)))
+                values.extend(self._spend(count - len(values)))
+            return values
+
+    def _spend(self, count):
+        """Up to ``count`` values left in the current block."""
+        end = min(self._last, self._next + count - 1)
+        values = list(range(self._next, end + 1))
+        self._next = max(self._next, end + 1)
+        return values
+
+
+def get_allocator(name):
+    allocator = _allocators.get(name)
+    if allocator is None:
+        with _allocators_lock:
+            allocator = _allocators.get(name)
+            if allocator is None:
+                block_sizes = {**DEFAULT_BLOCK_SIZES, **getattr(settings, 'CODE_SEQUENCE_BLOCK_SIZES', {})}
+                allocator = _allocators[name] = BlockAllocator(name, block_sizes.get(name, 1))
+    return allocator
+
+
+def allocate_product_codes(count):
+    return [PRODUCT_CODE_FORMAT.format(value) for value in get_allocator(PRODUCT_CODE_SEQUENCE).take(count)]
+
+
+@receiver(setting_changed)
+def reset_allocators(setting, **kwargs):
+    if setting == 'CODE_SEQUENCE_BLOCK_SIZES':
+        with _allocators_lock:
+            _allocators.clear()
@@ -0,0 +1,46 @@
+from .models import Comment
+
+
+def load_comment_threads(product_id):
+    """
+    Load every visible comment of a product in one query and return the root
+    comments, oldest first. Each root gets a ``thread_replies`` list with all of
+    its visible descendants in chronological order; replies whose parent is not
+    visible are left out together with that parent.
+    """
+    comments = list(
+        Comment.objects.filter(product_id=product_id, is_visible=True, is_admin_reviewed=True)
+        .select_related('author')
+        .order_by('created_at', 'id')
+    )
+    by_id = {comment.id: comment for comment in comments}
+    roots = []
+    root_of = {}
+
+    def find_root(comment):
+        path = []
+        while comment.id not in root_of:
+            path.append(comment)
+            if comment.parent_id is None:
+                root_of[comment.id] = comment
+                break
+            parent = by_id.get(comment.parent_id)
+            if parent is None or parent in path:
+                root_of[comment.id] = None
+                break
+            comment = parent
+        root = root_of[comment.id]
+        for visited in path:
+            root_of[visited.id] = root
+        return root
+
+    for comment in comments:
+        comment.thread_replies = []
+    for comment in comments:
+        root = find_root(comment)
+        if root is comment:
+            roots.append(comment)
+        elif root is not None:
+            root.thread_replies.append(comment)
+    return roots
+
@@ -0,0 +1,27 @@
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import CommentLikeDislike
+
+
+def vote_count(votes, value):
+    """Number of ``value`` votes in ``votes`` on the comment of the outer query."""
+    counted = (
+        votes.filter(comment=OuterRef('pk'), value=value)
+        .order_by()
+        .values('comment')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def reconcile_vote_counters(comments, votes):
+    """
+    Recompute likes_count and dislikes_count of ``comments`` from ``votes``.
+    Both are querysets, so migrations can pass their historical models.
+    """
+    return comments.update(
+        likes_count=vote_count(votes, CommentLikeDislike.LIKE),
+        dislikes_count=vote_count(votes, CommentLikeDislike.DISLIKE),
+    )
@@ -0,0 +1,142 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.signals import setting_changed
+from django.db import connections, transaction
+from django.dispatch import Signal, receiver
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DERIVATIVE_SETTINGS = {
+    # name: (max width, max height); images are scaled down to fit, never up.
+    'SIZES': {
+        'thumb': (160, 160),
+        'card': (320, 320),
+        'medium': (800, 800),
+    },
+    'JPEG_QUALITY': 85,
+    'WEBP_QUALITY': 80,
+    # Background threads generating derivatives; 0 generates them inline on commit.
+    'WORKERS': 2,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Sent with ``sender=model`` and ``pk`` after fresh derivatives were stored for a row.
+derivatives_ready = Signal()
+
+
+def get_derivative_settings():
+    return {**DEFAULT_DERIVATIVE_SETTINGS, **getattr(settings, 'IMAGE_DERIVATIVES', {})}
+
+
+def derivative_name(name, size, extension):
+    stem, _ = os.path.splitext(name)
+    return f'derivatives/{stem}/{size}.{extension}'
+
+
+def render_derivatives(field_file):
+    """
+    Write every configured size of ``field_file`` as JPEG and WebP next to the
+    original and return ``{size: {'jpeg': name, 'webp': name}}``. The original
+    is decoded once and each size is resized from the previous, larger one.
+    """
+    from PIL import Image as PILImage, ImageOps
+
+    options = get_derivative_settings()
+    storage = field_file.storage
+    with storage.open(field_file.name, 'rb') as source:
+        original = PILImage.open(source)
+        original.draft('RGB', max(options['SIZES'].values()))
+        image = ImageOps.exif_transpose(original).convert('RGB')
+
+    derivatives = {}
+    for size, box in sorted(options['SIZES'].items(), key=lambda item: item[1], reverse=True):
+        image.thumbnail(box, PILImage.LANCZOS)
+        derivatives[size] = {}
+        for extension, image_format, quality in (('jpeg', 'JPEG', options['JPEG_QUALITY']),
+                                                 ('webp', 'WEBP', options['WEBP_QUALITY'])):
+            buffer = io.BytesIO()
+            image.save(buffer, image_format, quality=quality, optimize=True)
+            name = derivative_name(field_file.name, size, extension)
+            if storage.exists(name):
+                storage.delete(name)
+            derivatives[size][extension] = storage.save(name, ContentFile(buffer.getvalue()))
+    return derivatives
+
+
+def is_current(derivatives, name):
+    """Whether ``derivatives`` were rendered from the file called ``name``."""
+    prefix = derivative_name(name, '', '').rsplit('/', 1)[0] + '/'
+    return bool(derivatives) and all(
+        stored.startswith(prefix) for formats in derivatives.values() for stored in formats.values())
+
+
+def derivative_urls(derivatives, storage, request=None):
+    def url(name):
+        value = storage.url(name)
+        return request.build_absolute_uri(value) if request else value
+    return {size: {extension: url(name) for extension, name in formats.items()}
+            for size, formats in (derivatives or {}).items()}
+
+
+def sized_url(field_file, derivatives, size, extension='jpeg'):
+    """URL of the ``size`` derivative of ``field_file``, or of the original until it has been rendered."""
+    name = (derivatives or {}).get(size, {}).get(extension)
+    return field_file.storage.url(name) if name else field_file.url
+
+
+def generate(model, pk, field, target):
+    """Render derivatives of ``model.field`` for row ``pk`` and store them in ``target`` if the file is unchanged."""
+    instance = model.objects.filter(pk=pk).only(field).first()
+    field_file = getattr(instance, field, None)
+    if not field_file:
+        return
+    try:
+        derivatives = render_derivatives(field_file)
+    except Exception:
+        logger.exception('Could not render derivatives of %s', field_file.name)
+        return
+    if model.objects.filter(pk=pk, **{field: field_file.name}).update(**{target: derivatives}):
+        derivatives_ready.send(sender=model, pk=pk)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=get_derivative_settings()['WORKERS'],
+                                               thread_name_prefix='image-derivatives')
+    return _executor
+
+
+def _run_in_worker(*args):
+    try:
+        generate(*args)
+    finally:
+        connections.close_all()
+
+
+def schedule(model, pk, field='image', target='derivatives'):
+    """Generate derivatives once the current transaction commits, on the worker pool unless WORKERS is 0."""
+    def submit():
+        if get_derivative_settings()['WORKERS']:
+            get_executor().submit(_run_in_worker, model, pk, field, target)
+        else:
+            generate(model, pk, field, target)
+    transaction.on_commit(submit)
+
+
+@receiver(setting_changed)
+def reset_executor(setting, **kwargs):
+    global _executor
+    if setting == 'IMAGE_DERIVATIVES' and _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
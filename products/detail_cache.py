@@ -0,0 +1,121 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from api.caching import is_process_local
+
+PRODUCT_DETAIL_VERSION_KEY = 'products:detail-version'
+# Columns that change with every reservation, sale or page view are read from the row on
+# each request and laid over the cached payload instead of invalidating it.
+VOLATILE_FIELDS = ['NumberOfProduct', 'MaximumBuy', 'sold', 'view']
+
+
+def get_cache_alias():
+    return getattr(settings, 'PRODUCT_DETAIL_CACHE', 'default')
+
+
+def get_cache():
+    return caches[get_cache_alias()]
+
+
+def get_timeout():
+    return getattr(settings, 'PRODUCT_DETAIL_CACHE_TIMEOUT', 60 * 60)
+
+
+def get_version(cache):
+    version = cache.get(PRODUCT_DETAIL_VERSION_KEY)
+    if version is None:
+        cache.add(PRODUCT_DETAIL_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(PRODUCT_DETAIL_VERSION_KEY)
+    return version
+
+
+def product_key(version, product_id):
+    return f'products:detail:{version}:{product_id}'
+
+
+def build_product(product_id):
+    from .models import Product
+    from .serializers import ProductSerializer
+    product = ProductSerializer.setup_eager_loading(Product.objects.filter(pk=product_id)).first()
+    if product is None:
+        return None
+    # No request in the context: image URLs stay relative and is_favorited is left to the overlay.
+    context = ProductSerializer.get_batch_context([product], None)
+    return dict(ProductSerializer(product, context=context).data)
+
+
+def build_related(product_id, category_id):
+    """Related products from the precomputed index, or same-category products until it is built."""
+    from .models import Product, RelatedProduct
+    from .related import get_limit
+    from .serializers import RelatedProductSerializer
+    indexed = RelatedProduct.objects.filter(product_id=product_id).order_by('position').values_list(
+        'related_id', 'thumbnail')
+    related = [{'id': related_id, 'images': thumbnail or None} for related_id, thumbnail in indexed]
+    if related:
+        return related
+    products = Product.objects.filter(category_id=category_id).exclude(id=product_id).prefetch_related(
+        'images').order_by('id')[:get_limit()]
+    return [dict(item) for item in RelatedProductSerializer(products, many=True).data]
+
+
+def get_product_detail(product_id, category_id):
+    """
+    The anonymous part of a product page, ``(product, related_products)``, read through the cache.
+    A process-local cache would keep serving pages that another worker has invalidated, so the
+    page is built on every request then.
+    """
+    if is_process_local(get_cache_alias()):
+        product = build_product(product_id)
+        return (product, build_related(product_id, category_id)) if product is not None else (None, [])
+    cache = get_cache()
+    key = product_key(get_version(cache), product_id)
+    cached = cache.get(key)
+    if cached is None:
+        product = build_product(product_id)
+        if product is None:
+            return None, []
+        cached = (product, build_related(product_id, category_id))
+        cache.set(key, cached, get_timeout())
+    return cached
+
+
+def is_favorited(user, product_id):
+    from .models import Favorite
+    return user.is_authenticated and Favorite.objects.filter(user=user, product_id=product_id).exists()
+
+
+def absolute_url(request, url):
+    return request.build_absolute_uri(url) if url else url
+
+
+def render_product_detail(request, state, product, related_products, favorited):
+    """
+    The response data of a product page: the cached ``product`` and ``related_products`` with the
+    row's current ``VOLATILE_FIELDS`` from ``state``, the user's ``favorited`` flag and absolute
+    image URLs laid over them.
+    """
+    product = {**product, **{field: state[field] for field in VOLATILE_FIELDS}}
+    product['is_favorited'] = favorited
+    product['images'] = [
+        {**image, 'image': absolute_url(request, image['image']),
+         'derivatives': {size: {extension: absolute_url(request, url) for extension, url in formats.items()}
+                         for size, formats in image['derivatives'].items()}}
+        for image in product['images']
+    ]
+    related_products = [{**item, 'images': absolute_url(request, item['images'])} for item in related_products]
+    return {'product': product, 'related_products': related_products}
+
+
+def invalidate_product_details(product_ids):
+    product_ids = [product_id for product_id in product_ids if product_id is not None]
+    if product_ids:
+        cache = get_cache()
+        version = get_version(cache)
+        cache.delete_many([product_key(version, product_id) for product_id in product_ids])
+
+
+def invalidate_all_product_details():
+    get_cache().set(PRODUCT_DETAIL_VERSION_KEY, uuid.uuid4().hex, None)
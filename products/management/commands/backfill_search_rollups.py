@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.functions import TruncDay, TruncHour
+
+from products.models import SearchHistory, SearchTermBucket, SearchTermStat
+from products.search_rollups import log_add, log_weight
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly/daily search term buckets and per-term stats from SearchHistory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            SearchTermBucket.objects.all().delete()
+            SearchTermStat.objects.all().delete()
+
+            stats = {}
+            for granularity, trunc in ((SearchTermBucket.HOUR, TruncHour), (SearchTermBucket.DAY, TruncDay)):
+                rows = (
+                    SearchHistory.objects.annotate(bucket=trunc('created_at'))
+                    .values('term', 'bucket')
+                    .annotate(count=Count('id'), last=Max('created_at'))
+                    .order_by()
+                )
+                batch = []
+                for row in rows.iterator(chunk_size=batch_size):
+                    batch.append(SearchTermBucket(term=row['term'], granularity=granularity, bucket=row['bucket'],
+                                                  count=row['count']))
+                    if granularity == SearchTermBucket.HOUR:
+                        total, score, last = stats.get(row['term'], (0, None, row['last']))
+                        stats[row['term']] = (total + row['count'],
+                                              log_add(score, log_weight(row['count'], row['bucket'])),
+                                              max(last, row['last']))
+                    if len(batch) >= batch_size:
+                        SearchTermBucket.objects.bulk_create(batch)
+                        batch = []
+                SearchTermBucket.objects.bulk_create(batch)
+
+            SearchTermStat.objects.bulk_create(
+                [SearchTermStat(term=term, total_count=total, trending_score=score, last_searched_at=last)
+                 for term, (total, score, last) in stats.items()],
+                batch_size=batch_size,
+            )
+        self.stdout.write(self.style.SUCCESS(f'Backfilled rollups for {len(stats)} terms.'))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = ('Time inserting products with sequence-allocated product codes, in bulk and one save() at a time. '
+            'Everything is created inside a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--saves', type=int, default=2000, help='Products inserted one save() at a time.')
+
+    def handle(self, *args, **options):
+        count, batch_size, saves = options['products'], options['batch_size'], options['saves']
+        with transaction.atomic():
+            start = Product.objects.count()
+
+            started = time.perf_counter()
+            for offset in range(0, count, batch_size):
+                Product.objects.bulk_create(
+                    [self.build(start + index) for index in range(offset, min(offset + batch_size, count))],
+                    batch_size=batch_size,
+                )
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'bulk_create: {count} products in {elapsed:.2f}s ({count / elapsed:,.0f}/s)')
+
+            started = time.perf_counter()
+            for index in range(count, count + saves):
+                self.build(start + index).save()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'save(): {saves} products in {elapsed:.2f}s ({saves / elapsed:,.0f}/s)')
+
+            codes = list(Product.objects.filter(slug__startswith='bench-code-').values_list('product_code', flat=True))
+            if len(set(codes)) != len(codes):
+                self.stderr.write('duplicate product codes were allocated')
+            transaction.set_rollback(True)
+
+    def build(self, index):
+        return Product(nameFa=f'product {index}', nameEn='', description='', body='', price=1000,
+                       slug=f'bench-code-{index}')
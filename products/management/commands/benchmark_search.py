@@ -0,0 +1,80 @@
+import random
+import statistics
+import time
+from functools import reduce
+import operator
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from products.models import Product
+from products.search import get_search_backend
+
+WORDS = ['گوشی', 'موبایل', 'سامسونگ', 'کتاب', 'لپ‌تاپ', 'کفش', 'ورزشی', 'پیراهن', 'مردانه', 'زنانه', 'ساعت',
+         'هوشمند', 'phone', 'laptop', 'book', 'shoe', 'watch', 'smart', 'cotton', 'leather', 'black', 'white',
+         'کیف', 'چرمی', 'هدفون', 'بی‌سیم', 'شارژر', 'دوربین', 'عکاسی', 'بازی']
+QUERIES = ['گوشی سامسونگ', 'كتاب', 'لپ تاپ', 'ساعت هوشمند', 'phone', 'smart wat', 'کفش ورزشی', 'هدف']
+
+
+class Command(BaseCommand):
+    help = ('Compare the search backend with the legacy icontains search on a synthetic catalog. '
+            'Everything is created inside a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.ensure_schema()
+        with transaction.atomic():
+            self.populate(options['products'])
+
+            started = time.perf_counter()
+            backend.rebuild()
+            self.stdout.write(f'index build: {time.perf_counter() - started:.2f}s for {options["products"]} products')
+
+            legacy = self.measure(self.legacy_search, options['repeat'])
+            indexed = self.measure(lambda query: list(
+                backend.filter_queryset(Product.objects.all(), query).values_list('id', flat=True)
+            ), options['repeat'])
+
+            self.stdout.write(f'{"query":<20}{"icontains hits":>15}{"icontains ms":>15}{"backend ms":>15}')
+            for query in QUERIES:
+                hits = len(self.legacy_search(query))
+                self.stdout.write(f'{query:<20}{hits:>15}{legacy[query]:>15.2f}{indexed[query]:>15.2f}')
+            self.stdout.write(f'{"median":<35}{statistics.median(legacy.values()):>15.2f}'
+                              f'{statistics.median(indexed.values()):>15.2f}')
+            transaction.set_rollback(True)
+
+    def populate(self, count):
+        random.seed(0)
+        start = Product.objects.count()
+        products = []
+        for index in range(start, start + count):
+            name = ' '.join(random.sample(WORDS, 3))
+            products.append(Product(
+                nameFa=name, nameEn=name, description=' '.join(random.sample(WORDS, 8)), body='',
+                price=random.randint(1, 1000) * 1000, slug=f'bench-{index}', product_code=f'B{index:08d}',
+                MaximumBuy=1,
+            ))
+        Product.objects.bulk_create(products, batch_size=2000)
+
+    def legacy_search(self, query):
+        fields = ['nameFa', 'nameEn', 'description', 'tag__title']
+        queryset = Product.objects.filter(
+            reduce(operator.or_, [Q(**{f'{field}__icontains': query}) for field in fields])
+        ).distinct()
+        return list(queryset.values_list('id', flat=True))
+
+    def measure(self, search, repeat):
+        timings = {}
+        for query in QUERIES:
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                search(query)
+                samples.append((time.perf_counter() - started) * 1000)
+            timings[query] = statistics.median(samples)
+        return timings
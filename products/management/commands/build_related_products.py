@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from products.related import build_related_index
+
+
+class Command(BaseCommand):
+    help = ('Precompute related products from shared orders, favorites, carts, tags and category, '
+            'and store them with a thumbnail URL in RelatedProduct.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, help='Related products kept per product.')
+
+    def handle(self, *args, **options):
+        built = build_related_index(chunk_size=options['chunk_size'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt related products of {built} products.'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from products.detail_cache import invalidate_all_product_details
+from products.models import Image
+from products.storage import content_name, file_digest, release_image_file
+
+
+class Command(BaseCommand):
+    help = ('Move product images uploaded before content-addressed storage to names derived from their '
+            'SHA-256, so identical files are stored once. Run generate_image_derivatives afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        storage = Image._meta.get_field('image').storage
+        moved = shared = missing = 0
+        last_id = 0
+        while True:
+            batch = list(Image.objects.filter(id__gt=last_id, checksum='').exclude(image='').order_by('id')
+                         .only('id', 'image', 'derivatives')[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for image in batch:
+                name = image.image.name
+                if not storage.exists(name):
+                    missing += 1
+                    continue
+                with storage.open(name, 'rb') as source:
+                    digest = file_digest(source)
+                    new_name = content_name(digest, name)
+                    if new_name != name:
+                        if storage.exists(new_name):
+                            shared += 1
+                        else:
+                            storage.save(new_name, source)
+                if new_name == name:
+                    Image.objects.filter(pk=image.pk).update(checksum=digest)
+                    continue
+                Image.objects.filter(pk=image.pk).update(image=new_name, checksum=digest, derivatives={})
+                release_image_file(name, image.derivatives)
+                moved += 1
+
+        if moved:
+            invalidate_all_product_details()
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {moved} images ({shared} onto an identical stored file), {missing} files missing.'))
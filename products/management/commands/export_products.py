@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog import export_rows, write_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream every product to a CSV or JSON Lines file (stdout by default) in the import_products format.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension, or jsonl.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        if path == '-':
+            write_rows(self.stdout, export_rows(chunk_size=options['chunk_size']), file_format)
+            return
+        try:
+            with open(path, 'w', encoding='utf-8', newline='') as stream:
+                write_rows(stream, export_rows(chunk_size=options['chunk_size']), file_format)
+        except OSError as e:
+            raise CommandError(e)
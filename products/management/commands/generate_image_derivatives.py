@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from products.derivatives import _run_in_worker, generate, get_derivative_settings
+from products.models import Category, Image
+
+
+class Command(BaseCommand):
+    help = ('Render the resized JPEG/WebP copies of product and category images, e.g. for images '
+            'that were imported in bulk or uploaded before the sizes changed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Re-render images that already have derivatives.')
+        parser.add_argument('--workers', type=int, help='Threads rendering images (default: IMAGE_DERIVATIVES WORKERS, 0 renders inline).')
+
+    def handle(self, *args, **options):
+        jobs = []
+        for model, target in ((Image, 'derivatives'), (Category, 'image_derivatives')):
+            queryset = model.objects.exclude(image='').exclude(image__isnull=True)
+            if not options['all']:
+                queryset = queryset.filter(**{target: {}})
+            jobs += [(model, pk, 'image', target) for pk in queryset.values_list('pk', flat=True).iterator()]
+
+        workers = options['workers'] if options['workers'] is not None else get_derivative_settings()['WORKERS']
+        if workers:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(lambda job: _run_in_worker(*job), jobs))
+        else:
+            for job in jobs:
+                generate(*job)
+        self.stdout.write(self.style.SUCCESS(f'Rendered derivatives of {len(jobs)} images.'))
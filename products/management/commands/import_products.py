@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog import CatalogImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Upsert products by slug from a CSV or JSON Lines file (use "-" for stdin), '
+            'with their category, tags, images and attributes, in chunks.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        try:
+            stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(e)
+
+        with stream:
+            importer = CatalogImporter(chunk_size=options['chunk_size']).run(read_rows(stream, file_format))
+
+        for line_number, error in importer.errors[:20]:
+            self.stderr.write(f'line {line_number}: {error}')
+        if len(importer.errors) > 20:
+            self.stderr.write(f'... and {len(importer.errors) - 20} more invalid rows')
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {importer.created} and updated {importer.updated} products, '
+            f'skipped {len(importer.errors)} invalid rows.'))
@@ -0,0 +1,124 @@
+import asyncio
+import statistics
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from api.authentication import ClaimsRefreshToken
+from products.models import Category, Comment, Product
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Send the same GET requests to the synchronous catalog views through the WSGI handler from '
+            'concurrent threads and to their async variants through the ASGI handler from concurrent tasks, '
+            'and report requests per second and p50/p99 latency. The requests are made in-process, without '
+            'a server in front. The benchmark data is deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and handler.')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--products', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise CommandError('The load test needs a database that several threads can share.')
+        tag = uuid.uuid4().hex[:8]
+        category = Category.objects.create(name=f'bench {tag}', slug=f'bench-loadtest-{tag}', show_in_home=False)
+        Product.objects.bulk_create([
+            Product(nameFa=f'bench {index}', slug=f'bench-loadtest-{tag}-{index}', price=index * 1000,
+                    category=category)
+            for index in range(options['products'])
+        ])
+        product_ids = list(Product.objects.filter(category=category).values_list('id', flat=True))
+        user = User.objects.create_user(username=f'bench-{tag}')
+        Comment.objects.bulk_create([
+            Comment(product_id=product_id, author=user, text='bench', is_visible=True, is_admin_reviewed=True)
+            for product_id in product_ids for _ in range(3)
+        ])
+        headers = {'Authorization': f'token {ClaimsRefreshToken.for_user(user).access_token}'}
+
+        endpoints = [
+            ('list', 'product-list', lambda index: [], {'page_size': 20, 'category': category.id}),
+            ('detail', 'product-detail', lambda index: [product_ids[index % len(product_ids)]], {}),
+            ('comments', 'product-comments', lambda index: [product_ids[index % len(product_ids)]], {'page_size': 10}),
+            ('hotsearch', 'hot-search', lambda index: [], {'period': 'all'}),
+        ]
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                self.stdout.write(f'{"endpoint":<12}{"handler":<8}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}')
+                for label, name, args, params in endpoints:
+                    for handler, run in [('wsgi', self.run_wsgi), ('asgi', self.run_asgi)]:
+                        url_name = name if handler == 'wsgi' else f'async-{name}'
+                        urls = [reverse(url_name, args=args(index)) for index in range(options['requests'])]
+                        elapsed, latencies = run(urls, params, headers, options['concurrency'])
+                        self.report(label, handler, elapsed, latencies)
+        finally:
+            Product.objects.filter(category=category).delete()
+            category.delete()
+            user.delete()
+
+    def run_wsgi(self, urls, params, headers, concurrency):
+        pending = list(urls)
+        lock = threading.Lock()
+        latencies = []
+
+        def worker():
+            client = Client()
+            try:
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        url = pending.pop()
+                    started = time.perf_counter()
+                    response = client.get(url, params, headers=headers)
+                    latencies.append(time.perf_counter() - started)
+                    self.assert_ok(response, url)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started, latencies
+
+    def run_asgi(self, urls, params, headers, concurrency):
+        pending = list(urls)
+        latencies = []
+
+        async def worker():
+            client = AsyncClient()
+            while pending:
+                url = pending.pop()
+                started = time.perf_counter()
+                response = await client.get(url, params, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                self.assert_ok(response, url)
+
+        async def main():
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            return time.perf_counter() - started
+
+        return asyncio.run(main()), latencies
+
+    def assert_ok(self, response, url):
+        if response.status_code != 200:
+            raise CommandError(f'{url} answered {response.status_code}')
+
+    def report(self, label, handler, elapsed, latencies):
+        latencies = sorted(latency * 1000 for latency in latencies)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(f'{label:<12}{handler:<8}{len(latencies) / elapsed:>10,.0f}'
+                          f'{statistics.median(latencies):>10.1f}{p99:>10.1f}')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from products.category_tree import get_category_tree, invalidate_category_tree
+from products.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized path of every category from its parent chain.'
+
+    def handle(self, *args, **options):
+        invalidate_category_tree()
+        tree = get_category_tree()
+        categories = list(Category.objects.only('id', 'path'))
+        for category in categories:
+            category.path = ''.join(f"{ancestor['id']}/" for ancestor in tree.ancestors(category.id))
+        Category.objects.bulk_update(categories, ['path'], batch_size=500)
+        invalidate_category_tree()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt paths for {len(categories)} categories.'))
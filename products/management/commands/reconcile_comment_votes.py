@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from products.comment_votes import reconcile_vote_counters
+from products.models import Comment, CommentLikeDislike
+
+
+class Command(BaseCommand):
+    help = 'Recompute Comment.likes_count and dislikes_count from CommentLikeDislike.'
+
+    def handle(self, *args, **options):
+        updated = reconcile_vote_counters(Comment.objects.all(), CommentLikeDislike.objects.all())
+        self.stdout.write(self.style.SUCCESS(f'Reconciled vote counters of {updated} comments.'))
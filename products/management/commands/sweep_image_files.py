@@ -0,0 +1,37 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from products.derivatives import derivative_name
+from products.models import Image
+from products.storage import IMAGE_PREFIX, content_digest, release_image_file
+
+
+class Command(BaseCommand):
+    help = ('Delete content-addressed product images, and their derivatives, that no Image row refers to '
+            'and that were not reused within IMAGE_FILE_GRACE_PERIOD seconds. Releasing an image right '
+            'after an identical upload keeps the file; run this periodically to collect those.')
+
+    def handle(self, *args, **options):
+        storage = Image._meta.get_field('image').storage
+        referenced = set(Image.objects.filter(image__startswith=f'{IMAGE_PREFIX}/').values_list('image', flat=True))
+        deleted = 0
+        for directory, _, filenames in os.walk(storage.path(IMAGE_PREFIX)):
+            for filename in filenames:
+                name = os.path.relpath(os.path.join(directory, filename), storage.location).replace(os.sep, '/')
+                if content_digest(name) is None or name in referenced:
+                    continue
+                if release_image_file(name, self.stored_derivatives(storage, name)):
+                    deleted += 1
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} unused image files.'))
+
+    def stored_derivatives(self, storage, name):
+        """``{size: {extension: name}}`` of the derivatives found on disk for ``name``."""
+        directory = derivative_name(name, '', '').rsplit('/', 1)[0]
+        if not storage.exists(directory):
+            return {}
+        derivatives = {}
+        for filename in storage.listdir(directory)[1]:
+            size, extension = os.path.splitext(filename)
+            derivatives.setdefault(size, {})[extension.lstrip('.')] = f'{directory}/{filename}'
+        return derivatives
@@ -0,0 +1,17 @@
+from .serializers import ProductSerializer
+
+
+class BatchedProductSerializerMixin:
+    """
+    Serialize a list of products with a fixed number of queries: related rows are
+    prefetched and favorites, comment ids and categories are loaded once per page.
+    """
+
+    def get_batched_queryset(self, queryset):
+        return ProductSerializer.setup_eager_loading(queryset)
+
+    def get_batched_serializer(self, products):
+        products = list(products)
+        context = self.get_serializer_context()
+        context.update(ProductSerializer.get_batch_context(products, self.request.user))
+        return ProductSerializer(products, many=True, context=context)
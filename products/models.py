@@ -1,10 +1,14 @@
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
 from ckeditor.fields import RichTextField
 from django.utils.html import format_html
 from django_jalali.db import models as jmodels
 from django.conf import settings
 from django.contrib.auth import get_user_model
 
+from .storage import image_storage, image_upload_to
+
 User = get_user_model()
 
 
@@ -16,25 +20,58 @@ class Category(models.Model):
     show_in_home = models.BooleanField(help_text='Are the products of this category displayed on the main page?',
                                        verbose_name='show product in home')
     show_in_home_no_product = models.BooleanField(default=False, verbose_name='show image in home')
+    path = models.CharField(max_length=255, blank=True, default='', db_index=True, editable=False,
+                            help_text='Materialized path of ancestor ids, e.g. "1/4/9/"')
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        old_path = self.path
+        super().save(*args, **kwargs)
+        path = self.build_path()
+        if path != old_path:
+            Category.objects.filter(pk=self.pk).update(path=path)
+            if old_path:
+                Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(path), Substr('path', len(old_path) + 1), output_field=models.CharField())
+                )
+            self.path = path
+
+    def build_path(self):
+        parent_path = ''
+        if self.parent_id:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+        return f'{parent_path}{self.pk}/'
+
+    def get_descendants(self, include_self=True):
+        queryset = Category.objects.filter(path__startswith=self.path)
+        if not include_self:
+            queryset = queryset.exclude(pk=self.pk)
+        return queryset
+
     class Meta:
         verbose_name = 'category'
         verbose_name_plural = 'categories'
 
     def show_image(self):
         if self.image:
-            return format_html(f'<img src="{self.image.url}" width="60px" height="50px">')
+            thumb = self.image_derivatives.get('thumb', {}).get('jpeg')
+            url = self.image.storage.url(thumb) if thumb else self.image.url
+            return format_html(f'<img src="{url}" width="60px" height="50px">')
         return ('no image')
 
 
 class Image(models.Model):
     product = models.ForeignKey('Product', null=True, on_delete=models.CASCADE,
                                 related_name='images_related')
-    image = models.ImageField(upload_to='product-img', verbose_name='image')
+    image = models.ImageField(upload_to=image_upload_to, storage=image_storage, verbose_name='image')
+    checksum = models.CharField(max_length=64, blank=True, default='', db_index=True, editable=False,
+                                help_text='SHA-256 of the file; identical uploads share one stored file')
     alt = models.CharField(max_length=500, null=True, blank=True, verbose_name='image alt')
+    derivatives = models.JSONField(default=dict, blank=True, editable=False,
+                                   help_text='Resized JPEG/WebP copies, e.g. {"thumb": {"jpeg": ..., "webp": ...}}')
 
     class Meta:
         verbose_name = 'image'
@@ -55,6 +92,27 @@ class Tag(models.Model):
         return self.title
 
 
+class CodeSequence(models.Model):
+    """The last value handed out for each named code series, see ``products.codes``."""
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.last_value}'
+
+
+class ProductManager(models.Manager):
+    def bulk_create(self, objs, *args, **kwargs):
+        from .codes import allocate_product_codes
+        objs = list(objs)
+        missing = [obj for obj in objs if not obj.product_code]
+        for obj, code in zip(missing, allocate_product_codes(len(missing))):
+            obj.product_code = code
+        for obj in objs:
+            obj.set_default_maximum_buy()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Product(models.Model):
     nameFa = models.CharField(max_length=255)
     nameEn = models.CharField(max_length=255, null=True, blank=True)
@@ -80,21 +138,27 @@ class Product(models.Model):
 
     )
 
+    objects = ProductManager()
+
     def save(self, *args, **kwargs):
         if not self.product_code:
-            last_product = Product.objects.all().order_by('id').last()
-            if last_product:
-                last_code = int(last_product.product_code)
-                self.product_code = '{:04d}'.format(last_code + 1)
-            else:
-                self.product_code = '0001'
+            from .codes import allocate_product_codes
+            self.product_code = allocate_product_codes(1)[0]
+        self.set_default_maximum_buy()
+        super(Product, self).save(*args, **kwargs)
+
+    def set_default_maximum_buy(self):
         if not self.MaximumBuy:
             self.MaximumBuy = self.NumberOfProduct
-        super(Product, self).save(*args, **kwargs)
 
     def increase_sold(self, quantity):
-        self.sold += quantity
-        self.save()
+        Product.objects.filter(pk=self.pk).update(sold=models.F('sold') + quantity)
+        self.refresh_from_db(fields=['sold'])
+
+    def final_price(self):
+        if self.discount:
+            return self.price - self.price * self.discount // 100
+        return self.price
 
     def show_discount(self):
         if self.discount:
@@ -132,10 +196,17 @@ class Comment(models.Model):
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='replies')
     is_admin_reviewed = models.BooleanField(default=False, verbose_name="Reviewed by admin")
     is_visible = models.BooleanField(default=False, verbose_name="Visible to users")
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    dislikes_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"id:{self.id}Comment by {self.author.username} on {self.product.nameFa}"
 
+    @staticmethod
+    def vote_counter(value):
+        """Name of the denormalized counter that a CommentLikeDislike value is counted in."""
+        return 'likes_count' if value == CommentLikeDislike.LIKE else 'dislikes_count'
+
 
 class CommentLikeDislike(models.Model):
     LIKE = 1
@@ -165,6 +236,21 @@ class Favorite(models.Model):
         return f"{self.user.username} - {self.product.nameFa}"
 
 
+class RelatedProduct(models.Model):
+    """Precomputed related products of a product, see ``products.related``."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_index')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    position = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    thumbnail = models.CharField(max_length=500, blank=True, default='')
+
+    class Meta:
+        unique_together = ('product', 'position')
+
+    def __str__(self):
+        return f'{self.product_id} -> {self.related_id}'
+
+
 class SearchHistory(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="search_history")
     term = models.CharField(max_length=255, verbose_name="عبارت جست وجو")
@@ -174,6 +260,37 @@ class SearchHistory(models.Model):
         return f"{self.term} searched by {self.user}"
 
 
+class SearchTermBucket(models.Model):
+    HOUR = 'h'
+    DAY = 'd'
+    GRANULARITY_CHOICES = (
+        (HOUR, 'hour'),
+        (DAY, 'day'),
+    )
+
+    term = models.CharField(max_length=255)
+    granularity = models.CharField(max_length=1, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('term', 'granularity', 'bucket')
+        indexes = [models.Index(fields=['granularity', 'bucket'])]
+
+    def __str__(self):
+        return f"{self.term} x{self.count} ({self.get_granularity_display()} {self.bucket})"
+
+
+class SearchTermStat(models.Model):
+    term = models.CharField(max_length=255, unique=True)
+    total_count = models.PositiveIntegerField(default=0, db_index=True)
+    trending_score = models.FloatField(db_index=True, help_text='log of the time-decayed search count')
+    last_searched_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.term} ({self.total_count})"
+
+
 class Coupon(models.Model):
     code = models.CharField(max_length=50,unique=True, verbose_name='کد تخفیف')
     discount_percentage = models.DecimalField(max_digits=5,decimal_places=2)
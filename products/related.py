@@ -0,0 +1,134 @@
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .derivatives import sized_url
+from .detail_cache import invalidate_product_details
+from .models import Favorite, Image, Product, RelatedProduct
+
+# Points a candidate earns for every order, favoriting user, cart or tag it shares with the
+# product, and once for being in the same category.
+WEIGHTS = {
+    'order': 4.0,
+    'favorite': 3.0,
+    'cart': 1.0,
+    'tag': 1.0,
+    'category': 0.5,
+}
+
+
+def get_limit():
+    return getattr(settings, 'RELATED_PRODUCTS_LIMIT', 10)
+
+
+def get_max_group_size():
+    return getattr(settings, 'RELATED_PRODUCTS_MAX_GROUP_SIZE', 200)
+
+
+def get_sources():
+    from orders.models import CartItem, OrderItem
+    return [
+        ('order', OrderItem, 'order_id'),
+        ('favorite', Favorite, 'user_id'),
+        ('cart', CartItem, 'cart_id'),
+        ('tag', Product.tag.through, 'tag_id'),
+    ]
+
+
+def co_occurrences(model, group_field, product_ids, max_group_size=None):
+    """
+    For each of ``product_ids``, count the other products sharing a
+    ``group_field`` value with it. Groups of more than ``max_group_size``
+    rows (a tag on half the catalog, a bulk order) are left out: they say
+    little about any two of their products, and pairing them up grows with
+    the square of their size.
+    """
+    max_group_size = max_group_size or get_max_group_size()
+    groups = (model.objects.filter(**{f'{group_field}__in': model.objects.filter(product_id__in=product_ids)
+                                      .values(group_field)})
+              .values(group_field).annotate(size=Count('pk')).filter(size__lte=max_group_size).values(group_field))
+    members = defaultdict(set)
+    for group, product_id in model.objects.filter(**{f'{group_field}__in': groups}).values_list(
+            group_field, 'product_id'):
+        if product_id is not None:
+            members[group].add(product_id)
+
+    wanted = set(product_ids)
+    counts = defaultdict(Counter)
+    for group_members in members.values():
+        for product_id in group_members & wanted:
+            for other_id in group_members:
+                if other_id != product_id:
+                    counts[product_id][other_id] += 1
+    return counts
+
+
+def thumbnails(product_ids, size='card'):
+    """Storage URL of the ``size`` derivative of the first image (lowest id) of each product."""
+    first = {}
+    for product_id, image_id, name, derivatives in Product.images.through.objects.filter(
+            product_id__in=product_ids).values_list('product_id', 'image_id', 'image__image', 'image__derivatives'):
+        if product_id not in first or image_id < first[product_id][0]:
+            first[product_id] = (image_id, name, derivatives)
+    return {product_id: sized_url(Image(image=name).image, derivatives, size)
+            for product_id, (image_id, name, derivatives) in first.items() if name}
+
+
+def score_chunk(categories, limit):
+    """``{product_id: [(related_id, score), ...]}`` for the products in ``categories`` (id -> category id)."""
+    product_ids = list(categories)
+    scores = defaultdict(Counter)
+    for name, model, group_field in get_sources():
+        for product_id, counts in co_occurrences(model, group_field, product_ids).items():
+            for other_id, count in counts.items():
+                scores[product_id][other_id] += WEIGHTS[name] * count
+
+    # Same-category best sellers fill the list when there is not enough activity yet.
+    fillers = {}
+    for category_id in set(categories.values()) - {None}:
+        fillers[category_id] = list(Product.objects.filter(category_id=category_id).order_by('-sold', 'id')
+                                    .values_list('id', flat=True)[:limit + 1])
+    candidate_ids = {other_id for counts in scores.values() for other_id in counts}
+    candidate_categories = dict(Product.objects.filter(id__in=candidate_ids).values_list('id', 'category_id'))
+
+    ranked = {}
+    for product_id, category_id in categories.items():
+        counts = scores[product_id]
+        for other_id in fillers.get(category_id, []):
+            counts[other_id] += 0
+        if category_id is not None:
+            for other_id in counts:
+                if candidate_categories.get(other_id, category_id) == category_id:
+                    counts[other_id] += WEIGHTS['category']
+        counts.pop(product_id, None)
+        ranked[product_id] = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return ranked
+
+
+def build_related_index(product_ids=None, chunk_size=500, limit=None):
+    """Recompute ``RelatedProduct`` rows, ``chunk_size`` products per transaction. Returns the product count."""
+    limit = limit or get_limit()
+    queryset = Product.objects.order_by('id')
+    if product_ids is not None:
+        queryset = queryset.filter(id__in=product_ids)
+
+    built, last_id = 0, 0
+    while True:
+        categories = dict(queryset.filter(id__gt=last_id).values_list('id', 'category_id')[:chunk_size])
+        if not categories:
+            return built
+        ranked = score_chunk(categories, limit)
+        urls = thumbnails({related_id for items in ranked.values() for related_id, score in items})
+        with transaction.atomic():
+            RelatedProduct.objects.filter(product_id__in=categories).delete()
+            RelatedProduct.objects.bulk_create([
+                RelatedProduct(product_id=product_id, related_id=related_id, position=position, score=score,
+                               thumbnail=urls.get(related_id, ''))
+                for product_id, items in ranked.items()
+                for position, (related_id, score) in enumerate(items)
+            ])
+        invalidate_product_details(categories)
+        built += len(categories)
+        last_id = max(categories)
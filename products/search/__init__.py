@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .normalizer import normalize_text, tokenize
+
+DEFAULT_BACKENDS = {
+    'sqlite': 'products.search.backends.SQLiteFTSBackend',
+    'postgresql': 'products.search.backends.PostgresSearchBackend',
+}
+
+_backend = None
+
+
+def get_search_backend():
+    """
+    Return the configured product search backend. ``PRODUCT_SEARCH_BACKEND``
+    overrides the default, which is picked from the database vendor.
+    """
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None) or DEFAULT_BACKENDS.get(
+            connection.vendor, 'products.search.backends.DatabaseSearchBackend')
+        _backend = import_string(path)()
+    return _backend
+
+
+__all__ = ['get_search_backend', 'normalize_text', 'tokenize']
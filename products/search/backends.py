@@ -0,0 +1,292 @@
+import operator
+from functools import reduce
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import CharField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Concat, StrIndex
+
+from .normalizer import normalize_text, tokenize
+
+SEARCH_FIELDS = ['name_fa', 'name_en', 'description', 'tags', 'category']
+
+
+def build_document(product):
+    """Normalized text of every searchable field of ``product``."""
+    return {
+        'name_fa': normalize_text(product.nameFa),
+        'name_en': normalize_text(product.nameEn),
+        'description': normalize_text(product.description),
+        'tags': ' '.join(normalize_text(tag.title) for tag in product.tag.all()),
+        'category': normalize_text(product.category.name) if product.category_id else '',
+    }
+
+
+def iter_products(product_ids=None, chunk_size=1000):
+    from products.models import Product
+
+    queryset = Product.objects.select_related('category').prefetch_related('tag').only(
+        'id', 'nameFa', 'nameEn', 'description', 'category__name')
+    if product_ids is not None:
+        queryset = queryset.filter(id__in=product_ids)
+    return queryset.order_by('id').iterator(chunk_size=chunk_size)
+
+
+class BaseSearchBackend:
+    """
+    A product search backend keeps its own inverted index in sync with
+    ``Product`` (see ``products.signals``) and answers ranked id lookups.
+
+    Ranked results are capped at ``PRODUCT_SEARCH_MAX_RESULTS``; unranked
+    filtering joins the index as a subquery and returns every match.
+    """
+
+    def get_max_results(self):
+        return getattr(settings, 'PRODUCT_SEARCH_MAX_RESULTS', 500)
+
+    def ensure_schema(self):
+        pass
+
+    def index_products(self, products):
+        raise NotImplementedError
+
+    def remove_products(self, product_ids):
+        raise NotImplementedError
+
+    def search_ids(self, query, fields=None, limit=None):
+        """Return product ids matching every token of ``query`` (prefix match), best first."""
+        raise NotImplementedError
+
+    def match_sql(self, query, fields=None):
+        """``(sql, params)`` selecting the ids of all products matching ``query``, or None without tokens."""
+        raise NotImplementedError
+
+    def rebuild(self, chunk_size=1000):
+        self.ensure_schema()
+        self.clear()
+        batch = []
+        for product in iter_products(chunk_size=chunk_size):
+            batch.append(product)
+            if len(batch) >= chunk_size:
+                self.index_products(batch)
+                batch = []
+        if batch:
+            self.index_products(batch)
+
+    def clear(self):
+        raise NotImplementedError
+
+    def filter_queryset(self, queryset, query, fields=None, rank=True):
+        """
+        Restrict ``queryset`` to products matching ``query``. With ``rank`` the
+        best ``PRODUCT_SEARCH_MAX_RESULTS`` come first; without it, for callers
+        that sort or page on their own, nothing is left out.
+        """
+        if not rank:
+            match = self.match_sql(query, fields)
+            return queryset.none() if match is None else queryset.filter(id__in=RawSQL(*match))
+        ids = self.search_ids(query, fields=fields)
+        queryset = queryset.filter(id__in=ids)
+        if ids:
+            # Position of ",<id>," inside ",<id1>,<id2>,...," follows the rank order and, unlike a
+            # CASE with one WHEN per id, stays a single cheap expression for long result lists.
+            ranked_ids = ',{},'.format(','.join(str(pk) for pk in ids))
+            queryset = queryset.order_by(StrIndex(
+                Value(ranked_ids),
+                Concat(Value(','), Cast('id', output_field=CharField()), Value(','), output_field=CharField()),
+            ))
+        return queryset
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """Fallback for databases without a full-text engine: ``icontains`` per token, unranked."""
+
+    lookups = {
+        'name_fa': 'nameFa',
+        'name_en': 'nameEn',
+        'description': 'description',
+        'tags': 'tag__title',
+        'category': 'category__name',
+    }
+
+    def index_products(self, products):
+        pass
+
+    def remove_products(self, product_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def rebuild(self, chunk_size=1000):
+        pass
+
+    def filter_queryset(self, queryset, query, fields=None, rank=True):
+        fields = fields or SEARCH_FIELDS
+        for token in query.split():
+            queryset = queryset.filter(
+                reduce(operator.or_, [Q(**{f'{self.lookups[field]}__icontains': token}) for field in fields])
+            )
+        return queryset.distinct()
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """SQLite FTS5 virtual table keyed by product id, ranked with bm25."""
+
+    table = 'products_search_fts'
+    weights = {'name_fa': 10.0, 'name_en': 10.0, 'description': 1.0, 'tags': 5.0, 'category': 3.0}
+
+    def __init__(self):
+        self.schema_ready = False
+
+    def ensure_schema(self):
+        if self.schema_ready:
+            return
+        exists = self.table in connection.introspection.table_names()
+        if not exists:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE {self.table} USING fts5("
+                    f"{', '.join(SEARCH_FIELDS)}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+                )
+        self.schema_ready = True
+        if not exists:
+            self.rebuild()
+
+    def index_products(self, products):
+        self.ensure_schema()
+        rows = []
+        for product in products:
+            document = build_document(product)
+            rows.append([product.id] + [document[field] for field in SEARCH_FIELDS])
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [[row[0]] for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, {', '.join(SEARCH_FIELDS)}) "
+                f"VALUES (%s, {', '.join(['%s'] * len(SEARCH_FIELDS))})",
+                rows,
+            )
+
+    def remove_products(self, product_ids):
+        self.ensure_schema()
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [[pk] for pk in product_ids])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def build_match(self, tokens, fields=None):
+        expression = ' '.join(f'"{token}"*' for token in tokens)
+        if fields:
+            expression = '{%s} : (%s)' % (' '.join(fields), expression)
+        return expression
+
+    def match_sql(self, query, fields=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        self.ensure_schema()
+        return f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [self.build_match(tokens, fields)]
+
+    def search_ids(self, query, fields=None, limit=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        self.ensure_schema()
+        weights = ', '.join(str(self.weights[field]) for field in SEARCH_FIELDS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s '
+                f'ORDER BY bm25({self.table}, {weights}) LIMIT %s',
+                [self.build_match(tokens, fields), limit or self.get_max_results()],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    A ``tsvector`` document table with a GIN index. Fields are stored under
+    tsvector weights, which also lets a query be restricted to some fields;
+    both name fields share weight A.
+    """
+
+    table = 'products_search_document'
+    field_weights = {'name_fa': 'A', 'name_en': 'A', 'tags': 'B', 'category': 'C', 'description': 'D'}
+
+    def __init__(self):
+        self.schema_ready = False
+
+    def ensure_schema(self):
+        if self.schema_ready:
+            return
+        exists = self.table in connection.introspection.table_names()
+        if not exists:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'CREATE TABLE {self.table} ('
+                    f'product_id bigint PRIMARY KEY REFERENCES products_product (id) ON DELETE CASCADE, '
+                    f'document tsvector NOT NULL)'
+                )
+                cursor.execute(f'CREATE INDEX {self.table}_gin ON {self.table} USING GIN (document)')
+        self.schema_ready = True
+        if not exists:
+            self.rebuild()
+
+    def index_products(self, products):
+        self.ensure_schema()
+        vector = ' || '.join(
+            f"setweight(to_tsvector('simple', %s), '{self.field_weights[field]}')" for field in SEARCH_FIELDS
+        )
+        rows = []
+        for product in products:
+            document = build_document(product)
+            rows.append([product.id] + [document[field] for field in SEARCH_FIELDS])
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (product_id, document) VALUES (%s, {vector}) '
+                f'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+                rows,
+            )
+
+    def remove_products(self, product_ids):
+        self.ensure_schema()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE product_id = ANY(%s)', [list(product_ids)])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {self.table}')
+
+    def build_tsquery(self, tokens, fields=None):
+        weights = ''
+        if fields:
+            weights = ''.join(sorted({self.field_weights[field] for field in fields}))
+        return ' & '.join(f'{token}:*{weights}' for token in tokens)
+
+    def match_sql(self, query, fields=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        self.ensure_schema()
+        return (f"SELECT product_id FROM {self.table} WHERE document @@ to_tsquery('simple', %s)",
+                [self.build_tsquery(tokens, fields)])
+
+    def search_ids(self, query, fields=None, limit=None):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        self.ensure_schema()
+        tsquery = self.build_tsquery(tokens, fields)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT product_id FROM {self.table} WHERE document @@ to_tsquery('simple', %s) "
+                f"ORDER BY ts_rank(document, to_tsquery('simple', %s)) DESC, product_id LIMIT %s",
+                [tsquery, tsquery, limit or self.get_max_results()],
+            )
+            return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,38 @@
+import re
+import unicodedata
+
+ZWNJ = '\u200c'
+
+CHARACTER_MAP = str.maketrans({
+    # Arabic letters that Persian keyboards and copy-pasted text mix in.
+    '\u064a': '\u06cc',  # ي -> ی
+    '\u0649': '\u06cc',  # ى -> ی
+    '\u0643': '\u06a9',  # ك -> ک
+    '\u0629': '\u0647',  # ة -> ه
+    '\u0624': '\u0648',  # ؤ -> و
+    '\u0623': '\u0627',  # أ -> ا
+    '\u0625': '\u0627',  # إ -> ا
+    '\u0671': '\u0627',  # ٱ -> ا
+    # Persian and Arabic-Indic digits.
+    **{chr(0x06f0 + digit): str(digit) for digit in range(10)},
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    # Zero-width (non-)joiners and tatweel disappear so "می\u200cخواهم" and "میخواهم" match.
+    ZWNJ: None,
+    '\u200d': None,
+    '\u0640': None,
+})
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize_text(text):
+    """Fold Persian/Arabic variants, digits, diacritics and case to one searchable form."""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', str(text)).translate(CHARACTER_MAP)
+    text = ''.join(char for char in text if unicodedata.category(char) != 'Mn')
+    return text.casefold()
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(normalize_text(text))
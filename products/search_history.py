@@ -0,0 +1,70 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from api.buffers import WriteBehindBuffer
+
+DEFAULT_BUFFER_SETTINGS = {
+    'MAX_SIZE': 100,
+    'INTERVAL': 5.0,
+    'TRACKED_USERS': 10000,
+}
+
+_buffer = None
+
+
+class SearchHistoryBuffer(WriteBehindBuffer):
+    """
+    Buffers ``(user_id, term)`` pairs and writes them with one ``bulk_create``.
+    A term equal to the user's previous term is dropped instead of buffered.
+    """
+
+    def __init__(self, tracked_users=10000, **kwargs):
+        super().__init__(self.write, name='search-history-buffer', **kwargs)
+        self.tracked_users = tracked_users
+        self._last_terms = OrderedDict()
+
+    def _append(self, item):
+        user_id, term = item
+        if self._last_terms.get(user_id) == term:
+            self._last_terms.move_to_end(user_id)
+            return
+        self._last_terms[user_id] = term
+        self._last_terms.move_to_end(user_id)
+        if len(self._last_terms) > self.tracked_users:
+            self._last_terms.popitem(last=False)
+        super()._append(item)
+
+    def write(self, items):
+        from .models import SearchHistory
+        from .search_rollups import record_terms
+        SearchHistory.objects.bulk_create([SearchHistory(user_id=user_id, term=term) for user_id, term in items])
+        record_terms(term for user_id, term in items)
+
+
+def get_search_history_buffer():
+    global _buffer
+    if _buffer is None:
+        options = {**DEFAULT_BUFFER_SETTINGS, **getattr(settings, 'SEARCH_HISTORY_BUFFER', {})}
+        _buffer = SearchHistoryBuffer(
+            max_size=options['MAX_SIZE'],
+            interval=options['INTERVAL'],
+            tracked_users=options['TRACKED_USERS'],
+        )
+    return _buffer
+
+
+def record_search(user, term):
+    term = term.strip()[:255]
+    if term and user.is_authenticated:
+        get_search_history_buffer().add((user.id, term))
+
+
+@receiver(setting_changed)
+def reset_search_history_buffer(setting, **kwargs):
+    global _buffer
+    if setting == 'SEARCH_HISTORY_BUFFER' and _buffer is not None:
+        _buffer.close()
+        _buffer = None
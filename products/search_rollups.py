@@ -0,0 +1,110 @@
+import datetime
+import math
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+from .models import SearchTermBucket, SearchTermStat
+
+# Trending scores use forward decay: a search at time t adds 2 ** ((t - EPOCH) / half_life),
+# stored as a logarithm. Ordering by the stored value is the same as ordering by the decayed
+# count at any later moment, so scores never need to be rewritten as time passes.
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+LOG_ADD_CUTOFF = 50.0
+NO_SCORE = -1e12
+
+
+def get_half_life():
+    return getattr(settings, 'SEARCH_TRENDING_HALF_LIFE', datetime.timedelta(hours=6))
+
+
+def log_weight(count, when):
+    return math.log(count) + (when - EPOCH) / get_half_life() * math.log(2)
+
+
+def log_add(a, b):
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def bucket_starts(when):
+    local = timezone.localtime(when)
+    hour = local.replace(minute=0, second=0, microsecond=0)
+    day = hour.replace(hour=0)
+    return {SearchTermBucket.HOUR: hour, SearchTermBucket.DAY: day}
+
+
+def record_terms(terms, now=None):
+    """
+    Add searched ``terms`` to the hourly/daily buckets and the per-term totals.
+    Costs one INSERT per table plus one UPDATE per distinct repeat count.
+    """
+    counts = Counter(term for term in terms if term)
+    if not counts:
+        return
+    now = now or timezone.now()
+    buckets = bucket_starts(now)
+
+    by_count = defaultdict(list)
+    for term, count in counts.items():
+        by_count[count].append(term)
+
+    with transaction.atomic():
+        SearchTermBucket.objects.bulk_create(
+            [SearchTermBucket(term=term, granularity=granularity, bucket=bucket)
+             for term in counts for granularity, bucket in buckets.items()],
+            ignore_conflicts=True,
+        )
+        SearchTermStat.objects.bulk_create(
+            [SearchTermStat(term=term, total_count=0, trending_score=NO_SCORE, last_searched_at=now)
+             for term in counts],
+            ignore_conflicts=True,
+        )
+        for count, count_terms in by_count.items():
+            for granularity, bucket in buckets.items():
+                SearchTermBucket.objects.filter(term__in=count_terms, granularity=granularity, bucket=bucket).update(
+                    count=F('count') + count)
+
+            weight = log_weight(count, now)
+            score = F('trending_score')
+            SearchTermStat.objects.filter(term__in=count_terms).update(
+                total_count=F('total_count') + count,
+                last_searched_at=now,
+                trending_score=Case(
+                    When(Q(trending_score__lt=weight - LOG_ADD_CUTOFF), then=Value(weight)),
+                    When(Q(trending_score__gt=weight + LOG_ADD_CUTOFF), then=score),
+                    default=Greatest(score, Value(weight)) + Ln(Value(1.0) + Exp(-Abs(score - Value(weight)))),
+                    output_field=FloatField(),
+                ),
+            )
+
+
+def top_terms(period='all', limit=10, now=None):
+    """``[{'term': ..., 'count': ...}]`` for ``all`` time, ``trending``, the last ``day`` or ``week``."""
+    if period == 'trending':
+        rows = SearchTermStat.objects.order_by('-trending_score', '-total_count')[:limit]
+        return [{'term': row.term, 'count': row.total_count} for row in rows]
+
+    if period in ('day', 'week'):
+        starts = bucket_starts(now or timezone.now())
+        if period == 'day':
+            granularity = SearchTermBucket.HOUR
+            since = starts[granularity] - datetime.timedelta(hours=23)
+        else:
+            granularity = SearchTermBucket.DAY
+            since = starts[granularity] - datetime.timedelta(days=6)
+        return list(
+            SearchTermBucket.objects.filter(granularity=granularity, bucket__gte=since)
+            .values('term')
+            .annotate(count=Sum('count'))
+            .order_by('-count')[:limit]
+        )
+
+    return [{'term': term, 'count': count} for term, count in
+            SearchTermStat.objects.order_by('-total_count', 'term').values_list('term', 'total_count')[:limit]]
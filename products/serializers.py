@@ -1,7 +1,10 @@
 from rest_framework import serializers
-from .models import Attribute, Product, ProductAttribute, Tag, Category, Image, Comment, Favorite, SearchHistory, \
-    CommentLikeDislike
+from django.conf import settings
+from django.db.models import Prefetch
+from .models import Attribute, Product, ProductAttribute, Tag, Category, Image, Comment, Favorite, SearchHistory
 from django.contrib.auth import get_user_model
+from .category_tree import get_category_tree
+from .derivatives import derivative_urls, sized_url
 
 User = get_user_model()
 
@@ -21,9 +24,14 @@ class ProductAttributeSerializer(serializers.ModelSerializer):
 
 
 class ImageSerializer(serializers.ModelSerializer):
+    derivatives = serializers.SerializerMethodField()
+
     class Meta:
         model = Image
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'derivatives']
+
+    def get_derivatives(self, obj):
+        return derivative_urls(obj.derivatives, obj.image.storage, self.context.get('request'))
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -44,27 +52,25 @@ class ReplySerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Comment
-        fields = ['id', 'author', 'text', 'created_at', 'updated_at']
+        fields = ['id', 'parent', 'author', 'text', 'created_at', 'updated_at', 'likes_count', 'dislikes_count']
 
 
 class CommentSerializer(serializers.ModelSerializer):
     author = serializers.StringRelatedField(read_only=True)
-    replies = ReplySerializer(many=True, read_only=True)
-    likes_count = serializers.SerializerMethodField()
-    dislikes_count = serializers.SerializerMethodField()
+    replies = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
         fields = ['id', 'product', 'author', 'text', 'created_at', 'updated_at', 'replies', 'is_admin_reviewed',
                   'likes_count', 'dislikes_count',
                   'is_visible']
-        read_only_fields = ['created_at', 'updated_at', 'replies']
+        read_only_fields = ['created_at', 'updated_at', 'replies', 'likes_count', 'dislikes_count']
 
-    def get_likes_count(self, obj):
-        return obj.likes_dislikes.filter(value=CommentLikeDislike.LIKE).count()
-
-    def get_dislikes_count(self, obj):
-        return obj.likes_dislikes.filter(value=CommentLikeDislike.DISLIKE).count()
+    def get_replies(self, obj):
+        replies = getattr(obj, 'thread_replies', None)
+        if replies is None:
+            replies = obj.replies.all()
+        return ReplySerializer(replies, many=True, context=self.context).data
 
     def validate_product(self, value):
         if not Product.objects.filter(id=value.id).exists():
@@ -95,25 +101,58 @@ class ProductSerializer(serializers.ModelSerializer):
     Route = serializers.SerializerMethodField()
     comment_ids = serializers.SerializerMethodField()
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('category').prefetch_related(
+            'images',
+            'tag',
+            Prefetch('product_attributes', queryset=ProductAttribute.objects.select_related('attribute')),
+        )
+
+    @staticmethod
+    def get_batch_context(products, user):
+        """
+        Load everything the per-product methods need for a whole page at once,
+        so serializing a page costs the same number of queries for any page size.
+        """
+        product_ids = [product.id for product in products]
+
+        favorite_ids = set()
+        if user is not None and user.is_authenticated and product_ids:
+            favorite_ids = set(
+                Favorite.objects.filter(user_id=user.id, product_id__in=product_ids).values_list('product_id',
+                                                                                                  flat=True)
+            )
+
+        comment_ids = {product_id: [] for product_id in product_ids}
+        if product_ids:
+            visible_comments = Comment.objects.filter(
+                product_id__in=product_ids, is_visible=True, is_admin_reviewed=True
+            ).order_by('id').values_list('product_id', 'id')
+            for product_id, comment_id in visible_comments:
+                comment_ids[product_id].append(comment_id)
+
+        return {
+            'favorite_ids': favorite_ids,
+            'comment_ids': comment_ids,
+            'category_tree': get_category_tree(),
+        }
+
     def get_is_favorited(self, obj):
+        if 'favorite_ids' in self.context:
+            return obj.id in self.context['favorite_ids']
         user = self.context['request'].user
         if user.is_authenticated:
             return Favorite.objects.filter(user=user, product=obj).exists()
         return False
 
     def get_Route(self, obj):
-        Route = []
-        category = obj.category
-        while category:
-            Route.append({
-                'name': category.name,
-                'slug': category.slug,
-            })
-            category = category.parent
-
-        return list(reversed(Route))
+        tree = self.context.get('category_tree') or get_category_tree()
+        return tree.breadcrumb(obj.category_id)
 
     def get_comment_ids(self, obj):
+        if 'comment_ids' in self.context:
+            return self.context['comment_ids'].get(obj.id, [])
         comments = Comment.objects.filter(product=obj, is_visible=True, is_admin_reviewed=True)
         return comments.values_list('id', flat=True)
 
@@ -124,6 +163,16 @@ class ProductSerializer(serializers.ModelSerializer):
                   'attributes', 'is_favorited', 'Route', 'comment_ids']
 
 
+def first_image_url(product, request=None, size='card'):
+    """URL of the ``size`` derivative of the product's first image (lowest id), read from prefetched ``images``."""
+    images = product.images.all()
+    if not images:
+        return None
+    image = min(images, key=lambda image: image.pk)
+    image_url = sized_url(image.image, image.derivatives, size)
+    return request.build_absolute_uri(image_url) if request else image_url
+
+
 class RelatedProductSerializer(serializers.ModelSerializer):
     images = serializers.SerializerMethodField()
 
@@ -131,29 +180,70 @@ class RelatedProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = ['id', 'images']
 
-    images = serializers.SerializerMethodField()
-
     def get_images(self, obj):
-        request = self.context.get('request')
-        if obj.images.exists():
-            image_url = obj.images.first().image.url
-            return request.build_absolute_uri(image_url) if request else image_url
-        return None
+        return first_image_url(obj, self.context.get('request'))
+
 
+class ProductPreviewSerializer(serializers.ModelSerializer):
+    """The few fields a product card needs; expects ``images`` to be prefetched."""
+    image = serializers.SerializerMethodField()
 
-class SubCategorySerializer(serializers.ModelSerializer):
     class Meta:
-        model = Category
-        fields = ['id', 'name', 'slug']
+        model = Product
+        fields = ['id', 'nameFa', 'nameEn', 'slug', 'product_code', 'price', 'discount', 'image']
+
+    def get_image(self, obj):
+        return first_image_url(obj, self.context.get('request'))
 
 
 class CategorySerializer(serializers.ModelSerializer):
-    products = ProductSerializer(many=True, read_only=True)
-    sub = SubCategorySerializer(many=True, read_only=True)
+    """
+    A category with its direct children, read from the category tree, and a
+    preview of its newest products. The full product list is paged through
+    the category detail or product list endpoints with ``page_size``/``cursor``.
+    """
+    products = serializers.SerializerMethodField()
+    has_more_products = serializers.SerializerMethodField()
+    sub = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
-        fields = ['id', 'name', 'parent', 'image', 'slug', 'show_in_home', 'show_in_home_no_product', 'products', 'sub']
+        fields = ['id', 'name', 'parent', 'image', 'slug', 'show_in_home', 'show_in_home_no_product', 'products',
+                  'has_more_products', 'sub']
+
+    @staticmethod
+    def get_preview_size():
+        return getattr(settings, 'CATEGORY_PRODUCT_PREVIEW_SIZE', 10)
+
+    @staticmethod
+    def preview_queryset():
+        return Product.objects.order_by('-created_at', '-id').prefetch_related('images')
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        # One extra row tells whether there are more products than the preview shows.
+        return queryset.prefetch_related(
+            Prefetch('products', queryset=cls.preview_queryset()[:cls.get_preview_size() + 1],
+                     to_attr='preview_products'),
+        )
+
+    def get_preview(self, obj):
+        preview = getattr(obj, 'preview_products', None)
+        if preview is None:
+            preview = obj.preview_products = list(
+                self.preview_queryset().filter(category=obj)[:self.get_preview_size() + 1])
+        return preview
+
+    def get_products(self, obj):
+        return ProductPreviewSerializer(self.get_preview(obj)[:self.get_preview_size()], many=True,
+                                        context=self.context).data
+
+    def get_has_more_products(self, obj):
+        return len(self.get_preview(obj)) > self.get_preview_size()
+
+    def get_sub(self, obj):
+        return [{'id': child['id'], 'name': child['name'], 'slug': child['slug']}
+                for child in get_category_tree().children_of(obj.id)]
 
 
 class SearchHistorySerializer(serializers.ModelSerializer):
@@ -0,0 +1,176 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .category_tree import invalidate_category_tree
+from .derivatives import derivatives_ready, is_current, schedule
+from .detail_cache import invalidate_all_product_details, invalidate_product_details
+from .models import Attribute, Category, Comment, Image, Product, ProductAttribute, RelatedProduct, Tag
+from .search import get_search_backend
+from .search.backends import iter_products
+from .storage import release_image_file
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    invalidate_category_tree()
+
+
+def reindex_products(product_ids):
+    product_ids = list(product_ids)
+    if product_ids:
+        get_search_backend().index_products(iter_products(product_ids))
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        reindex_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    get_search_backend().remove_products([instance.pk])
+
+
+@receiver(m2m_changed, sender=Product.tag.through)
+def product_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        reindex_products(pk_set or [])
+    else:
+        reindex_products([instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        reindex_products(instance.post_tag.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        reindex_products(instance.products.values_list('id', flat=True))
+
+
+# Cached product pages (see detail_cache). Category changes alter every breadcrumb, so they
+# drop everything; the rest only drop the pages of the products involved.
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed_details(sender, **kwargs):
+    invalidate_all_product_details()
+
+
+@receiver(post_save, sender=Product)
+def product_saved_details(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_product_details([instance.pk])
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting_details(sender, instance, **kwargs):
+    # Pages listing the product as related; their index rows are removed by the cascade.
+    linked = list(RelatedProduct.objects.filter(related=instance).values_list('product_id', flat=True))
+    invalidate_product_details(linked + [instance.pk])
+
+
+@receiver(m2m_changed, sender=Product.tag.through)
+@receiver(m2m_changed, sender=Product.images.through)
+def product_relations_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    invalidate_product_details((pk_set or []) if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def image_changed(sender, instance, **kwargs):
+    product_ids = list(Product.objects.filter(images=instance.pk).values_list('id', flat=True))
+    invalidate_product_details(product_ids + [instance.product_id])
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved_details(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        invalidate_product_details(instance.post_tag.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Attribute)
+def attribute_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        invalidate_product_details(
+            Product.objects.filter(product_attributes__attribute=instance).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=ProductAttribute)
+@receiver(post_delete, sender=ProductAttribute)
+def product_attribute_changed(sender, instance, **kwargs):
+    invalidate_product_details([instance.product_id])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    invalidate_product_details([instance.product_id])
+
+
+# Resized copies of uploaded images (see derivatives). They are stored with a queryset update,
+# which sends no post_save, so finished derivatives announce themselves via derivatives_ready.
+
+@receiver(post_save, sender=Image)
+def image_saved_derivatives(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image or is_current(instance.derivatives, instance.image.name):
+        return
+    # An identical upload shares the file, and with it the derivatives already rendered for it.
+    for derivatives in Image.objects.filter(image=instance.image.name).exclude(pk=instance.pk).exclude(
+            derivatives={}).values_list('derivatives', flat=True)[:1]:
+        if is_current(derivatives, instance.image.name):
+            Image.objects.filter(pk=instance.pk).update(derivatives=derivatives)
+            instance.derivatives = derivatives
+            return
+    schedule(Image, instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def category_saved_derivatives(sender, instance, raw=False, **kwargs):
+    if not raw and instance.image and not is_current(instance.image_derivatives, instance.image.name):
+        schedule(Category, instance.pk, target='image_derivatives')
+
+
+@receiver(derivatives_ready, sender=Image)
+def image_derivatives_ready(sender, pk, **kwargs):
+    product_ids = list(Product.objects.filter(images=pk).values_list('id', flat=True))
+    product_ids += list(Image.objects.filter(pk=pk).values_list('product_id', flat=True))
+    # Related-product thumbnails in the index still point at the original until the next rebuild.
+    invalidate_product_details(product_ids)
+
+
+@receiver(derivatives_ready, sender=Category)
+def category_derivatives_ready(sender, pk, **kwargs):
+    invalidate_category_tree()
+
+
+# Image files are shared by identical uploads (see storage); a file is deleted after the
+# transaction that removed or replaced its last Image row commits.
+
+@receiver(pre_save, sender=Image)
+def image_saving_file(sender, instance, raw=False, **kwargs):
+    if not raw and instance.pk:
+        instance._previous_file = Image.objects.filter(pk=instance.pk).values_list('image', 'derivatives').first()
+
+
+@receiver(post_save, sender=Image)
+def image_saved_file(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_file', None)
+    if not raw and previous and previous[0] != instance.image.name:
+        transaction.on_commit(lambda: release_image_file(*previous))
+
+
+@receiver(post_delete, sender=Image)
+def image_deleted_file(sender, instance, **kwargs):
+    name, derivatives = instance.image.name, instance.derivatives
+    transaction.on_commit(lambda: release_image_file(name, derivatives))
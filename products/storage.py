@@ -0,0 +1,134 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+IMAGE_PREFIX = 'product-img'
+HASH_CHUNK_SIZE = 64 * 1024
+# product-img/ab/cd/abcd....jpg; only these names are known to never change content.
+CONTENT_NAME_PATTERN = rf'{IMAGE_PREFIX}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/(?P<digest>[0-9a-f]{{64}})\.\w+'
+CONTENT_NAME_RE = re.compile(rf'^{CONTENT_NAME_PATTERN}$')
+
+
+def file_digest(file):
+    """SHA-256 of ``file``, read in ``HASH_CHUNK_SIZE`` chunks so uploads never sit in memory whole."""
+    hasher = hashlib.sha256()
+    for chunk in file.chunks(HASH_CHUNK_SIZE):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def content_name(digest, filename):
+    extension = os.path.splitext(filename)[1].lower()
+    return f'{IMAGE_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def content_digest(name):
+    """The hash a content-addressed ``name`` was stored under, or None for other names."""
+    match = CONTENT_NAME_RE.match(name or '')
+    return match['digest'] if match else None
+
+
+def image_upload_to(instance, filename):
+    """``upload_to`` for ``Image.image``: names the file after its hash and records it in ``checksum``."""
+    instance.checksum = file_digest(instance.image.file)
+    return content_name(instance.checksum, filename)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage for names derived from the content. A name that
+    already exists holds the same bytes, so it is reused instead of being
+    suffixed, and the upload is not written a second time; its modification
+    time is renewed instead, which ``delete_unused`` reads as "in use". New
+    files are written to a temporary file and renamed into place, which
+    keeps two concurrent uploads of the same image from seeing a
+    half-written file.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        try:
+            os.utime(full_path)
+            return name
+        except FileNotFoundError:
+            pass
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temporary_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as stream:
+                for chunk in content.chunks():
+                    stream.write(chunk if isinstance(chunk, bytes) else chunk.encode())
+            os.chmod(temporary_path, self.file_permissions_mode or 0o644)
+            os.replace(temporary_path, full_path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.unlink(temporary_path)
+            raise
+        return name
+
+    def delete_unused(self, name, grace_period, is_referenced):
+        """
+        Delete ``name`` unless it was reused within ``grace_period`` seconds or
+        ``is_referenced()`` is true. Returns whether it was deleted.
+
+        The file is renamed aside before the checks. An upload that reused it
+        earlier has renewed its modification time, so it is put back; an
+        upload arriving later finds no file and writes it again.
+        """
+        full_path = self.path(name)
+        released_path = os.path.join(os.path.dirname(full_path), f'.released-{uuid.uuid4().hex}')
+        try:
+            os.rename(full_path, released_path)
+        except FileNotFoundError:
+            return False
+        if time.time() - os.stat(released_path).st_mtime < grace_period or is_referenced():
+            os.replace(released_path, full_path)
+            return False
+        os.unlink(released_path)
+        return True
+
+
+image_storage = ContentAddressedStorage()
+
+
+def get_image_file_grace_period():
+    return getattr(settings, 'IMAGE_FILE_GRACE_PERIOD', 60 * 60)
+
+
+def release_image_file(name, derivatives=None):
+    """
+    Delete ``name`` and its ``derivatives`` once no ``Image`` row refers to
+    the file any more. Rows are the reference count: identical uploads share
+    one file, so it is only removed together with its last row.
+
+    An upload that reused the file within ``IMAGE_FILE_GRACE_PERIOD`` seconds
+    may not have committed its row yet, so such a file is kept and left to
+    ``manage.py sweep_image_files``.
+    """
+    from .models import Image
+
+    def is_referenced():
+        return Image.objects.filter(image=name).exists()
+
+    if not name or is_referenced():
+        return False
+    storage = Image._meta.get_field('image').storage
+    # Only content-addressed names are ever reused by uploads.
+    grace_period = get_image_file_grace_period() if content_digest(name) else 0
+    if not storage.delete_unused(name, grace_period, is_referenced):
+        return False
+    for stored in [stored for formats in (derivatives or {}).values() for stored in formats.values()]:
+        storage.delete(stored)
+    return True
@@ -1,3 +1,954 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from api.async_views import gather_reads
+from .catalog import export_rows
+from .category_tree import get_category_tree
+from .codes import BlockAllocator
+from .models import Attribute, Category, CodeSequence, Comment, CommentLikeDislike, Favorite, Image, Product, ProductAttribute, RelatedProduct, SearchHistory, \
+    SearchTermBucket, SearchTermStat, Tag
+from .related import build_related_index
+from .serializers import first_image_url
+from .search_history import get_search_history_buffer
+from .storage import content_name, image_storage
+from .view_counter import get_view_counter_buffer
+from .search_rollups import record_terms
+
+User = get_user_model()
+
+
+def database_queries(queries):
+    """Captured queries other than those of the django_cache table the tests cache in and its savepoints."""
+    return [query for query in queries if 'django_cache' not in query['sql'] and 'SAVEPOINT' not in query['sql']]
+
+
+class ProductListQueryCountTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='Secret@123')
+        root = Category.objects.create(name='root', slug='root', show_in_home=False)
+        self.category = Category.objects.create(name='child', slug='child', parent=root, show_in_home=False)
+        self.tag = Tag.objects.create(title='tag')
+        self.attribute = Attribute.objects.create(name='color')
+        get_category_tree()
+
+    def create_products(self, count):
+        for _ in range(count):
+            index = Product.objects.count()
+            product = Product.objects.create(nameFa=f'product {index}', slug=f'product-{index}', price=100,
+                                             category=self.category)
+            product.tag.add(self.tag)
+            product.images.add(Image.objects.create(product=product, image='product-img/test.jpg'))
+            ProductAttribute.objects.create(product=product, attribute=self.attribute, value='red')
+            Comment.objects.create(product=product, author=self.user, text='nice', is_visible=True,
+                                   is_admin_reviewed=True)
+            Favorite.objects.create(user=self.user, product=product)
+
+    def count_list_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_success'])
+        return len(database_queries(queries)), response
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.client.force_authenticate(self.user)
+        url = reverse('product-list')
+
+        self.create_products(2)
+        self.client.get(url)  # caches the user's purchase role
+        small_page_queries, _ = self.count_list_queries(url)
+
+        self.create_products(8)
+        large_page_queries, response = self.count_list_queries(url)
+
+        self.assertEqual(len(response.data['data']), 10)
+        self.assertEqual(small_page_queries, large_page_queries)
+        self.assertLessEqual(large_page_queries, 8)
+
+    def test_category_tree_is_resolved_once_per_page(self):
+        self.create_products(5)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('product-list'))
+        self.assertEqual(len([query for query in queries if 'category-tree-version' in query['sql']]), 1)
+
+    def test_batched_fields_match_per_product_values(self):
+        self.client.force_authenticate(self.user)
+        self.create_products(1)
+
+        response = self.client.get(reverse('product-list'))
+        product = response.data['data'][0]
+
+        self.assertTrue(product['is_favorited'])
+        self.assertEqual([item['slug'] for item in product['Route']], ['root', 'child'])
+        self.assertEqual(len(product['comment_ids']), 1)
+        self.assertEqual(product['attributes'][0]['value'], 'red')
+
+
+class ProductKeysetPaginationTests(APITestCase):
+    def setUp(self):
+        for index in range(7):
+            Product.objects.create(nameFa=f'product {index}', slug=f'product-{index}', price=100 * (index % 3))
+
+    def collect_pages(self, params):
+        ids, cursor = [], None
+        while True:
+            query = dict(params, page_size=3)
+            if cursor:
+                query['cursor'] = cursor
+            response = self.client.get(reverse('product-list'), query)
+            self.assertTrue(response.data['is_success'])
+            self.assertLessEqual(len(response.data['data']), 3)
+            ids.extend(product['id'] for product in response.data['data'])
+            cursor = response.data['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_cursor_walks_every_product_once_with_ties(self):
+        ids = self.collect_pages({'order_by': 'price', 'order_type': 'desc'})
+        expected = list(Product.objects.order_by('-price', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_cursor_on_created_at(self):
+        ids = self.collect_pages({'order_by': 'created_at'})
+        self.assertEqual(ids, list(Product.objects.order_by('created_at', 'id').values_list('id', flat=True)))
+
+    def test_ordering_param_sets_the_cursor_key(self):
+        ids = self.collect_pages({'ordering': '-price'})
+        self.assertEqual(ids, list(Product.objects.order_by('-price', '-id').values_list('id', flat=True)))
+
+    def test_orderings_the_cursor_cannot_follow_are_rejected(self):
+        for ordering in ['nameFa', 'price,-sold']:
+            response = self.client.get(reverse('product-list'), {'ordering': ordering, 'page_size': 3})
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(response.data['is_success'])
+
+    def test_unpaginated_request_keeps_full_list(self):
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(len(response.data['data']), 7)
+        self.assertNotIn('next_cursor', response.data)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('product-list'), {'cursor': 'not-a-cursor'})
+        self.assertFalse(response.data['is_success'])
+
+
+class CategoryTreeTests(APITestCase):
+    def setUp(self):
+        self.root = Category.objects.create(name='root', slug='root', show_in_home=False)
+        self.child = Category.objects.create(name='child', slug='child', parent=self.root, show_in_home=False)
+        self.leaf = Category.objects.create(name='leaf', slug='leaf', parent=self.child, show_in_home=False)
+        self.other = Category.objects.create(name='other', slug='other', show_in_home=False)
+
+    def test_paths_follow_parent_moves(self):
+        self.assertEqual(self.leaf.path, f'{self.root.id}/{self.child.id}/{self.leaf.id}/')
+
+        self.child.parent = self.other
+        self.child.save()
+
+        self.leaf.refresh_from_db()
+        self.assertEqual(self.leaf.path, f'{self.other.id}/{self.child.id}/{self.leaf.id}/')
+        self.assertEqual(set(self.other.get_descendants().values_list('id', flat=True)),
+                         {self.other.id, self.child.id, self.leaf.id})
+
+    def test_breadcrumb_is_served_from_cached_tree(self):
+        get_category_tree()
+        with CaptureQueriesContext(connection) as queries:
+            breadcrumb = get_category_tree().breadcrumb(self.leaf.id)
+        self.assertEqual(database_queries(queries), [])
+        self.assertEqual([item['slug'] for item in breadcrumb], ['root', 'child', 'leaf'])
+
+        self.leaf.name = 'renamed'
+        self.leaf.save()
+        self.assertEqual(get_category_tree().breadcrumb(self.leaf.id)[-1]['name'], 'renamed')
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                       PROCESS_LOCAL_CACHE_TIMEOUT=30)
+    def test_tree_version_expires_on_a_process_local_cache(self):
+        version = get_category_tree().version
+        self.assertEqual(get_category_tree().version, version)
+        # Another worker's invalidation never reaches this cache; its version runs out instead.
+        with mock.patch('time.time', return_value=time.time() + 31):
+            self.assertNotEqual(get_category_tree().version, version)
+
+    def test_category_filter_includes_descendants_on_request(self):
+        Product.objects.create(nameFa='in root', slug='in-root', price=1, category=self.root)
+        Product.objects.create(nameFa='in leaf', slug='in-leaf', price=1, category=self.leaf)
+        Product.objects.create(nameFa='elsewhere', slug='elsewhere', price=1, category=self.other)
+
+        direct = self.client.get(reverse('product-list'), {'category': self.root.id})
+        subtree = self.client.get(reverse('product-list'), {'category': self.root.id, 'include_descendants': 1})
+
+        self.assertEqual([p['slug'] for p in direct.data['data']], ['in-root'])
+        self.assertEqual({p['slug'] for p in subtree.data['data']}, {'in-root', 'in-leaf'})
+
+
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        self.phone = Product.objects.create(nameFa='گوشی سامسونگ مدل ۱۲', nameEn='Samsung phone', price=10,
+                                            slug='phone')
+        self.book = Product.objects.create(nameFa='کتاب می‌خواهم', nameEn='Book', price=10, slug='book')
+        self.book.tag.add(Tag.objects.create(title='هدیه'))
+
+    def search(self, **params):
+        response = self.client.get(reverse('product-search'), params)
+        self.assertTrue(response.data['is_success'])
+        return [product['slug'] for product in response.data['data']]
+
+    def test_persian_variants_match(self):
+        self.assertEqual(self.search(nameFa='كتاب'), ['book'])
+        self.assertEqual(self.search(nameFa='ميخواهم'), ['book'])
+        self.assertEqual(self.search(nameFa='مدل 12'), ['phone'])
+
+    def test_prefix_and_ranking(self):
+        self.assertEqual(self.search(nameEn='sams'), ['phone'])
+        response = self.client.get(reverse('product-list'), {'search': 'هدی'})
+        self.assertEqual([product['slug'] for product in response.data['data']], ['book'])
+
+    @override_settings(PRODUCT_SEARCH_MAX_RESULTS=5)
+    def test_sorted_and_paged_searches_are_not_capped(self):
+        for index in range(7):
+            Product.objects.create(nameFa=f'گوشی {index}', price=index, slug=f'phone-{index}')
+        self.assertEqual(len(self.search(nameFa='گوشی')), 5)
+        self.assertEqual(len(self.search(nameFa='گوشی', order_by='price')), 8)
+        response = self.client.get(reverse('product-list'), {'search': 'گوشی', 'order_by': 'price'})
+        self.assertEqual(len(response.data['data']), 8)
+
+        slugs, params = [], {'search': 'گوشی', 'page_size': 3}
+        while True:
+            response = self.client.get(reverse('product-list'), params)
+            slugs += [product['slug'] for product in response.data['data']]
+            if not response.data['next_cursor']:
+                break
+            params['cursor'] = response.data['next_cursor']
+        self.assertEqual(len(set(slugs)), 8)
+
+    def test_index_follows_updates_and_deletes(self):
+        self.phone.nameEn = 'Nokia phone'
+        self.phone.save()
+        self.assertEqual(self.search(nameEn='nokia'), ['phone'])
+        self.phone.delete()
+        self.assertEqual(self.search(nameEn='phone'), [])
+
+
+@override_settings(SEARCH_HISTORY_BUFFER={'MAX_SIZE': 100, 'INTERVAL': None})
+class SearchHistoryBufferTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='Secret@123')
+        self.client.force_authenticate(self.user)
+
+    def test_searches_are_buffered_and_consecutive_duplicates_collapsed(self):
+        for term in ['گوشی', 'گوشی', 'کتاب', 'گوشی']:
+            self.client.get(reverse('product-search'), {'nameFa': term})
+        self.assertFalse(SearchHistory.objects.exists())
+
+        get_search_history_buffer().flush()
+
+        self.assertEqual(list(SearchHistory.objects.order_by('id').values_list('term', flat=True)),
+                         ['گوشی', 'کتاب', 'گوشی'])
+
+
+@override_settings(PRODUCT_VIEW_COUNTER={'MAX_SIZE': 1000, 'INTERVAL': None, 'DEDUPE_WINDOW': 60})
+class ProductViewCounterTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.phone = Product.objects.create(nameFa='phone', slug='phone', price=1, view=0)
+        self.book = Product.objects.create(nameFa='book', slug='book', price=1, view=0)
+
+    def view(self, product, user=None):
+        self.client.force_authenticate(user)
+        self.client.get(reverse('product-detail', args=[product.id]), REMOTE_ADDR='10.0.0.1')
+
+    def test_views_are_buffered_and_deduplicated_per_viewer(self):
+        users = [User.objects.create_user(username=f'viewer{i}', password='Secret@123') for i in range(3)]
+        for user in users:
+            self.view(self.phone, user)
+            self.view(self.phone, user)
+        self.view(self.phone)
+        self.view(self.book)
+        self.view(self.book)
+        self.assertEqual(Product.objects.get(id=self.phone.id).view, 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            get_view_counter_buffer().flush()
+
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE')]), 2)
+        self.assertEqual(dict(Product.objects.values_list('slug', 'view')), {'phone': 4, 'book': 1})
+
+
+class SearchRollupTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='Secret@123')
+
+    def test_hot_searches_come_from_rollups(self):
+        now = timezone.now()
+        record_terms(['گوشی', 'گوشی', 'کتاب'], now=now - datetime.timedelta(days=2))
+        record_terms(['کتاب', 'کفش'], now=now)
+
+        response = self.client.get(reverse('hot-search'))
+        self.assertEqual(response.data[:2], [{'term': 'کتاب', 'count': 2}, {'term': 'گوشی', 'count': 2}])
+
+        trending = self.client.get(reverse('hot-search'), {'period': 'trending'}).data
+        self.assertEqual(trending[0]['term'], 'کتاب')
+        self.assertEqual(trending[-1]['term'], 'گوشی')
+
+        today = self.client.get(reverse('hot-search'), {'period': 'day'}).data
+        self.assertEqual({row['term'] for row in today}, {'کتاب', 'کفش'})
+
+    def test_backfill_matches_incremental_rollups(self):
+        for term in ['گوشی', 'گوشی', 'کتاب']:
+            SearchHistory.objects.create(user=self.user, term=term)
+        call_command('backfill_search_rollups', stdout=io.StringIO())
+
+        self.assertEqual(dict(SearchTermStat.objects.values_list('term', 'total_count')), {'گوشی': 2, 'کتاب': 1})
+        self.assertEqual(SearchTermBucket.objects.filter(granularity=SearchTermBucket.DAY).count(), 2)
+
+
+class CommentVoteCounterTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='voter', password='Secret@123')
+        self.product = Product.objects.create(nameFa='product', slug='product', price=1)
+        self.comment = Comment.objects.create(product=self.product, author=self.user, text='nice', is_visible=True,
+                                              is_admin_reviewed=True)
+        self.client.force_authenticate(self.user)
+
+    def vote(self, value):
+        return self.client.post(reverse('comment-like-dislike'), {'comment_id': self.comment.id, 'value': value})
+
+    def counters(self):
+        self.comment.refresh_from_db()
+        return self.comment.likes_count, self.comment.dislikes_count
+
+    def test_counters_follow_create_toggle_and_delete(self):
+        self.assertEqual(self.vote(1).status_code, 201)
+        self.assertEqual(self.counters(), (1, 0))
+        self.vote(-1)
+        self.assertEqual(self.counters(), (0, 1))
+        self.assertEqual(self.vote(-1).status_code, 204)
+        self.assertEqual(self.counters(), (0, 0))
+        self.assertEqual(self.vote('x').status_code, 400)
+
+    def test_votes_changed_by_a_concurrent_request_leave_the_counters_alone(self):
+        self.vote(1)
+        stale = CommentLikeDislike.objects.get(user=self.user)
+        self.vote(1)
+        # Both requests below read the vote before the one above removed it.
+        with mock.patch.object(CommentLikeDislike.objects, 'get_or_create', return_value=(stale, False)):
+            self.assertEqual(self.vote(1).status_code, 204)
+            self.vote(-1)
+        self.assertEqual(self.counters(), (0, 0))
+
+    def test_reconcile_recomputes_from_votes(self):
+        CommentLikeDislike.objects.create(user=self.user, comment=self.comment, value=CommentLikeDislike.LIKE)
+        call_command('reconcile_comment_votes', stdout=io.StringIO())
+        self.assertEqual(self.counters(), (1, 0))
+
+    def test_migrate_backfills_counters_of_earlier_votes(self):
+        CommentLikeDislike.objects.create(user=self.user, comment=self.comment, value=CommentLikeDislike.DISLIKE)
+        untouched = Comment.objects.create(product=self.product, author=self.user, text='edited', likes_count=2)
+        call_command('migrate', verbosity=0)
+        self.assertEqual(self.counters(), (0, 1))
+        untouched.refresh_from_db()
+        self.assertEqual(untouched.likes_count, 2)
+
+    def test_listing_comments_uses_constant_queries(self):
+        url = reverse('product-comments', args=[self.product.id])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for index in range(5):
+            author = User.objects.create_user(username=f'author{index}', password='Secret@123')
+            parent = Comment.objects.create(product=self.product, author=author, text='root', is_visible=True,
+                                            is_admin_reviewed=True)
+            Comment.objects.create(product=self.product, author=author, text='reply', parent=parent,
+                                   is_visible=True, is_admin_reviewed=True)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertTrue(response.data['is_success'])
+        self.assertEqual(len(few), len(many))
+
+
+class CommentThreadTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='author', password='Secret@123')
+        self.product = Product.objects.create(nameFa='product', slug='product', price=1)
+        self.url = reverse('product-comments', args=[self.product.id])
+
+    def comment(self, parent=None, visible=True):
+        return Comment.objects.create(product=self.product, author=self.user, text='text', parent=parent,
+                                      is_visible=visible, is_admin_reviewed=True)
+
+    def test_replies_are_nested_under_their_thread(self):
+        root = self.comment()
+        reply = self.comment(parent=root)
+        nested = self.comment(parent=reply)
+        hidden = self.comment(parent=root, visible=False)
+        self.comment(parent=hidden)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual([thread['id'] for thread in response.data['data']], [root.id])
+        replies = response.data['data'][0]['replies']
+        self.assertEqual([(item['id'], item['parent']) for item in replies], [(reply.id, root.id), (nested.id, reply.id)])
+
+    def test_root_threads_are_paginated(self):
+        roots = [self.comment() for _ in range(5)]
+        for root in roots:
+            self.comment(parent=root)
+
+        seen, cursor = [], None
+        while True:
+            params = {'page_size': 2}
+            if cursor:
+                params['cursor'] = cursor
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(self.url, params)
+            self.assertLessEqual(len(queries), 3)
+            seen.extend(thread['id'] for thread in response.data['data'])
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, [root.id for root in roots])
+
+
+class ProductCodeAllocationTests(TestCase):
+    def build(self, index, **kwargs):
+        return Product(nameFa=f'product {index}', slug=f'product-{index}', price=1, **kwargs)
+
+    # Setting the block size also drops blocks that earlier tests reserved from a since flushed sequence.
+    @override_settings(CODE_SEQUENCE_BLOCK_SIZES={'product_code': 20})
+    def test_codes_continue_from_existing_products(self):
+        self.build(0, product_code='0041').save()
+        self.build(1).save()
+        Product.objects.bulk_create([self.build(index) for index in range(2, 5)])
+
+        codes = list(Product.objects.order_by('id').values_list('product_code', flat=True))
+        self.assertEqual(codes, ['0041', '0042', '0043', '0044', '0045'])
+        self.assertEqual(Product.objects.get(slug='product-2').MaximumBuy, 1)
+
+    @override_settings(CODE_SEQUENCE_BLOCK_SIZES={'product_code': 1})
+    def test_rolled_back_insert_returns_its_code_without_blocks(self):
+        self.build(0).save()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.build(1).save()
+            self.build(1).save()
+        self.build(2).save()
+        self.assertEqual(list(Product.objects.order_by('id').values_list('product_code', flat=True)), ['0001', '0002'])
+
+
+class BlockAllocatorTests(TransactionTestCase):
+    def test_blocks_are_committed_when_reserved(self):
+        allocator = BlockAllocator('test', block_size=10)
+        self.assertEqual(allocator.take(3), [1, 2, 3])
+        self.assertEqual(allocator.take(12), list(range(4, 16)))
+        self.assertEqual(CodeSequence.objects.get(name='test').last_value, 20)
+
+        with transaction.atomic():
+            self.assertEqual(allocator.take(2), [16, 17])
+            # On SQLite values beyond the block come from the sequence inside the transaction.
+            self.assertEqual(allocator.take(4), [18, 19, 20, 21])
+        self.assertEqual(allocator.take(1), [22])
+        self.assertEqual(CodeSequence.objects.get(name='test').last_value, 31)
+
+    def test_blocks_taken_in_a_transaction_outlive_its_rollback(self):
+        allocator = BlockAllocator('test', block_size=10)
+        with mock.patch('products.codes.reserves_on_own_connection', return_value=True):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                self.assertEqual(allocator.take(3), [1, 2, 3])
+                raise IntegrityError
+        self.assertEqual(CodeSequence.objects.get(name='test').last_value, 10)
+        self.assertEqual(allocator.take(2), [4, 5])
+
+
+class CatalogImportExportTests(TestCase):
+    def import_file(self, name, content, **options):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.write(content)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_products', path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    @override_settings(CODE_SEQUENCE_BLOCK_SIZES={'product_code': 20})
+    def test_csv_import_upserts_products_and_relations(self):
+        Product.objects.create(nameFa='old', slug='phone', price=1)
+        content = (
+            'slug,nameFa,price,category,tags,attributes\n'
+            'phone,گوشی,2000,digital,new|sale,"{""color"": ""black""}"\n'
+            'book,کتاب,300,books,sale,\n'
+            'broken,no price,,books,,\n'
+        )
+        with CaptureQueriesContext(connection) as queries:
+            out, err = self.import_file('catalog.csv', content, chunk_size=10)
+
+        self.assertIn('Created 1 and updated 1 products, skipped 1 invalid rows.', out)
+        self.assertIn('line 4: missing price', err)
+        phone = Product.objects.get(slug='phone')
+        self.assertEqual((phone.nameFa, phone.price, phone.category.slug), ('گوشی', 2000, 'digital'))
+        self.assertEqual(sorted(phone.tag.values_list('title', flat=True)), ['new', 'sale'])
+        self.assertEqual(list(phone.product_attributes.values_list('attribute__name', 'value')), [('color', 'black')])
+        self.assertEqual(Tag.objects.filter(title='sale').count(), 1)
+        self.assertEqual(Product.objects.get(slug='book').product_code, '0002')
+        self.assertLess(len(database_queries(queries)), 40)
+
+    def test_rows_failing_field_validation_are_reported_and_skipped(self):
+        content = (
+            'slug,nameFa,price,discount,tags\n'
+            'phone,گوشی,2000,10,sale\n'
+            'negative,bad,100,-5,\n'
+            'too-much,bad,100,150,\n'
+            f'{"x" * 60},bad,100,,\n'
+            f'long-name,{"n" * 300},100,,\n'
+            f'long-tag,bad,100,,{"t" * 60}\n'
+            'book,کتاب,300,,\n'
+        )
+        out, err = self.import_file('catalog.csv', content)
+
+        self.assertIn('Created 2 and updated 0 products, skipped 5 invalid rows.', out)
+        for line in range(3, 8):
+            self.assertIn(f'line {line}:', err)
+        self.assertEqual(sorted(Product.objects.values_list('slug', flat=True)), ['book', 'phone'])
+
+    def test_imported_images_are_content_addressed_and_rendered(self):
+        from PIL import Image as PILImage
+        from home.feed import get_home_feed
+        cache.clear()
+        self.enterContext(override_settings(MEDIA_ROOT=self.tmpdir.name, IMAGE_DERIVATIVES={'WORKERS': 0}))
+        Category.objects.create(name='Digital', slug='digital', show_in_home=True)
+        os.makedirs(os.path.join(self.tmpdir.name, 'uploads'))
+        PILImage.new('RGB', (64, 64), 'red').save(os.path.join(self.tmpdir.name, 'uploads/phone.png'))
+        self.assertNotIn(b'phone', get_home_feed()[1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.import_file('catalog.jsonl', json.dumps({
+                'slug': 'phone', 'nameFa': 'گوشی', 'price': 10, 'category': 'digital', 'images': ['uploads/phone.png'],
+            }) + '\n')
+
+        image = Product.objects.get(slug='phone').images.get()
+        self.assertEqual(image.image.name, content_name(image.checksum, 'phone.png'))
+        self.assertEqual(set(image.derivatives), {'thumb', 'card', 'medium'})
+        self.assertIn(b'phone', get_home_feed()[1])
+
+    def test_export_round_trips_through_import(self):
+        self.import_file('catalog.jsonl', json.dumps({
+            'slug': 'phone', 'nameFa': 'گوشی', 'price': 10, 'category': 'digital', 'tags': ['sale'],
+            'images': ['product-img/phone.jpg'], 'attributes': {'color': 'black'},
+        }) + '\n')
+        for file_format in ('csv', 'jsonl'):
+            path = os.path.join(self.tmpdir.name, f'export.{file_format}')
+            call_command('export_products', path)
+            Product.objects.all().delete()
+            self.import_file(f'again.{file_format}', open(path, encoding='utf-8').read())
+
+            [row] = export_rows()
+            self.assertEqual(
+                {key: row[key] for key in ('slug', 'nameFa', 'price', 'category', 'tags', 'images', 'attributes')},
+                {'slug': 'phone', 'nameFa': 'گوشی', 'price': 10, 'category': 'digital', 'tags': ['sale'],
+                 'images': ['product-img/phone.jpg'], 'attributes': {'color': 'black'}},
+            )
+
+
+@override_settings(PRODUCT_VIEW_COUNTER={'MAX_SIZE': 1000, 'INTERVAL': None, 'DEDUPE_WINDOW': 0})
+class ProductDetailCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer', password='Secret@123')
+        self.category = Category.objects.create(name='Phones', slug='phones', show_in_home=False)
+        self.phone = Product.objects.create(nameFa='phone', slug='phone', price=1, category=self.category)
+        self.other = Product.objects.create(nameFa='other', slug='other', price=1, category=self.category)
+        self.url = reverse('product-detail', args=[self.phone.id])
+        get_category_tree()
+
+    def get(self):
+        return self.client.get(self.url).data['data']
+
+    def test_second_hit_is_served_from_cache_with_fresh_overlays(self):
+        first = self.get()
+        Favorite.objects.create(user=self.user, product=self.phone)
+        Product.objects.filter(id=self.phone.id).update(sold=7, NumberOfProduct=3)
+        self.client.force_authenticate(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.get()
+
+        self.assertLessEqual(len(database_queries(queries)), 3)
+        self.assertEqual(second['related_products'], first['related_products'])
+        self.assertEqual([item['id'] for item in second['related_products']], [self.other.id])
+        self.assertEqual((second['product']['sold'], second['product']['NumberOfProduct']), (7, 3))
+        self.assertTrue(second['product']['is_favorited'])
+        self.assertFalse(first['product']['is_favorited'])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_pages_are_not_cached_in_a_process_local_cache(self):
+        self.get()
+        # A write in another worker: no signal reaches this process.
+        Product.objects.filter(id=self.phone.id).update(nameFa='renamed')
+        self.assertEqual(self.get()['product']['nameFa'], 'renamed')
+
+    def test_changes_invalidate_the_cached_page(self):
+        self.get()
+        self.phone.nameFa = 'renamed'
+        self.phone.save()
+        self.assertEqual(self.get()['product']['nameFa'], 'renamed')
+
+        tag = Tag.objects.create(title='sale')
+        self.phone.tag.add(tag)
+        self.assertEqual([item['title'] for item in self.get()['product']['tag']], ['sale'])
+
+        comment = Comment.objects.create(product=self.phone, author=self.user, text='text', is_visible=True,
+                                         is_admin_reviewed=True)
+        self.assertEqual(self.get()['product']['comment_ids'], [comment.id])
+
+        attribute = Attribute.objects.create(name='color')
+        ProductAttribute.objects.create(product=self.phone, attribute=attribute, value='black')
+        self.assertEqual(self.get()['product']['attributes'][0]['value'], 'black')
+
+        build_related_index()
+        self.assertEqual([item['id'] for item in self.get()['related_products']], [self.other.id])
+
+        self.category.name = 'Mobiles'
+        self.category.save()
+        self.assertEqual(self.get()['product']['Route'][0]['name'], 'Mobiles')
+
+
+class RelatedProductIndexTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Phones', slug='phones', show_in_home=False)
+        self.products = {
+            slug: Product.objects.create(nameFa=slug, slug=slug, price=1, category=self.category if index < 3 else None)
+            for index, slug in enumerate(['phone', 'case', 'charger', 'book', 'pen'])
+        }
+        image = Image.objects.create(image='product-img/book.jpg')
+        self.products['book'].images.add(image)
+
+    def related(self, slug):
+        return list(RelatedProduct.objects.filter(product=self.products[slug]).order_by('position')
+                    .values_list('related__slug', flat=True))
+
+    def test_signals_are_ranked_and_thumbnails_denormalized(self):
+        users = [User.objects.create_user(username=f'user{i}', password='Secret@123') for i in range(2)]
+        for user in users:
+            Favorite.objects.create(user=user, product=self.products['phone'])
+            Favorite.objects.create(user=user, product=self.products['book'])
+        tag = Tag.objects.create(title='gift')
+        self.products['phone'].tag.add(tag)
+        self.products['pen'].tag.add(tag)
+
+        with CaptureQueriesContext(connection) as queries:
+            build_related_index(chunk_size=2)
+        self.assertLess(len(queries), 60)
+
+        self.assertEqual(self.related('phone'), ['book', 'pen', 'case', 'charger'])
+        self.assertEqual(self.related('pen'), ['phone'])
+        self.assertEqual(RelatedProduct.objects.get(product=self.products['phone'], related=self.products['book'])
+                         .thumbnail, '/media/product-img/book.jpg')
+
+    @override_settings(RELATED_PRODUCTS_MAX_GROUP_SIZE=2)
+    def test_groups_above_the_size_cap_are_ignored(self):
+        tag, broad = Tag.objects.create(title='gift'), Tag.objects.create(title='sale')
+        self.products['book'].tag.add(tag)
+        self.products['pen'].tag.add(tag)
+        for product in self.products.values():
+            product.tag.add(broad)
+        build_related_index()
+        self.assertEqual(self.related('pen'), ['book'])
+
+    def test_detail_page_reads_related_items_in_one_query(self):
+        build_related_index()
+        url = reverse('product-detail', args=[self.products['phone'].id])
+        with override_settings(PRODUCT_VIEW_COUNTER={'DEDUPE_WINDOW': 0, 'INTERVAL': None}):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+        self.assertEqual([item['id'] for item in response.data['data']['related_products']],
+                         [self.products['case'].id, self.products['charger'].id])
+        self.assertEqual(len([query for query in queries if 'products_relatedproduct' in query['sql']]), 1)
+
+
+class CategoryPayloadTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.roots = [Category.objects.create(name=f'root {i}', slug=f'root-{i}', show_in_home=True) for i in range(3)]
+        Category.objects.create(name='child', slug='child', parent=self.roots[0], show_in_home=False)
+        for root in self.roots:
+            for index in range(4):
+                product = Product.objects.create(nameFa=f'{root.slug} {index}', slug=f'{root.slug}-{index}', price=index,
+                                                 category=root)
+                product.images.add(Image.objects.create(image=f'product-img/{product.slug}.jpg'))
+        get_category_tree()
+
+    @override_settings(CATEGORY_PRODUCT_PREVIEW_SIZE=2)
+    def test_category_list_embeds_a_capped_preview_with_constant_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('category-list'))
+
+        self.assertLessEqual(len(database_queries(queries)), 4)
+        first = response.data['data'][0]
+        self.assertEqual([product['slug'] for product in first['products']], ['root-0-3', 'root-0-2'])
+        self.assertTrue(first['has_more_products'])
+        self.assertTrue(first['products'][0]['image'].endswith('/media/product-img/root-0-3.jpg'))
+        self.assertEqual([sub['slug'] for sub in first['sub']], ['child'])
+
+    def test_category_detail_pages_through_products(self):
+        url = reverse('category-detail', args=[self.roots[1].id])
+        slugs, cursor = [], None
+        while True:
+            params = {'page_size': 3, 'order_by': 'price', 'order_type': 'desc'}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get(url, params)
+            slugs.extend(product['slug'] for product in response.data['data']['products'])
+            cursor = response.data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(slugs, ['root-1-3', 'root-1-2', 'root-1-1', 'root-1-0'])
+
+
+@override_settings(IMAGE_DERIVATIVES={'SIZES': {'thumb': (40, 40), 'card': (80, 80)}, 'WORKERS': 0},
+                   PRODUCT_VIEW_COUNTER={'MAX_SIZE': 1000, 'INTERVAL': None, 'DEDUPE_WINDOW': 0})
+class ImageDerivativeTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media.name))
+
+    def upload(self, name, size=(400, 200)):
+        from PIL import Image as PILImage
+        buffer = io.BytesIO()
+        PILImage.new('RGB', size, 'red').save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_upload_renders_sizes_after_commit_and_pages_expose_them(self):
+        from PIL import Image as PILImage
+        product = Product.objects.create(nameFa='phone', slug='phone', price=1)
+        url = reverse('product-detail', args=[product.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            image = Image.objects.create(image=self.upload('phone.png'))
+            product.images.add(image)
+        self.client.get(url)
+
+        image.refresh_from_db()
+        self.assertEqual(set(image.derivatives), {'thumb', 'card'})
+        with PILImage.open(os.path.join(self.media.name, image.derivatives['card']['webp'])) as card:
+            self.assertEqual((card.format, card.size), ('WEBP', (80, 40)))
+
+        # Saving the row again without a new file keeps the derivatives.
+        with self.captureOnCommitCallbacks() as callbacks:
+            image.alt = 'red'
+            image.save()
+        self.assertEqual(callbacks, [])
+
+        [data] = self.client.get(url).data['data']['product']['images']
+        self.assertEqual(data['derivatives']['thumb']['jpeg'],
+                         f'http://testserver/media/{image.derivatives["thumb"]["jpeg"]}')
+
+    def test_previews_fall_back_to_the_original_until_rendered(self):
+        product = Product.objects.create(nameFa='phone', slug='phone', price=1)
+        image = Image.objects.create(image=self.upload('phone.png'))
+        product.images.add(image)
+        product = Product.objects.prefetch_related('images').get()
+        self.assertEqual(first_image_url(product), image.image.url)
+
+        call_command('generate_image_derivatives', stdout=io.StringIO())
+        image.refresh_from_db()
+        product = Product.objects.prefetch_related('images').get()
+        self.assertEqual(first_image_url(product), f'/media/{image.derivatives["card"]["jpeg"]}')
+
+
+@override_settings(IMAGE_DERIVATIVES={'SIZES': {'thumb': (40, 40)}, 'WORKERS': 0})
+class ContentAddressedImageTests(APITestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media.name, IMAGE_FILE_GRACE_PERIOD=0))
+
+    def png(self, color='red'):
+        from PIL import Image as PILImage
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (64, 64), color).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.media.name, name))
+
+    def test_identical_uploads_share_a_file_until_the_last_row_is_gone(self):
+        content = self.png()
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Image.objects.create(image=SimpleUploadedFile('a.png', content))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            second = Image.objects.create(image=SimpleUploadedFile('b.PNG', content))
+
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(first.image.name, f'product-img/{digest[:2]}/{digest[2:4]}/{digest}.png')
+        self.assertEqual((second.image.name, second.checksum), (first.image.name, digest))
+        self.assertEqual(callbacks, [])
+        second.refresh_from_db()
+        self.assertEqual(second.derivatives, Image.objects.get(pk=first.pk).derivatives)
+        thumb = second.derivatives['thumb']['jpeg']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(self.exists(second.image.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.image = SimpleUploadedFile('c.png', self.png('blue'))
+            second.save()
+        self.assertFalse(self.exists(first.image.name))
+        self.assertFalse(self.exists(thumb))
+        self.assertTrue(self.exists(second.image.name))
+
+    @override_settings(IMAGE_FILE_GRACE_PERIOD=60)
+    def test_files_reused_by_an_uncommitted_upload_are_kept_until_swept(self):
+        content = self.png()
+        with self.captureOnCommitCallbacks(execute=True):
+            image = Image.objects.create(image=SimpleUploadedFile('a.png', content))
+        image.refresh_from_db()
+        name, thumb = image.image.name, image.derivatives['thumb']['jpeg']
+        # An identical upload reuses the file but has not inserted its row yet.
+        image_storage.save(name, ContentFile(content))
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        self.assertTrue(self.exists(name))
+
+        call_command('sweep_image_files', stdout=io.StringIO())
+        self.assertTrue(self.exists(name))
+        past = time.time() - 120
+        os.utime(os.path.join(self.media.name, name), (past, past))
+        call_command('sweep_image_files', stdout=io.StringIO())
+        self.assertFalse(self.exists(name))
+        self.assertFalse(self.exists(thumb))
+
+    @override_settings(DEBUG=True)
+    def test_files_are_served_as_immutable(self):
+        image = Image.objects.create(image=SimpleUploadedFile('a.png', self.png()))
+        response = self.client.get(image.image.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['ETag'], f'"{image.checksum}"')
+
+        response = self.client.get(image.image.url, HTTP_IF_NONE_MATCH=f'"{image.checksum}"')
+        self.assertEqual(response.status_code, 304)
+
+        with self.settings(DEBUG=False):
+            self.assertEqual(self.client.get(image.image.url).status_code, 404)
+
+    def test_legacy_files_are_moved_to_content_names(self):
+        content = self.png()
+        storage = Image._meta.get_field('image').storage
+        os.makedirs(os.path.join(self.media.name, 'product-img'))
+        for name in ('product-img/one.png', 'product-img/two.png'):
+            with open(os.path.join(self.media.name, name), 'wb') as stream:
+                stream.write(content)
+        rows = [Image.objects.create(image='product-img/one.png'), Image.objects.create(image='product-img/two.png')]
+
+        call_command('dedupe_product_images', stdout=io.StringIO())
+
+        names = {image.image.name for image in Image.objects.filter(pk__in=[row.pk for row in rows])}
+        self.assertEqual(len(names), 1)
+        self.assertTrue(storage.exists(names.pop()))
+        self.assertFalse(self.exists('product-img/one.png') or self.exists('product-img/two.png'))
+
+
+class AsyncCatalogViewTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='Secret@123')
+        category = Category.objects.create(name='Phones', slug='phones', show_in_home=False)
+        self.products = [Product.objects.create(nameFa=f'phone {i}', slug=f'phone-{i}', price=i, category=category)
+                         for i in range(3)]
+        Favorite.objects.create(user=self.user, product=self.products[0])
+        comment = Comment.objects.create(product=self.products[0], author=self.user, text='text', is_visible=True,
+                                         is_admin_reviewed=True)
+        Comment.objects.create(product=self.products[0], author=self.user, text='reply', parent=comment,
+                               is_visible=True, is_admin_reviewed=True)
+        record_terms(['phone'])
+        access = self.client.post(reverse('token_obtain_pair'),
+                                  {'username': 'reader', 'password': 'Secret@123'}).data['data']['access']
+        self.headers = {'Authorization': f'token {access}'}
+
+    def assert_same_payloads(self):
+        product_id = self.products[0].id
+        for name, args, params in [
+            ('product-list', [], {}),
+            ('product-list', [], {'page_size': 2, 'order_by': 'price', 'order_type': 'desc'}),
+            ('product-detail', [product_id], {}),
+            ('product-comments', [product_id], {'page_size': 1}),
+            ('hot-search', [], {'period': 'all'}),
+        ]:
+            expected = self.client.get(reverse(name, args=args), params, headers=self.headers)
+            response = async_to_sync(self.async_client.get)(reverse(f'async-{name}', args=args), params,
+                                                             headers=self.headers)
+            self.assertEqual(response.status_code, 200, name)
+            self.assertEqual(json.loads(response.content), json.loads(expected.content), name)
+
+    @override_settings(PRODUCT_VIEW_COUNTER={'MAX_SIZE': 1000, 'INTERVAL': None, 'DEDUPE_WINDOW': 0})
+    def test_async_views_return_the_synchronous_payloads(self):
+        for concurrent in (False, True):
+            with self.subTest(concurrent=concurrent), self.settings(ASYNC_CONCURRENT_READS=concurrent), \
+                    mock.patch.dict(connection.settings_dict, {'CONN_MAX_AGE': 60 if concurrent else 0}):
+                self.assert_same_payloads()
+
+    def test_reads_fan_out_only_with_persistent_connections(self):
+        def read(_):
+            Product.objects.exists()
+            return threading.get_ident()
+
+        def threads():
+            return set(async_to_sync(gather_reads)((read, 1), (read, 2)))
+
+        with self.settings(ASYNC_CONCURRENT_READS=True):
+            self.assertEqual(threads(), {threading.get_ident()})
+            with mock.patch.dict(connection.settings_dict, {'CONN_MAX_AGE': 60}):
+                self.assertNotIn(threading.get_ident(), threads())
+
+    @override_settings(PRODUCT_VIEW_COUNTER={'MAX_SIZE': 1000, 'INTERVAL': None, 'DEDUPE_WINDOW': 60})
+    def test_detail_views_are_keyed_by_the_token_user(self):
+        product_id = self.products[0].id
+        views = Product.objects.get(id=product_id).view
+        response = async_to_sync(self.async_client.get)(reverse('async-product-detail', args=[product_id]),
+                                                        headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(cache.get(f'product-view:{product_id}:user:{self.user.id}'))
+        self.client.get(reverse('product-detail', args=[product_id]), headers=self.headers)
+        get_view_counter_buffer().flush()
+        self.assertEqual(Product.objects.get(id=product_id).view, views + 1)
+
+    @override_settings(PRODUCT_VIEW_COUNTER={'MAX_SIZE': 1000, 'INTERVAL': None, 'DEDUPE_WINDOW': 60})
+    def test_session_cookie_does_not_load_the_user_in_the_event_loop(self):
+        self.client.force_login(self.user)
+        self.async_client.cookies = self.client.cookies
+        product_id = self.products[0].id
+        response = async_to_sync(self.async_client.get)(reverse('async-product-detail', args=[product_id]))
+        self.assertEqual(response.status_code, 200)
+        session_key = self.client.cookies['sessionid'].value
+        self.assertIsNotNone(cache.get(f'product-view:{product_id}:session:{session_key}'))
+
+    def test_invalid_tokens_and_cursors_get_the_error_envelope(self):
+        response = async_to_sync(self.async_client.get)(reverse('async-product-list'),
+                                                        headers={'Authorization': 'token nonsense'})
+        self.assertEqual((response.status_code, response.json()['is_success']), (401, False))
+        response = async_to_sync(self.async_client.get)(reverse('async-product-list'), {'cursor': '%%%'})
+        self.assertEqual(response.json()['errors'], ['مکان‌نمای صفحه‌بندی نامعتبر است'])
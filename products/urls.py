@@ -1,12 +1,13 @@
 from django.urls import path
 from .views import ProductListView, ProductDetailView, CategoryListView, CategoryDetailView, CommentListCreateView, \
     ProductSearchView, FavoriteListView, FavoriteDeleteView, AddToFavoritesView, CommentLikeDislikeView,RecentSearchView,HotSearchView
+from .async_views import AsyncProductListView, AsyncProductDetailView, AsyncCommentListView, AsyncHotSearchView
 
 urlpatterns = [
     path('', ProductListView.as_view(), name='product-list'),
     path('<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
-    # path('categories/', CategoryListView.as_view(), name='category-list'),
-    # path('category/<int:pk>/', CategoryDetailView.as_view(), name='category-detail'),
+    path('categories/', CategoryListView.as_view(), name='category-list'),
+    path('category/<int:pk>/', CategoryDetailView.as_view(), name='category-detail'),
     path('product/<int:product_id>/comments/', CommentListCreateView.as_view(), name='product-comments'),
     path('product/commentlikedislike/', CommentLikeDislikeView.as_view(), name='comment-like-dislike'),
     path('product/search/', ProductSearchView.as_view(), name='product-search'),
@@ -16,4 +17,10 @@ urlpatterns = [
     path('favorites/<int:pk>/', FavoriteDeleteView.as_view(), name='favorite-delete'),
     path('favorite/add/<int:product_id>/', AddToFavoritesView.as_view(), name='add_to_favorite'),
 
+    # Async variants of the read-heavy endpoints for ASGI deployments (main.asgi).
+    path('async/', AsyncProductListView.as_view(), name='async-product-list'),
+    path('async/<int:pk>/', AsyncProductDetailView.as_view(), name='async-product-detail'),
+    path('async/product/<int:product_id>/comments/', AsyncCommentListView.as_view(), name='async-product-comments'),
+    path('async/product/hotsearch/', AsyncHotSearchView.as_view(), name='async-hot-search'),
+
 ]
@@ -1,8 +1,18 @@
-from rest_framework import generics, permissions, mixins, filters, views
+from rest_framework import generics, permissions, mixins, views
 from .models import Product, Category, Comment, Favorite, SearchHistory, CommentLikeDislike
-from .serializers import ProductSerializer, CategorySerializer, RelatedProductSerializer, CommentSerializer, \
+from .serializers import ProductSerializer, CategorySerializer, CommentSerializer, ProductPreviewSerializer, \
     FavoriteSerializer, SearchHistorySerializer, HotSearchSerializer
 from api.mixins import StandardResponseMixin
+from api.pagination import KeysetPagination
+from api.exceptions import CustomValidationError
+from .mixins import BatchedProductSerializerMixin
+from .category_tree import get_category_tree
+from .search import get_search_backend
+from .search_history import record_search
+from .search_rollups import top_terms
+from .comment_tree import load_comment_threads
+from .view_counter import record_view
+from .detail_cache import VOLATILE_FIELDS, get_product_detail, is_favorited, render_product_detail
 from rest_framework.exceptions import ValidationError
 from rest_framework import status
 from rest_framework.request import Request
@@ -11,26 +21,62 @@ from django_filters import rest_framework as django_filters
 from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters
 from rest_framework.filters import OrderingFilter
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import F
 from rest_framework.filters import SearchFilter
-from django.db.models import Count
 from django.utils import timezone
+from django.conf import settings
+from django.http import Http404, HttpResponseNotModified
+from django.utils.http import parse_etags
+from django.views import View
+from django.views.static import serve
 
 
-class ProductListView(StandardResponseMixin, generics.ListAPIView):
+class ProductListFilter(django_filters.FilterSet):
+    category = django_filters.NumberFilter(method='filter_category')
+
+    class Meta:
+        model = Product
+        fields = ['category', 'price']
+
+    def filter_category(self, queryset, name, value):
+        if self.data.get('include_descendants') in ('1', 'true', 'True'):
+            descendant_ids = get_category_tree().descendant_ids(int(value))
+            return queryset.filter(category_id__in=descendant_ids)
+        return queryset.filter(category_id=value)
+
+
+def ranks_search(params):
+    """Search rank decides the order unless the request sorts (``order_by``, ``ordering``) or pages the results."""
+    ordering_params = ['order_by', KeysetPagination.ordering_query_param, KeysetPagination.page_size_query_param,
+                       KeysetPagination.cursor_query_param]
+    return not any(param in params for param in ordering_params)
+
+
+class ProductSearchFilter(SearchFilter):
+    """``?search=`` through the product search backend, ranked unless ``ranks_search`` says otherwise."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return get_search_backend().filter_queryset(queryset, query, rank=ranks_search(request.query_params))
+
+
+class ProductListView(StandardResponseMixin, BatchedProductSerializerMixin, generics.ListAPIView):
     serializer_class = ProductSerializer
     queryset = Product.objects.all()
 
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, OrderingFilter]
 
-    filterset_fields = ['category', 'price']
-
-    search_fields = ['nameFa', 'nameEn', 'description', 'tag__title']
+    filterset_class = ProductListFilter
 
     ordering_fields = ['price', 'created_at', 'sold']
 
+    pagination_class = KeysetPagination
+    keyset_ordering_fields = ['created_at', 'price', 'sold']
+
     def get_queryset(self):
         queryset = super().get_queryset()
 
@@ -40,16 +86,24 @@ class ProductListView(StandardResponseMixin, generics.ListAPIView):
         if order_type == 'desc':
             order_by = f'-{order_by}'
 
-        return queryset.order_by(order_by)
+        return self.get_batched_queryset(queryset.order_by(order_by))
 
     def list(self, request, *args, **kwargs):
         try:
 
             queryset = self.filter_queryset(self.get_queryset())
-            serializer = self.get_serializer(queryset, many=True)
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                serializer = self.get_batched_serializer(page)
+                return self.paginated_response(data=serializer.data, next_cursor=self.paginator.next_cursor,
+                                               user=request.user)
+
+            serializer = self.get_batched_serializer(queryset)
 
             return self.success_response(data=serializer.data, user=request.user)
 
+        except CustomValidationError as e:
+            return self.error_response(errors=e.detail)
         except Exception as e:
             return self.error_response(errors=['خطا: {}'.format(str(e))])
 
@@ -59,31 +113,27 @@ class ProductDetailView(StandardResponseMixin, generics.RetrieveAPIView):
     serializer_class = ProductSerializer
 
     def retrieve(self, request, *args, **kwargs):
-        try:
-            instance = self.get_object()
-
-            serializer = self.get_serializer(instance)
-            related_products = Product.objects.filter(
-                category=instance.category
-            ).exclude(id=instance.id)[:10]
-
-            related_products_serializer = RelatedProductSerializer(related_products, many=True,
-                                                                   context={'request': request})
-
-            response_data = {
-                'product': serializer.data,
-                'related_products': related_products_serializer.data
-            }
+        state = Product.objects.filter(pk=kwargs['pk']).values('id', 'category_id', *VOLATILE_FIELDS).first()
+        if state is None:
+            return self.error_response(errors=['محصول وجود ندارد'])
+        record_view(request, state['id'])
 
-            return self.success_response(data=response_data, user=request.user)
-        except:
+        product, related_products = get_product_detail(state['id'], state['category_id'])
+        if product is None:
             return self.error_response(errors=['محصول وجود ندارد'])
 
+        response_data = render_product_detail(request, state, product, related_products,
+                                               is_favorited(request.user, state['id']))
+        return self.success_response(data=response_data, user=request.user)
+
 
 class CategoryListView(StandardResponseMixin, generics.ListAPIView):
     queryset = Category.objects.filter(parent__isnull=True)
     serializer_class = CategorySerializer
 
+    def get_queryset(self):
+        return CategorySerializer.setup_eager_loading(super().get_queryset())
+
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
         serializer = self.get_serializer(queryset, many=True)
@@ -93,12 +143,30 @@ class CategoryListView(StandardResponseMixin, generics.ListAPIView):
 class CategoryDetailView(StandardResponseMixin, generics.RetrieveAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    pagination_class = KeysetPagination
+    keyset_ordering_fields = ['created_at', 'price', 'sold']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.paginator.get_page_size(self.request) is None:
+            queryset = CategorySerializer.setup_eager_loading(queryset)
+        return queryset
 
     def retrieve(self, request, *args, **kwargs):
         try:
             instance = self.get_object()
-            serializer = self.get_serializer(instance)
-            return self.success_response(data=serializer.data, user=request.user)
+            page = self.paginate_queryset(instance.products.prefetch_related('images'))
+            if page is None:
+                serializer = self.get_serializer(instance)
+                return self.success_response(data=serializer.data, user=request.user)
+
+            instance.preview_products = page
+            data = self.get_serializer(instance).data
+            data['products'] = ProductPreviewSerializer(page, many=True, context=self.get_serializer_context()).data
+            data['has_more_products'] = self.paginator.next_cursor is not None
+            return self.paginated_response(data=data, next_cursor=self.paginator.next_cursor, user=request.user)
+        except CustomValidationError as e:
+            return self.error_response(errors=e.detail)
         except Exception:
             return self.error_response(errors=['خطا'])
 
@@ -151,10 +219,13 @@ class FavoriteDeleteView(StandardResponseMixin, generics.DestroyAPIView):
 class CommentListCreateView(StandardResponseMixin, generics.ListCreateAPIView):
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         product_id = self.kwargs.get('product_id')
-        return Comment.objects.filter(product_id=product_id, is_visible=True, is_admin_reviewed=True)
+        return Comment.objects.filter(
+            product_id=product_id, is_visible=True, is_admin_reviewed=True
+        ).select_related('author')
 
     def perform_create(self, serializer):
         product_id = self.kwargs.get('product_id')
@@ -168,18 +239,22 @@ class CommentListCreateView(StandardResponseMixin, generics.ListCreateAPIView):
         serializer.save(author=self.request.user, product=product, parent=parent)
 
     def list(self, request, *args, **kwargs):
+        product_id = self.kwargs.get('product_id')
+        if not Product.objects.filter(id=product_id).exists():
+            return self.error_response(errors=['این محصول وجود ندارد'])
 
         try:
-            queryset = self.get_queryset()
-            serializer = self.get_serializer(queryset, many=True)
-            product_id = self.kwargs.get('product_id')
-            if Product.objects.filter(id=product_id):
-                return self.success_response(data=serializer.data, user=request.user)
-            else:
-                return self.error_response(errors=['این محصول وجود ندارد'])
-
-        except Product.DoesNotExist:
-            return self.error_response(errors=['خطا'])
+            threads = load_comment_threads(product_id)
+            page = self.paginator.paginate_list(threads, request, 'created_at')
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.paginated_response(data=serializer.data, next_cursor=self.paginator.next_cursor,
+                                               user=request.user)
+
+            serializer = self.get_serializer(threads, many=True)
+            return self.success_response(data=serializer.data, user=request.user)
+        except CustomValidationError as e:
+            return self.error_response(errors=e.detail)
 
     def create(self, request, *args, **kwargs):
         product_id = request.data.get('product')
@@ -200,22 +275,34 @@ class CommentListCreateView(StandardResponseMixin, generics.ListCreateAPIView):
 
 
 class ProductFilter(django_filters.FilterSet):
-    nameFa = django_filters.CharFilter(field_name="nameFa", lookup_expr='icontains')
-    nameEn = django_filters.CharFilter(field_name="nameEn", lookup_expr='icontains')
-    description = django_filters.CharFilter(field_name="description", lookup_expr='icontains')
-    category = django_filters.CharFilter(field_name="category__name", lookup_expr='icontains')
+    nameFa = django_filters.CharFilter(method='filter_search')
+    nameEn = django_filters.CharFilter(method='filter_search')
+    description = django_filters.CharFilter(method='filter_search')
+    category = django_filters.CharFilter(method='filter_search')
+
+    search_index_fields = {
+        'nameFa': ['name_fa'],
+        'nameEn': ['name_en'],
+        'description': ['description'],
+        'category': ['category'],
+    }
 
     class Meta:
         model = Product
         fields = ['nameFa','nameEn', 'description', 'category']
 
+    def filter_search(self, queryset, name, value):
+        return get_search_backend().filter_queryset(queryset, value, fields=self.search_index_fields[name],
+                                                    rank=ranks_search(self.data))
+
 
-class ProductSearchView(StandardResponseMixin, generics.ListAPIView):
+class ProductSearchView(StandardResponseMixin, BatchedProductSerializerMixin, generics.ListAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
-    filter_backends = [django_filters.DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [django_filters.DjangoFilterBackend, ProductSearchFilter]
     filterset_class = ProductFilter
-    search_fields = ['nameFa', 'nameEn', 'description', 'category__name']
+    pagination_class = KeysetPagination
+    keyset_ordering_fields = ['created_at', 'price', 'sold']
 
     def get(self, request, *args, **kwargs):
         search_terms = {
@@ -225,18 +312,18 @@ class ProductSearchView(StandardResponseMixin, generics.ListAPIView):
             'category': request.query_params.get('category', '')
         }
 
-        queryset = self.filter_queryset(self.get_queryset())
+        queryset = self.filter_queryset(self.get_batched_queryset(self.get_queryset()))
 
-        for field, term in search_terms.items():
+        for term in search_terms.values():
             if term:
-                queryset = queryset.filter(
-                    Q(**{f"{field}__icontains": term})
-                )
+                record_search(request.user, term)
 
-                if request.user.is_authenticated:
-                    SearchHistory.objects.create(user=request.user, term=term)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_batched_serializer(page)
+            return self.paginated_response(data=serializer.data, next_cursor=self.paginator.next_cursor)
 
-        serializer = self.get_serializer(queryset, many=True)
+        serializer = self.get_batched_serializer(queryset)
         return self.success_response(data=serializer.data)
 
 
@@ -250,13 +337,13 @@ class RecentSearchView(generics.ListAPIView):
 
 class HotSearchView(generics.ListAPIView):
     serializer_class = HotSearchSerializer
+    periods = ('all', 'trending', 'day', 'week')
 
     def get_queryset(self):
-        return (
-            SearchHistory.objects.values('term')
-                .annotate(count=Count('term'))
-                .order_by('-count')[:10]
-        )
+        period = self.request.query_params.get('period', 'all')
+        if period not in self.periods:
+            period = 'all'
+        return top_terms(period=period, limit=10)
 
 
 class CommentLikeDislikeView(generics.GenericAPIView):
@@ -267,18 +354,71 @@ class CommentLikeDislikeView(generics.GenericAPIView):
         value = request.data.get('value')  # 1 برای لایک و -1 برای دیسلایک
 
         try:
-            comment = Comment.objects.get(id=comment_id)
-            like_dislike, created = CommentLikeDislike.objects.get_or_create(
-                user=request.user, comment=comment, defaults={'value': value}
-            )
-
-            if not created:
-                if like_dislike.value == value:
-                    like_dislike.delete()
+            value = int(value)
+        except (TypeError, ValueError):
+            value = None
+        if value not in (CommentLikeDislike.LIKE, CommentLikeDislike.DISLIKE):
+            return Response({"error": "مقدار باید 1 یا -1 باشد"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with transaction.atomic():
+                comment = Comment.objects.get(id=comment_id)
+                like_dislike, created = CommentLikeDislike.objects.get_or_create(
+                    user=request.user, comment=comment, defaults={'value': value}
+                )
+
+                if created:
+                    Comment.objects.filter(pk=comment.pk).update(**{
+                        Comment.vote_counter(value): F(Comment.vote_counter(value)) + 1,
+                    })
+                elif like_dislike.value == value:
+                    # Counters follow the rows actually changed here: of two concurrent toggles only
+                    # the one whose conditional delete or update matched moves them.
+                    deleted, _ = CommentLikeDislike.objects.filter(pk=like_dislike.pk, value=value).delete()
+                    if deleted:
+                        Comment.objects.filter(pk=comment.pk).update(**{
+                            Comment.vote_counter(value): F(Comment.vote_counter(value)) - 1,
+                        })
                     return Response({"message": "حذف شد"}, status=status.HTTP_204_NO_CONTENT)
-                like_dislike.value = value
-                like_dislike.save()
+                else:
+                    old_value = like_dislike.value
+                    switched = CommentLikeDislike.objects.filter(pk=like_dislike.pk, value=old_value).update(
+                        value=value)
+                    if switched:
+                        Comment.objects.filter(pk=comment.pk).update(**{
+                            Comment.vote_counter(old_value): F(Comment.vote_counter(old_value)) - 1,
+                            Comment.vote_counter(value): F(Comment.vote_counter(value)) + 1,
+                        })
 
             return Response({"message": "ثبت شد"}, status=status.HTTP_201_CREATED)
         except Comment.DoesNotExist:
             return Response({"error": "کامنت مورد نظر یافت نشد"}, status=status.HTTP_404_NOT_FOUND)
+
+
+class ImageFileView(View):
+    """
+    Serve a content-addressed image (see products.storage) while DEBUG is on,
+    like ``static()`` serves the rest of MEDIA_ROOT. The name is the hash of
+    the bytes, so the response never changes: it may be cached for a year,
+    and a revalidation is answered from the name alone.
+
+    In production the web server or storage serves media and should send the
+    same header for these names, e.g. with nginx::
+
+        location /media/product-img/ {
+            add_header Cache-Control "public, max-age=31536000, immutable";
+        }
+    """
+    cache_control = 'public, max-age=31536000, immutable'
+
+    def get(self, request, path, digest):
+        if not settings.DEBUG:
+            raise Http404
+        etag = f'"{digest}"'
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = serve(request, path, document_root=settings.MEDIA_ROOT)
+        response['ETag'] = etag
+        response['Cache-Control'] = self.cache_control
+        return response
@@ -1,19 +1,24 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+
+from .hashing import hash_unknown_user, verify_password
+from .identifiers import find_user
 
 User = get_user_model()
 
 
 class CustomUserBackend(ModelBackend):
+    """Log in with a username, email or phone number; replaces ModelBackend in AUTHENTICATION_BACKENDS."""
+
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            user = User.objects.get(
-                Q(username=username) | Q(email=username) | Q(phone_number=username)
-            )
-        except User.DoesNotExist:
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
             return None
-
-        if user.check_password(password):
+        user = find_user(username)
+        if user is None:
+            hash_unknown_user(password)
+            return None
+        if verify_password(user, password) and self.user_can_authenticate(user):
             return user
         return None
@@ -0,0 +1,93 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+DEFAULT_HASHING_SETTINGS = {
+    # Threads hashing passwords per process; 0 hashes on the request thread. PBKDF2, scrypt,
+    # argon2 and bcrypt release the GIL, so the threads use separate cores.
+    'WORKERS': 2,
+    # Hashes queued or running at once; further logins wait up to TIMEOUT seconds for a slot
+    # and are then turned away with 503 instead of piling up on the workers.
+    'MAX_PENDING': 32,
+    'TIMEOUT': 5.0,
+}
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'سرور مشغول است، لطفاً چند لحظه دیگر دوباره تلاش کنید.'
+    default_code = 'hashing_unavailable'
+
+
+def get_hashing_settings():
+    return {**DEFAULT_HASHING_SETTINGS, **getattr(settings, 'PASSWORD_HASHING', {})}
+
+
+def get_pool():
+    """``(executor, slots)``; the semaphore bounds how many hashes may be queued on the executor."""
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                options = get_hashing_settings()
+                _slots = threading.BoundedSemaphore(options['MAX_PENDING'])
+                _executor = ThreadPoolExecutor(max_workers=options['WORKERS'], thread_name_prefix='password-hashing')
+    return _executor, _slots
+
+
+def run(function, *args):
+    """Call ``function(*args)`` on the hashing pool and wait for it, or raise HashingUnavailable."""
+    options = get_hashing_settings()
+    if not options['WORKERS']:
+        return function(*args)
+    executor, slots = get_pool()
+    if not slots.acquire(timeout=options['TIMEOUT']):
+        raise HashingUnavailable()
+    future = executor.submit(function, *args)
+    future.add_done_callback(lambda _: slots.release())
+    return future.result()
+
+
+def _verify(password, encoded):
+    rehashed = []
+    # Django calls the setter for a correct password whose hasher is no longer the preferred one
+    # or whose parameters (iterations, work factor) changed since it was stored.
+    valid = check_password(password, encoded, setter=lambda raw: rehashed.append(make_password(raw)))
+    return valid, rehashed[0] if rehashed else None
+
+
+def verify_password(user, password):
+    """
+    Check ``password`` against ``user`` on the hashing pool. A password
+    stored with outdated hasher settings is replaced by a fresh hash, unless
+    it was changed meanwhile. Unlike ``User.check_password`` no database
+    work happens on the pool.
+    """
+    valid, rehashed = run(_verify, password, user.password)
+    if rehashed is not None:
+        type(user).objects.filter(pk=user.pk, password=user.password).update(password=rehashed)
+        user.password = rehashed
+    return valid
+
+
+def hash_unknown_user(password):
+    """Spend one hash on a login for an identifier nobody has, so it takes as long as a wrong password."""
+    run(make_password, password)
+
+
+@receiver(setting_changed)
+def reset_pool(setting, **kwargs):
+    global _executor, _slots
+    if setting == 'PASSWORD_HASHING' and _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor, _slots = None, None
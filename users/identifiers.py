@@ -0,0 +1,63 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+
+# Persian and Arabic-Indic digits are typed on phone keyboards in place of ASCII digits.
+DIGITS = str.maketrans('۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩', '01234567890123456789')
+PHONE_SEPARATORS_RE = re.compile(r'[\s\-().]')
+PHONE_RE = re.compile(r'^0\d{10}$')
+
+
+def normalize_email(value):
+    """Lookup form of an email address: trimmed and case-folded, or None when empty."""
+    value = (value or '').strip()
+    return value.casefold() or None
+
+
+def normalize_phone(value):
+    """
+    Lookup form of a phone number: ASCII digits starting with 0
+    (+98 912..., 0098912... and ۰۹۱۲... all become 0912...), or None when empty.
+    """
+    value = PHONE_SEPARATORS_RE.sub('', (value or '').translate(DIGITS))
+    if value.startswith('+98'):
+        value = '0' + value[3:]
+    elif value.startswith('0098'):
+        value = '0' + value[4:]
+    elif value.startswith('98') and len(value) == 12:
+        value = '0' + value[2:]
+    return value or None
+
+
+def identifier_filter(identifier):
+    """
+    ``Q`` matching the user an identifier may name, on unique indexed columns
+    only: the username, and the email or phone number when it has that shape.
+    """
+    condition = Q(username=identifier)
+    if '@' in identifier:
+        condition |= Q(email_key=normalize_email(identifier))
+    phone = normalize_phone(identifier)
+    if phone and PHONE_RE.match(phone):
+        condition |= Q(phone_number=phone)
+    return condition
+
+
+def find_user(identifier):
+    """
+    The user named by a username, email or phone number, with one query.
+
+    An identifier can only match different users through different columns
+    (say a username that is someone else's phone number); the username wins,
+    then the email, then the phone number.
+    """
+    identifier = (identifier or '').strip()
+    if not identifier:
+        return None
+    users = list(get_user_model().objects.filter(identifier_filter(identifier))[:3])
+    if len(users) > 1:
+        email, phone = normalize_email(identifier), normalize_phone(identifier)
+        users.sort(key=lambda user: (user.username != identifier, user.email_key != email,
+                                     user.phone_number != phone))
+    return users[0] if users else None
@@ -0,0 +1,61 @@
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from users.identifiers import normalize_email, normalize_phone
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Fill email_key and normalize phone_number for users saved before logins looked them up '
+            '(users.identifiers). Run it after adding the email_key column and before the unique '
+            'constraints on phone_number and email_key are applied: rows that normalize to the same '
+            'phone number or email would make that migration fail. Such conflicts are reported and the '
+            'command exits with an error; with --resolve the oldest account keeps the identifier and '
+            'the others lose it (their email address itself is kept).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resolve', action='store_true',
+                            help='Keep conflicting identifiers on the oldest account only.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = list(User.objects.only('id', 'email', 'email_key', 'phone_number').order_by('id'))
+        by_phone, by_email = defaultdict(list), defaultdict(list)
+        for user in users:
+            phone, email = normalize_phone(user.phone_number), normalize_email(user.email)
+            if phone:
+                by_phone[phone].append(user)
+            if email:
+                by_email[email].append(user)
+
+        conflicts = {key: group for key, group in [*by_phone.items(), *by_email.items()] if len(group) > 1}
+        for key, group in conflicts.items():
+            self.stderr.write(f'{key}: ' + ', '.join(user.username for user in group))
+        if conflicts and not options['resolve']:
+            raise CommandError(f'{len(conflicts)} identifiers are shared by several users; nothing was '
+                               f'changed. Fix them or run again with --resolve.')
+
+        changed = []
+        for user in users:
+            phone, email = normalize_phone(user.phone_number), normalize_email(user.email)
+            # Of the accounts sharing an identifier only the oldest keeps it.
+            if phone and by_phone[phone][0] is not user:
+                phone = None
+            if email and by_email[email][0] is not user:
+                email = None
+            if (user.phone_number, user.email_key) != (phone, email):
+                user.phone_number, user.email_key = phone, email
+                changed.append(user)
+
+        with transaction.atomic():
+            # Clear the keys first so that swapping identifiers between rows never collides midway.
+            User.objects.filter(id__in=[user.id for user in changed]).update(phone_number=None, email_key=None)
+            User.objects.bulk_update(changed, ['phone_number', 'email_key'],
+                                     batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated identifiers of {len(changed)} of {len(users)} users'
+            + (f', resolved {len(conflicts)} conflicts.' if conflicts else '.')))
@@ -0,0 +1,72 @@
+import random
+import time
+
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from users.identifiers import find_user
+
+User = get_user_model()
+PASSWORD = 'Bench@12345'
+
+
+class Command(BaseCommand):
+    help = ('Time identifier lookups and full logins against a large user table. The users are '
+            'created inside a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--lookups', type=int, default=5000, help='Lookups per identifier kind.')
+        parser.add_argument('--logins', type=int, default=50, help='authenticate() calls, which hash the password.')
+        parser.add_argument('--legacy-lookups', type=int, default=20,
+                            help='Lookups with the previous OR over unnormalized columns, for comparison.')
+
+    def handle(self, *args, **options):
+        count, batch_size = options['users'], options['batch_size']
+        with transaction.atomic():
+            password = make_password(PASSWORD)
+            started = time.perf_counter()
+            for offset in range(0, count, batch_size):
+                User.objects.bulk_create([self.build(index, password)
+                                          for index in range(offset, min(offset + batch_size, count))])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'created {count} users in {elapsed:.2f}s')
+
+            sample = random.Random(0).sample(range(count), min(count, options['lookups']))
+            kinds = {
+                'username': lambda index: f'bench-login-{index}',
+                'email': lambda index: f'Bench.{index}@Example.com',
+                'phone': lambda index: f'+98 90{index:08d}',
+            }
+            for kind, identifier in kinds.items():
+                self.report(f'find_user by {kind}', sample, lambda index: find_user(identifier(index)))
+
+            legacy = sample[:options['legacy_lookups']]
+            self.report('previous OR lookup', legacy, lambda index: User.objects.filter(
+                Q(username=kinds['email'](index)) | Q(email=kinds['email'](index))
+                | Q(phone_number=kinds['email'](index))).first())
+
+            logins = sample[:options['logins']]
+            self.report('authenticate()', logins, lambda index: authenticate(
+                username=kinds['phone'](index), password=PASSWORD))
+            self.report('failed authenticate()', logins, lambda index: authenticate(
+                username=kinds['phone'](index), password='wrong'))
+            transaction.set_rollback(True)
+
+    def report(self, label, sample, call):
+        if not sample:
+            return
+        started = time.perf_counter()
+        for index in sample:
+            call(index)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{label}: {len(sample)} in {elapsed:.2f}s ({len(sample) / elapsed:,.0f}/s)')
+
+    def build(self, index, password):
+        email = f'Bench.{index}@Example.com'
+        return User(username=f'bench-login-{index}', password=password, email=email, email_key=email.casefold(),
+                    phone_number=f'090{index:08d}')
@@ -0,0 +1,38 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+PASSWORD = 'Bench@12345'
+
+
+class Command(BaseCommand):
+    help = ('Verify a password with each hasher in PASSWORD_HASHERS from pools of threads and report '
+            'logins per second in total and per core. Nothing is written to the database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=40, help='Verifications per hasher and pool size.')
+        parser.add_argument('--workers', type=int, nargs='+',
+                            help='Pool sizes to try (default: 1 and the number of cores).')
+
+    def handle(self, *args, **options):
+        cores = os.cpu_count() or 1
+        pool_sizes = options['workers'] or sorted({1, cores})
+        self.stdout.write(f'{cores} cores')
+        for hasher in get_hashers():
+            try:
+                encoded = hasher.encode(PASSWORD, hasher.salt())
+            except (ImportError, ValueError) as e:
+                self.stdout.write(f'{hasher.algorithm}: unavailable ({e})')
+                continue
+            for workers in pool_sizes:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    started = time.perf_counter()
+                    results = list(executor.map(lambda _: hasher.verify(PASSWORD, encoded), range(options['logins'])))
+                    elapsed = time.perf_counter() - started
+                rate = len(results) / elapsed
+                self.stdout.write(f'{hasher.algorithm} x{workers}: {rate:,.1f} logins/s, '
+                                  f'{rate / min(workers, cores):,.1f} per core'
+                                  + ('' if all(results) else ' (verification failed)'))
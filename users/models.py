@@ -3,15 +3,29 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from .identifiers import normalize_email, normalize_phone
+
 
 class CustomUser(AbstractUser):
     username = models.CharField(max_length=50,unique=True)
-    phone_number = models.CharField(max_length=15, null=True, blank=True)
+    # phone_number and email_key are normalized in save(). Rows saved before that are backfilled by
+    # the backfill_user_identifiers command, which has to run before the unique constraints are added.
+    phone_number = models.CharField(max_length=15, null=True, blank=True, unique=True)
+    # Case-folded copy of email for logins by email (see users.identifiers); email keeps the typed form.
+    email_key = models.CharField(max_length=254, null=True, blank=True, unique=True, editable=False)
     subscribe = models.BooleanField(default=False)
 
     def __str__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        self.phone_number = normalize_phone(self.phone_number)
+        self.email_key = normalize_email(self.email)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'email' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'email_key'}
+        super().save(*args, **kwargs)
+
 
 class UserAddress(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='addresses')
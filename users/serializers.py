@@ -2,8 +2,13 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import authenticate
+from django.db import IntegrityError, transaction
 from django.db.models import Q
 
+from api.exceptions import CustomValidationError
+from .hashing import hash_unknown_user, verify_password
+from .identifiers import PHONE_RE, find_user, normalize_email, normalize_phone
+
 User = get_user_model()
 
 
@@ -25,6 +30,8 @@ class RegisterSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('username', 'phone_number', 'email', 'password', 'password_confirm')
+        # Uniqueness is checked for all identifiers at once in validate(), not one query per field.
+        extra_kwargs = {'username': {'validators': []}, 'phone_number': {'validators': []}}
 
     def validate(self, data):
         password = data.get('password')
@@ -32,22 +39,15 @@ class RegisterSerializer(serializers.ModelSerializer):
         username = data.get('username')
         email = data.get('email')
         phone_number = data.get('phone_number')
-        errors = []
-
-        if User.objects.filter(username=username).exists():
-            errors.append('کاربر با این نام کاربری قبلاً ثبت شده است.')
-
-        if User.objects.filter(phone_number=phone_number).exists():
-            errors.append('کاربر با این شماره تلفن قبلاً ثبت شده است.')
-
-        if User.objects.filter(email=email).exists():
-            errors.append('کاربر با این ایمیل قبلاً ثبت شده است.')
+        phone_key = normalize_phone(phone_number)
+        errors = self.uniqueness_errors(username, phone_key, normalize_email(email))
 
         if len(username) > 248:
             errors.append('تعداد کاراکترهای نام کاربری نباید بیشتر از 248 کاراکتر باشد.')
 
-        if len(phone_number) != 11:
-            errors.append('شماره موبایل باید 11 رقم باشد.')
+        # The shape find_user() accepts as a phone number, so every registered number can log in.
+        if not PHONE_RE.match(phone_key or ''):
+            errors.append('شماره موبایل باید 11 رقم باشد و با 0 شروع شود.')
 
         if password == email:
             errors.append('رمز عبور نباید با ایمیل برابر باشد.')
@@ -73,15 +73,44 @@ class RegisterSerializer(serializers.ModelSerializer):
 
         return data
 
+    @staticmethod
+    def uniqueness_errors(username, phone_key, email_key):
+        """Messages for the identifiers other users already have, found with one query."""
+        condition = Q(username=username)
+        if phone_key:
+            condition |= Q(phone_number=phone_key)
+        if email_key:
+            condition |= Q(email_key=email_key)
+        taken = {'username': False, 'phone': False, 'email': False}
+        for row in User.objects.filter(condition).values_list('username', 'phone_number', 'email_key')[:3]:
+            taken['username'] |= row[0] == username
+            taken['phone'] |= phone_key is not None and row[1] == phone_key
+            taken['email'] |= email_key is not None and row[2] == email_key
+
+        errors = []
+        if taken['username']:
+            errors.append('کاربر با این نام کاربری قبلاً ثبت شده است.')
+        if taken['phone']:
+            errors.append('کاربر با این شماره تلفن قبلاً ثبت شده است.')
+        if taken['email']:
+            errors.append('کاربر با این ایمیل قبلاً ثبت شده است.')
+        return errors
+
     def create(self, validated_data):
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            email=validated_data['email'],
-            phone_number=validated_data['phone_number']
-        )
-        user.set_password(validated_data['password'])
-        user.save()
-        return user
+        # create_user hashes the password before the single INSERT. The unique indexes settle
+        # sign-ups racing for the same identifier after validate() found them free.
+        try:
+            with transaction.atomic():
+                return User.objects.create_user(
+                    username=validated_data['username'],
+                    email=validated_data['email'],
+                    phone_number=validated_data['phone_number'],
+                    password=validated_data['password'],
+                )
+        except IntegrityError:
+            raise CustomValidationError(self.uniqueness_errors(
+                validated_data['username'], normalize_phone(validated_data['phone_number']),
+                normalize_email(validated_data['email'])) or ['ثبت نام انجام نشد، دوباره تلاش کنید.'])
 
 
 class CustomAuthTokenSerializer(serializers.Serializer):
@@ -94,16 +123,13 @@ class CustomAuthTokenSerializer(serializers.Serializer):
         errors = []
 
         if username and password:
-            try:
-                user = User.objects.get(Q(username=username) | Q(email=username) | Q(phone_number=username))
-            except User.DoesNotExist:
+            user = find_user(username)
+            if user is None:
+                hash_unknown_user(password)
                 errors.append('نام کاربری یا رمز عبور اشتباه است')
                 raise serializers.ValidationError(errors)
-            except User.MultipleObjectsReturned:
-                errors.append('چندین حساب کاربری با این مشخصات یافت شد')
-                raise serializers.ValidationError(errors)
 
-            if not user.check_password(password):
+            if not verify_password(user, password):
                 errors.append('رمز عبور اشتباه است')
                 raise serializers.ValidationError(errors)
 
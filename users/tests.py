@@ -1,3 +1,206 @@
-from django.test import TestCase
+import io
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.authentication import ClaimsJWTAuthentication
+from api.roles import get_user_role
+from orders.models import Order
+from .hashing import get_pool
+from .identifiers import find_user
+from .serializers import RegisterSerializer
+
+User = get_user_model()
+
+
+class UserRoleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='customer', password='Secret@123', phone_number='09120000000')
+
+    def test_purchase_role_is_cached_until_first_order(self):
+        self.assertEqual(get_user_role(self.user), '4')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get_user_role(self.user), '4')
+        self.assertEqual([query for query in queries if 'orders_order' in query['sql']], [])
+
+        Order.objects.create(user=self.user, total_price=1000)
+
+        self.assertEqual(get_user_role(self.user), '3')
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                       PROCESS_LOCAL_CACHE_TIMEOUT=30)
+    def test_process_local_cache_keeps_the_role_briefly(self):
+        self.assertEqual(get_user_role(self.user), '4')
+        # An order placed through another worker: its invalidation never reaches this cache.
+        Order.objects.bulk_create([Order(user=self.user, total_price=1000)])
+        self.assertEqual(get_user_role(self.user), '4')
+        with mock.patch('time.time', return_value=time.time() + 31):
+            self.assertEqual(get_user_role(self.user), '3')
+
+    def test_login_and_refresh_report_role(self):
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'customer', 'password': 'Secret@123'})
+        self.assertEqual(response.data['userPermission'], '4')
+
+        Order.objects.create(user=self.user, total_price=1000)
+
+        refreshed = self.client.post(reverse('token_refresh'), {'refresh': response.data['data']['refresh']})
+        self.assertEqual(refreshed.data['userPermission'], '3')
+
+
+class IdentifierLoginTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='customer', password='Secret@123', email='Customer@Example.com',
+                                             phone_number='+98 912 000 0000')
+
+    def test_identifiers_are_normalized_on_save(self):
+        self.assertEqual((self.user.phone_number, self.user.email_key), ('09120000000', 'customer@example.com'))
+        self.assertEqual(self.user.email, 'Customer@example.com')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create_user(username='other', password='Secret@123', phone_number='۰۹۱۲۰۰۰۰۰۰۰')
+
+    def test_every_identifier_logs_in_with_one_lookup(self):
+        for identifier in ('customer', 'CUSTOMER@example.com', '۰۹۱۲۰۰۰۰۰۰۰', '00989120000000'):
+            with CaptureQueriesContext(connection) as queries:
+                user = authenticate(username=identifier, password='Secret@123')
+            self.assertEqual(user, self.user, identifier)
+            self.assertEqual(len([query for query in queries if 'users_customuser' in query['sql']]), 1)
+
+        self.assertIsNone(authenticate(username='customer', password='wrong'))
+        response = self.client.post(reverse('token_obtain_pair'),
+                                    {'username': 'customer@EXAMPLE.com', 'password': 'Secret@123'})
+        self.assertTrue(response.data['is_success'])
+
+    def test_backfill_normalizes_rows_saved_before_identifiers(self):
+        other = User.objects.create_user(username='other', password='Other@1234')
+        User.objects.filter(pk=self.user.pk).update(phone_number='+989120000000', email_key=None)
+        User.objects.filter(pk=other.pk).update(phone_number='09120000000', email='CUSTOMER@example.com')
+        self.assertIsNone(find_user('customer@example.com'))
+
+        with self.assertRaises(CommandError):
+            call_command('backfill_user_identifiers', stderr=io.StringIO())
+        self.assertEqual(User.objects.get(pk=other.pk).phone_number, '09120000000')
+
+        call_command('backfill_user_identifiers', resolve=True, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(find_user('customer@example.com'), self.user)
+        self.assertEqual(find_user('09120000000'), self.user)
+        other.refresh_from_db()
+        self.assertEqual((other.phone_number, other.email_key, other.email), (None, None, 'CUSTOMER@example.com'))
+
+    def test_username_wins_over_another_users_phone_number(self):
+        other = User.objects.create_user(username='09120000000', password='Other@1234')
+        self.assertEqual(find_user('09120000000'), other)
+        self.assertEqual(find_user('+989120000000'), self.user)
+
+
+class RegistrationTests(APITestCase):
+    def register(self, **overrides):
+        data = {'username': 'newcomer', 'phone_number': '09121111111', 'email': 'new@example.com',
+                'password': 'Secret@123', 'password_confirm': 'Secret@123', **overrides}
+        return self.client.post(reverse('register'), data)
+
+    def test_registration_checks_and_inserts_with_one_query_each(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.register()
+        self.assertTrue(response.data['is_success'])
+        user_queries = [query['sql'] for query in queries if 'users_customuser' in query['sql']]
+        self.assertEqual([sql.split()[0] for sql in user_queries], ['SELECT', 'INSERT'])
+        self.assertTrue(User.objects.get(username='newcomer').check_password('Secret@123'))
+
+    def test_every_taken_identifier_is_reported(self):
+        self.register()
+        response = self.register(username='newcomer', phone_number='+989121111111', email='NEW@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][:3], [
+            'کاربر با این نام کاربری قبلاً ثبت شده است.',
+            'کاربر با این شماره تلفن قبلاً ثبت شده است.',
+            'کاربر با این ایمیل قبلاً ثبت شده است.',
+        ])
+
+    def test_a_sign_up_losing_a_race_gets_the_conflict_message(self):
+        User.objects.create_user(username='first', password='Secret@123', phone_number='09121111111')
+        check = RegisterSerializer.uniqueness_errors
+        # validate() runs before the other sign-up commits and finds nothing.
+        conflicts = check('newcomer', '09121111111', None)
+        with mock.patch.object(RegisterSerializer, 'uniqueness_errors', side_effect=[[], conflicts]):
+            response = self.register(email='')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], ['کاربر با این شماره تلفن قبلاً ثبت شده است.'])
+        self.assertFalse(User.objects.filter(username='newcomer').exists())
+
+    def test_only_numbers_that_can_log_in_are_accepted(self):
+        response = self.register(phone_number='98912345678')
+        self.assertIn('شماره موبایل باید 11 رقم باشد و با 0 شروع شود.', response.data['errors'])
+        self.assertTrue(self.register(phone_number='+98 912 1111111').data['is_success'])
+        self.assertEqual(find_user('09121111111').username, 'newcomer')
+
+
+class PasswordHashingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='customer', password='Secret@123')
+
+    def login(self):
+        return self.client.post(reverse('token_obtain_pair'), {'username': 'customer', 'password': 'Secret@123'})
+
+    def test_login_rehashes_passwords_stored_with_outdated_settings(self):
+        User.objects.filter(pk=self.user.pk).update(password=make_password('Secret@123', hasher='pbkdf2_sha1'))
+        self.assertTrue(self.login().data['is_success'])
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(self.login().data['is_success'])
+
+    @override_settings(PASSWORD_HASHING={'WORKERS': 1, 'MAX_PENDING': 1, 'TIMEOUT': 0.01})
+    def test_logins_beyond_the_queue_bound_are_turned_away(self):
+        executor, slots = get_pool()
+        slots.acquire()
+        try:
+            response = self.login()
+        finally:
+            slots.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.data['is_success'])
+        self.assertTrue(self.login().data['is_success'])
+
+
+class TokenClaimsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='customer', password='Secret@123')
+        tokens = self.client.post(reverse('token_obtain_pair'),
+                                  {'username': 'customer', 'password': 'Secret@123'}).data['data']
+        self.access, self.refresh = tokens['access'], tokens['refresh']
+
+    def test_authenticated_requests_do_not_load_the_user(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'token {self.access}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('favorite-list-create'))
+        self.assertEqual(response.data['userPermission'], '4')
+        self.assertEqual([query['sql'] for query in queries if 'users_customuser' in query['sql']], [])
+
+        user = ClaimsJWTAuthentication().get_user(AccessToken(self.access))
+        self.assertIsInstance(user, User)
+        self.assertEqual((user.pk, user.username, user.is_staff), (self.user.pk, 'customer', False))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.date_joined, self.user.date_joined)
+
+    def test_refresh_reissues_current_claims(self):
+        Order.objects.create(user=self.user, total_price=1000)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        response = self.client.post(reverse('token_refresh'), {'refresh': self.refresh})
+        self.assertEqual(response.data['userPermission'], '2')
+        access = AccessToken(response.data['data']['access'])
+        self.assertEqual((access['is_staff'], access['role']), (True, '2'))
+
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.post(reverse('token_refresh'), {'refresh': self.refresh})
+        self.assertFalse(response.data['is_success'])